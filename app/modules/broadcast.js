@@ -1,8 +1,56 @@
 var exports = module.exports = {};
 var path = require('path');
+var net = require('net');
+var os = require('os');
 var exec = require('child_process').exec,
     config = require('./config.js');
 
+// `elodie serve` listens on this socket. When it's running we send jobs to it
+//  instead of spawning a new elodie process for every action.
+var daemonSocket = path.join(process.env.ELODIE_APPLICATION_DIRECTORY || path.join(os.homedir(), '.elodie'), 'elodie.sock');
+
+// Send a JSON-RPC job to the daemon.
+// onProgress is called with each streamed progress event and onDone with (error, result).
+// If no daemon is listening fallback() is called instead.
+var runDaemonJob = function(method, params, onProgress, onDone, fallback) {
+  var client = net.createConnection(daemonSocket),
+      connected = false,
+      finished = false,
+      buffer = '';
+
+  client.on('connect', function() {
+    connected = true;
+    client.write(JSON.stringify({'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params}) + '\n');
+  });
+  client.on('data', function(data) {
+    var lines, message;
+    buffer += data.toString();
+    lines = buffer.split('\n');
+    buffer = lines.pop();
+    for(var i=0; i<lines.length; i++) {
+      if(lines[i].length === 0) {
+        continue;
+      }
+      message = JSON.parse(lines[i]);
+      if(typeof(message['id']) === 'undefined') {
+        onProgress(message['params']);
+      } else {
+        finished = true;
+        client.end();
+        onDone(message['error'] || null, message['result']);
+      }
+    }
+  });
+  client.on('error', function(error) {
+    if(!connected) {
+      fallback();
+    } else if(!finished) {
+      finished = true;
+      onDone(error, null);
+    }
+  });
+};
+
 // The main process listens for events from the web renderer.
 // When photos are dragged onto the toolbar and photos are requested to be updated it will fire an 'update-photos' ipc event.
 // The web renderer will send the list of photos, type of update and new value to apply
@@ -24,19 +72,27 @@ exports.importPhotos = function(event, args) {
   args['source'] = args['source'].normalize();
   args['destination'] = args['destination'].normalize();
 
-  update_command = path.normalize(__dirname + '/../../dist/elodie/elodie') + ' import --source="' + args['source'] +  '" --destination="' + args['destination'] + '"';
-  //update_command = __dirname + '/../../elodie.py import --source="' + args['source'] +  '" --destination="' + args['destination'] + '"';
-  
-  console.log(update_command);
-  exec(update_command, function(error, stdout, stderr) {
-    console.log('out ' + stdout);
-    console.log('err ' + stderr);
-    /*params['error'] = error
-    params['stdout'] = '[' + stdout.replace(/\n/g,',').replace(/\,+$/g, '').replace(/\n/g,'') + ']'
-    params['stderr'] = stderr
-    console.log('parsed')
-    console.log(params['stdout'])*/
+  runDaemonJob('import', {'source': args['source'], 'destination': args['destination']}, function(progress) {
+    console.log(progress);
+    event.sender.send('update-import-progress', progress);
+  }, function(error, result) {
+    console.log(error || result);
     event.sender.send('update-import-success', args);
+  }, function() {
+    update_command = path.normalize(__dirname + '/../../dist/elodie/elodie') + ' import --source="' + args['source'] +  '" --destination="' + args['destination'] + '"';
+    //update_command = __dirname + '/../../elodie.py import --source="' + args['source'] +  '" --destination="' + args['destination'] + '"';
+
+    console.log(update_command);
+    exec(update_command, function(error, stdout, stderr) {
+      console.log('out ' + stdout);
+      console.log('err ' + stderr);
+      /*params['error'] = error
+      params['stdout'] = '[' + stdout.replace(/\n/g,',').replace(/\,+$/g, '').replace(/\n/g,'') + ']'
+      params['stderr'] = stderr
+      console.log('parsed')
+      console.log(params['stdout'])*/
+      event.sender.send('update-import-success', args);
+    });
   });
 };
 
@@ -73,34 +129,55 @@ exports.updatePhotos = function(event, args) {
     return files
   }
   files = normalize(args['files'])
-  elodie_path = path.normalize(__dirname + '/../../dist/elodie/elodie');
-  update_command = elodie_path +' update'
-  //update_command = __dirname + '/../../elodie.py update'
-  if(args['location'].length > 0) {
-    update_command += ' --location="' + args['location'] + '"';
-  }
-  if(args['album'].length > 0) {
-    update_command += ' --album="' + args['album'] + '"';
-  }
+
+  var job = {'paths': files},
+      statuses = [];
+  ['location', 'album', 'title'].forEach(function(key) {
+    if(args[key].length > 0) {
+      job[key] = args[key];
+    }
+  });
   if(args['datetime'].length > 0) {
-    update_command += ' --time="' + args['datetime'] + '"';
-  }
-  if(args['title'].length > 0) {
-    update_command += ' --title="' + args['title'] + '"';
+    job['time'] = args['datetime'];
   }
 
-  update_command += ' "' + files.join('" "') + '"'
-  
-  console.log(update_command)
-  exec(update_command, function(error, stdout, stderr) {
-    console.log('out ' + stdout)
-    console.log('err ' + stderr)
-    params['error'] = error
-    params['stdout'] = '[' + stdout.replace(/\n/g,',').replace(/\,+$/g, '').replace(/\n/g,'') + ']'
-    params['stderr'] = stderr
-    console.log('parsed')
-    console.log(params['stdout'])
+  runDaemonJob('update', job, function(progress) {
+    statuses.push({'source': progress['file'], 'destination': progress['destination'] || null});
+  }, function(error, result) {
+    params['error'] = error;
+    params['stdout'] = JSON.stringify(statuses);
+    params['stderr'] = '';
     event.sender.send('update-photos-success', params);
+  }, function() {
+    elodie_path = path.normalize(__dirname + '/../../dist/elodie/elodie');
+    update_command = elodie_path +' update'
+    //update_command = __dirname + '/../../elodie.py update'
+    if(args['location'].length > 0) {
+      update_command += ' --location="' + args['location'] + '"';
+    }
+    if(args['album'].length > 0) {
+      update_command += ' --album="' + args['album'] + '"';
+    }
+    if(args['datetime'].length > 0) {
+      update_command += ' --time="' + args['datetime'] + '"';
+    }
+    if(args['title'].length > 0) {
+      update_command += ' --title="' + args['title'] + '"';
+    }
+
+    update_command += ' "' + files.join('" "') + '"'
+
+    console.log(update_command)
+    exec(update_command, function(error, stdout, stderr) {
+      console.log('out ' + stdout)
+      console.log('err ' + stderr)
+      params['error'] = error
+      params['stdout'] = '[' + stdout.replace(/\n/g,',').replace(/\,+$/g, '').replace(/\n/g,'') + ']'
+      params['stderr'] = stderr
+      console.log('parsed')
+      console.log(params['stdout'])
+      event.sender.send('update-photos-success', params);
+    });
   });
 };
 
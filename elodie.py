@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 from __future__ import print_function
+import json
 import os
 import re
 import sys
@@ -9,21 +10,17 @@ import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import click
-from send2trash import send2trash
-
-# Verify that external dependencies are present first, so the user gets a
-# more user-friendly error instead of an ImportError traceback.
-from elodie.dependencies import verify_dependencies
-if not verify_dependencies():
-    sys.exit(1)
 
 from elodie import constants
 from elodie import geolocation_offline as geolocation
 from elodie import log
+from elodie import trace
 from elodie.compatability import _decode
 from elodie.config import load_config
+from elodie.daemon import Daemon
 from elodie.filesystem import FileSystem
 from elodie.localstorage import Db
+from elodie.metrics import MetricsWriter
 from elodie.media.base import Base, get_all_subclasses
 from elodie.media.media import Media
 from elodie.media.text import Text
@@ -31,7 +28,9 @@ from elodie.media.audio import Audio
 from elodie.media.photo import Photo
 from elodie.media.video import Video
 from elodie.plugins.plugins import Plugins
+from elodie.readahead import Readahead
 from elodie.result import Result
+from elodie.scan import Scan
 # ExifTool removed - using pure Python ExifRead library instead
 from elodie import constants
 from elodie.session_log import SessionLogger
@@ -42,9 +41,20 @@ FILESYSTEM = FileSystem()
 filesystem_lock = threading.Lock()
 logger_lock = threading.Lock()
 session_logger = None
+# Reads ahead of the files queued by the running import.
+readahead = None
+
+#: Returned by import_file for files which don't match --where.
+FILTERED = 'FILTERED'
+
+# Called with (file, status) for every result row. Set by `serve` to stream
+#  per-file progress to clients.
+progress_listener = None
 
 
-def import_file(_file, destination, album_from_folder, trash, allow_duplicates, subclasses):
+@trace.traced('import_file')
+def import_file(_file, destination, album_from_folder, trash, allow_duplicates, subclasses,
+                move=False, link=False, skip_similar=False, where=None):
     
     _file = _decode(_file)
     destination = _decode(destination)
@@ -70,8 +80,11 @@ def import_file(_file, destination, album_from_folder, trash, allow_duplicates,
                 session_logger.log_file_processed(_file, None, 'failed', 'Source cannot be in destination')
         return
 
+    if readahead is not None:
+        readahead.started(_file)
 
-    media = Media.get_class_by_file(_file, subclasses)
+    with trace.span('detect_type'):
+        media = Media.get_class_by_file(_file, subclasses)
     if not media:
         log.warn('Not a supported file (%s)' % _file)
         log.all('{"source":"%s", "error_msg":"Not a supported file"}' % _file)
@@ -83,11 +96,23 @@ def import_file(_file, destination, album_from_folder, trash, allow_duplicates,
     if album_from_folder:
         media.set_album_from_folder()
 
+    if where and not _matches_where(where, media, _file):
+        log.info('%s does not match --where. Skipping...' % _file)
+        if session_logger:
+            with logger_lock:
+                session_logger.log_file_processed(_file, None, 'skipped', 'Does not match --where')
+        return FILTERED
+
     # Use thread-safe filesystem operations
-    with filesystem_lock:
+    with trace.locked(filesystem_lock, 'filesystem_lock'):
         dest_path = FILESYSTEM.process_file(_file, destination,
-            media, allowDuplicate=allow_duplicates, move=False)
+            media, allowDuplicate=allow_duplicates, move=move, link=link,
+            skipSimilar=skip_similar)
     
+    if readahead is not None:
+        # Duplicates were read to hash them, their pages go too.
+        readahead.finished(_file, dest_path)
+
     if dest_path:
         log.all('%s -> %s' % (_file, dest_path))
         if session_logger:
@@ -108,6 +133,7 @@ def import_file(_file, destination, album_from_folder, trash, allow_duplicates,
                 session_logger.log_file_processed(_file, None, status, error_msg)
     
     if trash:
+        from send2trash import send2trash
         send2trash(_file)
 
     return dest_path or None
@@ -115,8 +141,118 @@ def import_file(_file, destination, album_from_folder, trash, allow_duplicates,
 
 def import_file_parallel(args):
     """Wrapper for import_file to work with parallel processing."""
-    _file, destination, album_from_folder, trash, allow_duplicates, subclasses = args
-    return import_file(_file, destination, album_from_folder, trash, allow_duplicates, subclasses)
+    _file, destination, album_from_folder, trash, allow_duplicates, subclasses, move, link, skip_similar, where = args
+    return import_file(_file, destination, album_from_folder, trash, allow_duplicates, subclasses,
+                       move, link, skip_similar, where)
+
+
+def _matches_where(where, media, _file):
+    """Check a file's metadata against the --where filters."""
+    from elodie.where import matches
+
+    with trace.span('where'):
+        metadata = media.get_metadata()
+        # Invalid files are reported by process_file.
+        return metadata is None or matches(where, metadata, _file)
+
+
+def import_archive(archive_path, destination, album_from_folder, allow_duplicates, subclasses,
+                   skip_similar=False, where=None, unsupported=None):
+    """Import the media in a zip or tar archive without extracting it.
+
+    Members are hashed as they are read and duplicates are skipped before
+    they're written. New members are staged in the destination and moved
+    into place.
+
+    :param list unsupported: Members which aren't media are appended to it.
+    :returns: generator of (source, dest_path) for every media member, where
+        source is the member's path inside the archive. dest_path is None if
+        the member wasn't imported and FILTERED if --where filtered it out.
+    """
+    from elodie import archive
+
+    extensions = set()
+    for cls in subclasses:
+        extensions.update(cls.extensions)
+
+    staging = archive.Staging(destination)
+    try:
+        for name, mtime, f in archive.members(archive_path):
+            if os.path.splitext(name)[1][1:].lower() not in extensions:
+                if unsupported is not None:
+                    unsupported.append(os.path.join(archive_path, name))
+                continue
+
+            source = os.path.join(archive_path, name)
+            with trace.span('archive.read'):
+                checksum, spool = staging.read(name, f)
+
+            with trace.locked(filesystem_lock, 'filesystem_lock'):
+                checksum = FILESYSTEM.process_checksum(source, allow_duplicates, checksum)
+            if checksum is None:
+                staging.discard(name)
+                log.warn('Skipping %s: File already exists (duplicate not allowed)' % source)
+                if session_logger:
+                    with logger_lock:
+                        session_logger.log_file_processed(
+                            source, None, 'skipped', 'File already exists (duplicate not allowed)'
+                        )
+                yield (source, None)
+                continue
+
+            try:
+                staged_path = staging.write(name, spool, mtime)
+                media = Media.get_class_by_file(staged_path, subclasses)
+                if album_from_folder and os.path.dirname(name):
+                    metadata = media.get_metadata()
+                    if metadata and metadata['album'] is None:
+                        media.set_album(os.path.basename(os.path.dirname(name)))
+
+                if where and not _matches_where(where, media, staged_path):
+                    log.info('%s does not match --where. Skipping...' % source)
+                    if session_logger:
+                        with logger_lock:
+                            session_logger.log_file_processed(source, None, 'skipped', 'Does not match --where')
+                    yield (source, FILTERED)
+                    continue
+
+                with trace.locked(filesystem_lock, 'filesystem_lock'):
+                    dest_path = FILESYSTEM.process_file(staged_path, destination,
+                        media, allowDuplicate=True, move=True, skipSimilar=skip_similar,
+                        checksum=checksum, source=source)
+            finally:
+                staging.discard(name)
+
+            if dest_path:
+                log.all('%s -> %s' % (source, dest_path))
+            if session_logger:
+                with logger_lock:
+                    if dest_path:
+                        session_logger.log_file_processed(source, dest_path, 'success')
+                    else:
+                        session_logger.log_file_processed(source, None, 'failed', 'Processing failed')
+            yield (source, dest_path or None)
+    finally:
+        staging.close()
+
+def _where(ctx, param, value):
+    from elodie.where import parse
+
+    try:
+        return parse(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+def _start_metrics(metrics_file, command, result, session_logger=None):
+    """Start writing Prometheus metrics if a metrics file was given.
+
+    :returns: :class:`~elodie.metrics.MetricsWriter` or None
+    """
+    if not metrics_file:
+        return None
+    metrics = MetricsWriter(metrics_file, command, result, session_logger)
+    metrics.start()
+    return metrics
 
 @click.command('batch')
 @click.option('--debug', default=False, is_flag=True,
@@ -140,21 +276,47 @@ def _batch(debug):
               help="Use images' folders as their album names.")
 @click.option('--trash', default=False, is_flag=True,
               help='After copying files, move the old files to the trash.')
+@click.option('--move', default=False, is_flag=True,
+              help='Move files instead of copying them. Files are renamed '
+                   'when the destination is on the same filesystem.')
+@click.option('--link', default=False, is_flag=True,
+              help='Hardlink files into the destination instead of copying '
+                   'them. Falls back to copying across filesystems.')
 @click.option('--allow-duplicates', default=False, is_flag=True,
               help='Import the file even if it\'s already been imported.')
+@click.option('--skip-similar', default=False, is_flag=True,
+              help='Skip images which look like one already in the destination, '
+                   'such as resized or re-encoded copies.')
+@click.option('--where', default=(), multiple=True, callback=_where,
+              help='Only import files matching this filter, like '
+                   '"date_taken>=2021-06", "camera_model~iphone", "size>5MB" '
+                   'or "has_gps". Checked before files are hashed or copied.')
 @click.option('--debug', default=False, is_flag=True,
               help='Override the value in constants.py with True.')
 @click.option('--exclude-regex', default=set(), multiple=True,
               help='Regular expression for directories or files to exclude.')
 @click.option('--workers', default=None, type=int,
               help='Number of parallel workers (default: CPU count)')
+@click.option('--trace', 'trace_file', default=None, type=click.Path(dir_okay=False),
+              help='Write per-stage timings to this file in Chrome trace '
+                   'format and print a latency summary.')
+@click.option('--metrics-file', default=None, type=click.Path(dir_okay=False),
+              help='Write Prometheus metrics to this file during the run '
+                   '(for the node_exporter textfile collector).')
 @click.argument('paths', nargs=-1, type=click.Path())
-def _import(destination, source, file, album_from_folder, trash, allow_duplicates, debug, exclude_regex, workers, paths):
+def _import(destination, source, file, album_from_folder, trash, move, link, allow_duplicates, skip_similar, where, debug, exclude_regex, workers, trace_file, metrics_file, paths):
     """Import files or directories by reading their EXIF and organizing them accordingly.
     """
     constants.debug = debug
     has_errors = False
-    result = Result()
+    result = Result(progress_listener)
+
+    if len([flag for flag in (trash, move, link) if flag]) > 1:
+        log.error('Only one of --trash, --move and --link can be used')
+        sys.exit(1)
+
+    if trace_file:
+        trace.enable()
 
     destination = _decode(destination)
     destination = os.path.abspath(os.path.expanduser(destination))
@@ -179,13 +341,19 @@ def _import(destination, source, file, album_from_folder, trash, allow_duplicate
     exclude_regex_list = set(exclude_regex)
 
     # Read all files first before starting any parallel processing
-    for path in paths:
-        path = os.path.expanduser(path)
-        if os.path.isdir(path):
-            files.update(FILESYSTEM.get_all_files(path, None, exclude_regex_list))
-        else:
-            if not FILESYSTEM.should_exclude(path, exclude_regex_list, True):
-                files.add(path)
+    from elodie.archive import is_archive
+    archives = set()
+    with trace.span('walk'):
+        for path in paths:
+            path = os.path.expanduser(path)
+            if os.path.isdir(path):
+                files.update(FILESYSTEM.get_all_files(path, None, exclude_regex_list))
+            elif is_archive(path):
+                archives.add(path)
+            else:
+                if not FILESYSTEM.should_exclude(path, exclude_regex_list, True):
+                    files.add(path)
+    archives = sorted(archives)
     
     # Convert to sorted list for consistent processing order
     files = sorted(list(files))
@@ -199,84 +367,157 @@ def _import(destination, source, file, album_from_folder, trash, allow_duplicate
         'file': file,
         'album_from_folder': album_from_folder,
         'trash': trash,
+        'move': move,
+        'link': link,
         'allow_duplicates': allow_duplicates,
-        'workers': workers
+        'skip_similar': skip_similar,
+        'where': [f.expression for f in where],
+        'workers': workers,
+        'trace': trace_file,
+        'metrics_file': metrics_file
     })
+    metrics = _start_metrics(metrics_file, 'import', result, session_logger)
     
     # Determine number of workers (default to CPU count, max 8)
     if workers is None:
         workers = min(os.cpu_count(), len(files), 8)
     
     print("Processing %d files with %d workers..." % (len(files), workers))
-    
-    if workers == 1 or len(files) <= 1:
-        # Single-threaded processing
-        completed_count = 0
-        for current_file in files:
-            dest_path = import_file(current_file, destination, album_from_folder,
-                        trash, allow_duplicates, subclasses)
+
+    if skip_similar:
+        # Built lazily it would be built under the filesystem lock by the
+        #  first worker while all the others wait.
+        print("Indexing images in %s..." % destination)
+        FILESYSTEM.get_similar_index(destination)
+
+    # Plugins with a before_batch() hook see the files in chunks up front.
+    FILESYSTEM.plugins.run_all_before_batch(files, destination)
+
+    global readahead
+    readahead = Readahead(files)
+    try:
+        if workers == 1 or len(files) <= 1:
+            # Single-threaded processing
+            completed_count = 0
+            for current_file in files:
+                dest_path = import_file(current_file, destination, album_from_folder,
+                            trash, allow_duplicates, subclasses, move, link, skip_similar, where)
             
-            # Only report as error if dest_path is None AND duplicates are allowed
-            # If duplicates are not allowed, None means skipped (not an error)
-            if dest_path:
-                result.append((current_file, dest_path))
-            elif allow_duplicates:
-                # This is a real error when duplicates are allowed
-                result.append((current_file, None))
-                has_errors = True
-            else:
-                # This is just a skipped file (duplicate not allowed)
-                result.append((current_file, 'SKIPPED'))
+                # Only report as error if dest_path is None AND duplicates are allowed
+                # If duplicates are not allowed, None means skipped (not an error)
+                if dest_path == FILTERED:
+                    result.append((current_file, FILTERED))
+                elif dest_path:
+                    result.append((current_file, dest_path), os.path.getsize(dest_path))
+                elif allow_duplicates:
+                    # This is a real error when duplicates are allowed
+                    result.append((current_file, None))
+                    has_errors = True
+                else:
+                    # This is just a skipped file (duplicate not allowed)
+                    result.append((current_file, 'SKIPPED'))
             
-            has_errors = has_errors is True or (not dest_path and allow_duplicates)
+                has_errors = has_errors is True or (not dest_path and allow_duplicates)
             
-            completed_count += 1
-            if completed_count % 10 == 0 or completed_count == len(files):
-                print("Processed %d/%d files" % (completed_count, len(files)))
-    else:
-        # Multi-threaded processing
-        file_args = [(current_file, destination, album_from_folder, trash, allow_duplicates, subclasses) 
-                     for current_file in files]
+                completed_count += 1
+                if completed_count % 10 == 0 or completed_count == len(files):
+                    print("Processed %d/%d files" % (completed_count, len(files)))
+        else:
+            # Multi-threaded processing
+            file_args = [(current_file, destination, album_from_folder, trash, allow_duplicates, subclasses,
+                          move, link, skip_similar, where)
+                         for current_file in files]
         
-        completed_count = 0
-        with ThreadPoolExecutor(max_workers=workers) as executor:
-            # Submit all tasks
-            future_to_file = {executor.submit(import_file_parallel, args): args[0] 
-                             for args in file_args}
+            completed_count = 0
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # Submit all tasks
+                future_to_file = {executor.submit(import_file_parallel, args): args[0] 
+                                 for args in file_args}
             
-            # Process completed tasks
-            for future in as_completed(future_to_file):
-                current_file = future_to_file[future]
-                try:
-                    dest_path = future.result()
+                # Process completed tasks
+                for future in as_completed(future_to_file):
+                    current_file = future_to_file[future]
+                    try:
+                        dest_path = future.result()
                     
-                    # Only report as error if dest_path is None AND duplicates are allowed
-                    # If duplicates are not allowed, None means skipped (not an error)
-                    if dest_path:
-                        result.append((current_file, dest_path))
-                    elif allow_duplicates:
-                        # This is a real error when duplicates are allowed
-                        result.append((current_file, None))
-                        has_errors = True
-                    else:
-                        # This is just a skipped file (duplicate not allowed)
-                        result.append((current_file, 'SKIPPED'))
+                        # Only report as error if dest_path is None AND duplicates are allowed
+                        # If duplicates are not allowed, None means skipped (not an error)
+                        if dest_path == FILTERED:
+                            result.append((current_file, FILTERED))
+                        elif dest_path:
+                            result.append((current_file, dest_path), os.path.getsize(dest_path))
+                        elif allow_duplicates:
+                            # This is a real error when duplicates are allowed
+                            result.append((current_file, None))
+                            has_errors = True
+                        else:
+                            # This is just a skipped file (duplicate not allowed)
+                            result.append((current_file, 'SKIPPED'))
                     
-                    has_errors = has_errors is True or (not dest_path and allow_duplicates)
+                        has_errors = has_errors is True or (not dest_path and allow_duplicates)
                     
-                    completed_count += 1
-                    if completed_count % 10 == 0 or completed_count == len(files):
-                        print("Processed %d/%d files" % (completed_count, len(files)))
+                        completed_count += 1
+                        if completed_count % 10 == 0 or completed_count == len(files):
+                            print("Processed %d/%d files" % (completed_count, len(files)))
                         
-                except Exception as exc:
-                    print("Error processing %s: %s" % (current_file, exc))
-                    result.append((current_file, None))
-                    has_errors = True
-                    if session_logger:
-                        with logger_lock:
-                            session_logger.log_error(str(exc), current_file)
-    
+                    except Exception as exc:
+                        print("Error processing %s: %s" % (current_file, exc))
+                        result.append((current_file, None))
+                        has_errors = True
+                        if session_logger:
+                            with logger_lock:
+                                session_logger.log_error(str(exc), current_file)
+    finally:
+        # Left set, a later import in the process would read ahead of
+        #  files it never queued.
+        readahead = None
+
+
+    # Archives are read front to back, one member at a time.
+    for archive_path in archives:
+        print("Importing from archive %s..." % archive_path)
+        archive_has_errors = False
+        # Members which weren't imported, or found to be duplicates, are
+        #  only in the archive.
+        left_behind = []
+        try:
+            for source, dest_path in import_archive(archive_path, destination, album_from_folder,
+                                                    allow_duplicates, subclasses, skip_similar, where,
+                                                    left_behind):
+                if dest_path == FILTERED:
+                    left_behind.append(source)
+                    result.append((source, FILTERED))
+                elif dest_path:
+                    result.append((source, dest_path), os.path.getsize(dest_path))
+                elif allow_duplicates:
+                    result.append((source, None))
+                    archive_has_errors = True
+                else:
+                    result.append((source, 'SKIPPED'))
+        except Exception as exc:
+            print("Error reading archive %s: %s" % (archive_path, exc))
+            result.append((archive_path, None))
+            archive_has_errors = True
+            if session_logger:
+                with logger_lock:
+                    session_logger.log_error(str(exc), archive_path)
+
+        has_errors = has_errors or archive_has_errors
+        if trash and left_behind and not archive_has_errors:
+            log.warn('Not trashing %s, %d members were not imported' % (archive_path, len(left_behind)))
+        elif trash and not archive_has_errors:
+            from send2trash import send2trash
+            send2trash(archive_path)
+
     print("Completed processing %d files" % len(files))
+
+    # Wait for plugins which run after() in the background before closing
+    #  the session so their failures make it into the log.
+    for error in FILESYSTEM.plugins.drain():
+        session_logger.log_error(
+            'Plugin {} failed: {}'.format(error['plugin'], error['message']),
+            error['file']
+        )
     
     # Finalize session log
     log_file = session_logger.finalize_session()
@@ -285,45 +526,102 @@ def _import(destination, source, file, album_from_folder, trash, allow_duplicate
 
     result.write()
 
+    if metrics is not None:
+        metrics.finish()
+
+    if trace_file:
+        trace.tracer.write_summary()
+        trace.tracer.write_chrome_trace(trace_file)
+        print("Trace saved to: %s" % trace_file)
+        trace.disable()
+
     if has_errors:
         sys.exit(1)
 
 
+@click.command('scan')
+@click.option('--source', type=click.Path(file_okay=False),
+              required=True, help='Directory to scan.')
+@click.option('--debug', default=False, is_flag=True,
+              help='Override the value in constants.py with True.')
+@click.option('--exclude-regex', default=set(), multiple=True,
+              help='Regular expression for directories or files to exclude.')
+def _scan(source, debug, exclude_regex):
+    """Report which files an import would copy without copying anything.
+    """
+    constants.debug = debug
+    source = os.path.abspath(os.path.expanduser(_decode(source)))
+
+    if not os.path.isdir(source):
+        log.error('Source is not a valid directory %s' % source)
+        sys.exit(1)
+
+    # if no exclude list was passed in we check if there's a config
+    if len(exclude_regex) == 0:
+        config = load_config()
+        if 'Exclusions' in config:
+            exclude_regex = [value for key, value in config.items('Exclusions')]
+
+    subclasses = get_all_subclasses(Base)
+    scan = Scan(FILESYSTEM)
+    for current_file in sorted(FILESYSTEM.get_all_files(source, None, set(exclude_regex))):
+        scan.scan_file(current_file, subclasses)
+        log.progress()
+
+    log.progress('', True)
+    scan.write()
+
+
 @click.command('generate-db')
 @click.option('--source', type=click.Path(file_okay=False),
               required=True, help='Source of your photo library.')
 @click.option('--debug', default=False, is_flag=True,
               help='Override the value in constants.py with True.')
-def _generate_db(source, debug):
+@click.option('--metrics-file', default=None, type=click.Path(dir_okay=False),
+              help='Write Prometheus metrics to this file during the run '
+                   '(for the node_exporter textfile collector).')
+def _generate_db(source, debug, metrics_file):
     """Regenerate the hash.json database which contains all of the sha256 signatures of media files. The hash.json file is located at ~/.elodie/.
     """
     constants.debug = debug
-    result = Result()
+    result = Result(progress_listener)
     source = os.path.abspath(os.path.expanduser(source))
 
     if not os.path.isdir(source):
         log.error('Source is not a valid directory %s' % source)
         sys.exit(1)
         
+    metrics = _start_metrics(metrics_file, 'generate-db', result)
     db = Db()
     db.backup_hash_db()
     db.reset_hash_db()
 
     for current_file in FILESYSTEM.get_all_files(source):
-        result.append((current_file, True))
-        db.add_hash(db.checksum(current_file), current_file)
+        result.append((current_file, True), os.path.getsize(current_file))
+        db.add_hash(db.checksum(current_file, library=True), current_file)
         log.progress()
     
     db.update_hash_db()
     log.progress('', True)
     result.write()
 
+    if metrics is not None:
+        metrics.finish()
+
 @click.command('verify')
+@click.option('--trust-xattr', default=False, is_flag=True,
+              help='Use checksums [Checksum] xattr cached for files whose '
+                   'mtime and size are unchanged. Faster, but misses '
+                   'corruption which left the mtime alone.')
 @click.option('--debug', default=False, is_flag=True,
               help='Override the value in constants.py with True.')
-def _verify(debug):
+@click.option('--metrics-file', default=None, type=click.Path(dir_okay=False),
+              help='Write Prometheus metrics to this file during the run '
+                   '(for the node_exporter textfile collector).')
+def _verify(trust_xattr, debug, metrics_file):
     constants.debug = debug
-    result = Result()
+    result = Result(progress_listener)
+    metrics = _start_metrics(metrics_file, 'verify', result)
     db = Db()
     for checksum, file_path in db.all():
         if not os.path.isfile(file_path):
@@ -331,17 +629,199 @@ def _verify(debug):
             log.progress('x')
             continue
 
-        actual_checksum = db.checksum(file_path)
+        actual_checksum = db.checksum(file_path, library=True, cached=trust_xattr)
         if checksum == actual_checksum:
-            result.append((file_path, True))
+            result.append((file_path, True), os.path.getsize(file_path))
             log.progress()
         else:
-            result.append((file_path, False))
+            result.append((file_path, False), os.path.getsize(file_path))
             log.progress('x')
 
     log.progress('', True)
     result.write()
 
+    if metrics is not None:
+        metrics.finish()
+
+
+def _catalog_date(ctx, param, value):
+    """Validate a YYYY-MM-DD[ HH:MM:SS] date for catalog queries."""
+    if value is None:
+        return None
+    for date_format in ('%Y-%m-%d', '%Y-%m-%d %H:%M:%S'):
+        try:
+            return datetime.strptime(value, date_format).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            pass
+    raise click.BadParameter('use YYYY-mm-dd or YYYY-mm-dd hh:ii:ss')
+
+
+def _catalog_coordinates(ctx, param, value):
+    """Validate a LATITUDE,LONGITUDE pair."""
+    if value is None:
+        return None
+    try:
+        latitude, longitude = [float(part) for part in value.split(',')]
+    except ValueError:
+        raise click.BadParameter('use LATITUDE,LONGITUDE like 41.88,-87.63')
+    return (latitude, longitude)
+
+
+@click.command('query')
+@click.option('--camera', help='Camera make or model, like "Canon" or "iPhone 12 Pro".')
+@click.option('--year', type=int, help='Year the media was taken.')
+@click.option('--after', callback=_catalog_date,
+              help='Taken on or after this date (YYYY-mm-dd[ hh:ii:ss]).')
+@click.option('--before', callback=_catalog_date,
+              help='Taken before this date (YYYY-mm-dd[ hh:ii:ss]).')
+@click.option('--place', help='City, state or country, like "Chicago".')
+@click.option('--album', help='Album name.')
+@click.option('--title', help='Text contained in the title.')
+@click.option('--type', 'mime_type',
+              help='Mime type or prefix, like "image/" or "video/mp4".')
+@click.option('--near', callback=_catalog_coordinates,
+              help='LATITUDE,LONGITUDE to search around.')
+@click.option('--radius', type=float, default=5, show_default=True,
+              help='Distance from --near in kilometers.')
+@click.option('--limit', type=int, help='Return at most this many files.')
+@click.option('--json', 'output_json', default=False, is_flag=True,
+              help='Print every match as a JSON object.')
+@click.option('--count', default=False, is_flag=True,
+              help='Only print the number of matches.')
+def _query(camera, year, after, before, place, album, title, mime_type, near,
+           radius, limit, output_json, count):
+    """Find imported media in the catalog without reading any files.
+    """
+    records = FILESYSTEM.catalog.query(
+        camera=camera, after=after, before=before, year=year, place=place,
+        album=album, title=title, mime_type=mime_type, near=near,
+        radius=radius, limit=limit
+    )
+
+    if count:
+        print(len(records))
+    elif output_json:
+        for record in records:
+            print(json.dumps(record))
+    else:
+        for record in records:
+            print(record['path'])
+
+
+@click.command('relayout')
+@click.option('--destination', type=click.Path(file_okay=False),
+              required=True, help='Library to move into the configured layout.')
+@click.option('--workers', default=None, type=int,
+              help='Number of parallel renames (default: CPU count)')
+@click.option('--dry-run', default=False, is_flag=True,
+              help='Print the moves without making them.')
+@click.option('--debug', default=False, is_flag=True,
+              help='Override the value in constants.py with True.')
+def _relayout(destination, workers, dry_run, debug):
+    """Move imported files into the folder and file names the config
+    currently asks for. Uses the catalog instead of reading media, files
+    only in the hash db are catalogued first.
+    """
+    from elodie.relayout import Relayout
+
+    constants.debug = debug
+    destination = os.path.abspath(os.path.expanduser(_decode(destination)))
+    if not os.path.isdir(destination):
+        log.error('Destination is not a valid directory %s' % destination)
+        sys.exit(1)
+
+    if workers is None:
+        workers = min(os.cpu_count(), 8)
+
+    relayout = Relayout(FILESYSTEM, destination)
+    if dry_run:
+        if os.path.isfile(relayout.journal_file):
+            print('An interrupted relayout will be finished first')
+        for old, new, checksum in relayout.plan():
+            print('%s -> %s' % (old, new))
+        relayout.write()
+        return
+
+    recovered = relayout.recover(workers)
+    if recovered is not None:
+        print('Finished interrupted relayout of %s' % recovered)
+
+    moves = relayout.plan()
+    print("Moving %d files with %d workers..." % (len(moves), workers))
+    relayout.execute(moves, workers)
+    relayout.write()
+
+    if relayout.errors:
+        sys.exit(1)
+
+
+@click.command('sync')
+@click.option('--source', type=click.Path(file_okay=False),
+              required=True, help='Library to back up.')
+@click.option('--to', 'destination', type=click.Path(file_okay=False),
+              required=True, help='Directory to keep the backup in.')
+@click.option('--verify', default=False, is_flag=True,
+              help='Hash every copy before putting it in place.')
+@click.option('--debug', default=False, is_flag=True,
+              help='Override the value in constants.py with True.')
+def _sync(source, destination, verify, debug):
+    """Copy files imported into a library since the last sync to a backup
+    and repeat moves made in the library there as renames.
+    """
+    from elodie.sync import Sync
+
+    constants.debug = debug
+    source = os.path.abspath(os.path.expanduser(_decode(source)))
+    destination = os.path.abspath(os.path.expanduser(_decode(destination)))
+    if not os.path.isdir(source):
+        log.error('Source is not a valid directory %s' % source)
+        sys.exit(1)
+
+    sync = Sync(source, destination, verify)
+    sync.run()
+    log.progress('', True)
+    sync.write()
+
+    if sync.errors:
+        sys.exit(1)
+
+
+@click.command('find-similar')
+@click.option('--destination', type=click.Path(file_okay=False),
+              help='Only look at images in this library.')
+@click.option('--distance', type=int, default=None,
+              help='Number of bits in which the perceptual hashes of similar '
+                   'images may differ (default: %d).' % constants.similarity_distance)
+@click.option('--workers', default=None, type=int,
+              help='Number of parallel workers hashing images (default: CPU count)')
+@click.option('--json', 'output_json', default=False, is_flag=True,
+              help='Print every group as a JSON list.')
+@click.option('--debug', default=False, is_flag=True,
+              help='Override the value in constants.py with True.')
+def _find_similar(destination, distance, workers, output_json, debug):
+    """Find groups of catalogued images which look alike, such as resized
+    or re-encoded copies. Images are hashed the first time they're seen.
+    """
+    from elodie.similarity import group_similar, hash_catalog
+
+    constants.debug = debug
+    if destination:
+        destination = os.path.abspath(os.path.expanduser(_decode(destination)))
+
+    images = hash_catalog(FILESYSTEM.catalog, destination, workers)
+    groups = group_similar(images, distance)
+
+    if output_json:
+        for group in groups:
+            print(json.dumps(group))
+        return
+
+    for group in groups:
+        for path in group:
+            print(path)
+        print('')
+    print('Found %d groups of similar images among %d images' % (len(groups), len(images)))
+
 
 def update_location(media, file_path, location_name):
     """Update location exif metadata of media.
@@ -394,7 +874,7 @@ def _update(album, location, time, title, paths, debug):
     """
     constants.debug = debug
     has_errors = False
-    result = Result()
+    result = Result(progress_listener)
 
     files = set()
     for path in paths:
@@ -491,22 +971,113 @@ def _update(album, location, time, title, paths, debug):
             has_errors = False
             result.append((current_file, False))
 
+    for error in FILESYSTEM.plugins.drain():
+        log.error('Plugin {} failed for {}: {}'.format(
+            error['plugin'], error['file'], error['message']))
+
     result.write()
     
     if has_errors:
         sys.exit(1)
 
 
+def _params_to_args(params):
+    """Convert JSON-RPC params into command line arguments.
+
+    {'destination': '/a', 'allow_duplicates': True, 'paths': ['/b']}
+    becomes ['--destination', '/a', '--allow-duplicates', '/b'].
+    """
+    args = []
+    for key, value in sorted(params.items()):
+        if key == 'paths':
+            continue
+        option = '--%s' % key.replace('_', '-')
+        if value is True:
+            args.append(option)
+        elif value is False or value is None:
+            continue
+        elif isinstance(value, list):
+            for item in value:
+                args.extend([option, str(item)])
+        else:
+            args.extend([option, str(value)])
+    args.extend(params.get('paths', []))
+    return args
+
+
+def _serve_command(command):
+    """Build a daemon handler which runs a click command in process."""
+    def handler(params, emit):
+        global progress_listener
+
+        def listener(file_path, status):
+            event = {'file': file_path, 'status': 'success'}
+            if status == 'SKIPPED':
+                event['status'] = 'skipped'
+            elif status == FILTERED:
+                event['status'] = 'filtered'
+            elif not status:
+                event['status'] = 'error'
+            elif status is not True:
+                event['destination'] = status
+            emit('progress', event)
+
+        progress_listener = listener
+        try:
+            command.main(args=_params_to_args(params), prog_name=command.name,
+                         standalone_mode=False)
+            exit_code = 0
+        except SystemExit as e:
+            exit_code = e.code or 0
+        finally:
+            progress_listener = None
+        return {'exit_code': exit_code}
+    return handler
+
+
+@click.command('serve')
+@click.option('--socket', 'socket_path', default=None, type=click.Path(dir_okay=False),
+              help='Unix socket to listen on (default: ~/.elodie/elodie.sock).')
+@click.option('--debug', default=False, is_flag=True,
+              help='Override the value in constants.py with True.')
+def _serve(socket_path, debug):
+    """Run a local daemon which accepts import, update and verify jobs.
+    """
+    constants.debug = debug
+
+    # Pay for plugins, path templates and the geocoder once instead of
+    #  once per job.
+    FILESYSTEM.plugins.load()
+    FILESYSTEM.get_folder_path_definition()
+    FILESYSTEM.get_file_name_definition()
+    geolocation.load_geocoder()
+
+    daemon = Daemon(socket_path)
+    daemon.register('import', _serve_command(_import))
+    daemon.register('update', _serve_command(_update))
+    daemon.register('verify', _serve_command(_verify))
+    daemon.register('generate-db', _serve_command(_generate_db))
+
+    print("Listening on %s" % daemon.socket_path)
+    daemon.serve_forever()
+
+
 @click.group()
 def main():
     pass
 
 
 main.add_command(_import)
+main.add_command(_scan)
 main.add_command(_update)
 main.add_command(_generate_db)
 main.add_command(_verify)
+main.add_command(_query)
+main.add_command(_relayout)
+main.add_command(_sync)
+main.add_command(_find_similar)
 main.add_command(_batch)
+main.add_command(_serve)
 
 
 if __name__ == '__main__':
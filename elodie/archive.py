@@ -0,0 +1,137 @@
+"""
+Read media straight out of zip and tar archives.
+
+Members are read once, in archive order, and hashed while they are read.
+Members up to :data:`~elodie.constants.archive_spool_size` are held in
+memory so a duplicate is dropped without writing anything. New members are
+written to a staging directory inside the destination, from where an import
+renames them into place.
+"""
+from __future__ import print_function
+from builtins import object
+
+import hashlib
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+
+from elodie import constants
+
+#: File name endings of the archives an import reads from.
+EXTENSIONS = (
+    '.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz'
+)
+
+#: Bytes read from a member at a time.
+BLOCK_SIZE = 1024 * 1024
+
+
+def is_archive(path):
+    """Check if a path is a zip or tar archive elodie can import from."""
+    return path.lower().endswith(EXTENSIONS) and os.path.isfile(path)
+
+
+def members(path):
+    """Iterate over the regular files in an archive.
+
+    Tar archives are read as a stream so every member has to be consumed
+    before the next one is requested.
+
+    :param str path: Path of the archive.
+    :returns: generator of (name, mtime, file object)
+    """
+    if path.lower().endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                with archive.open(info) as f:
+                    yield (info.filename, mtime, f)
+        return
+
+    with tarfile.open(path, 'r|*') as archive:
+        for info in archive:
+            if not info.isfile():
+                continue
+            f = archive.extractfile(info)
+            yield (info.name, info.mtime, f)
+            f.close()
+
+
+class Staging(object):
+    """Stage archive members in a hidden directory inside `destination`.
+
+    The directory is on the destination's filesystem so moving a staged
+    member into the library is a rename.
+
+    :param str destination: Library the members are imported into.
+    :param int spool_size: Members up to this many bytes are hashed in
+        memory, defaults to :data:`~elodie.constants.archive_spool_size`.
+    """
+
+    def __init__(self, destination, spool_size=None):
+        if spool_size is None:
+            spool_size = constants.archive_spool_size
+        self.spool_size = spool_size
+        if not os.path.isdir(destination):
+            os.makedirs(destination)
+        self.directory = tempfile.mkdtemp(prefix='.elodie-archive-', dir=destination)
+
+    def read(self, name, f):
+        """Hash a member, keeping it in memory while it's small.
+
+        :returns: tuple (sha256, spool) where spool is passed to
+            :func:`write` or :func:`discard`.
+        """
+        hasher = hashlib.sha256()
+        chunks = []
+        size = 0
+        staged = None
+        while True:
+            chunk = f.read(BLOCK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            if staged is None:
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > self.spool_size:
+                    # Too large to hold, write it out as we go.
+                    staged = open(self.path(name), 'wb')
+                    staged.writelines(chunks)
+                    chunks = None
+            else:
+                staged.write(chunk)
+
+        if staged is not None:
+            staged.close()
+            return (hasher.hexdigest(), None)
+        return (hasher.hexdigest(), chunks)
+
+    def write(self, name, spool, mtime):
+        """Write a member read by :func:`read` to the staging directory.
+
+        :returns: str path of the staged file, named like the member.
+        """
+        path = self.path(name)
+        if spool is not None:
+            with open(path, 'wb') as f:
+                f.writelines(spool)
+        # Dates fall back to the file's mtime so keep the archived one.
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def discard(self, name):
+        path = self.path(name)
+        if os.path.lexists(path):
+            os.remove(path)
+
+    def path(self, name):
+        return os.path.join(self.directory, os.path.basename(name))
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,240 @@
+"""
+A Bloom filter of the checksums in other libraries.
+
+Checking whether a file is already in any of several libraries (this year's,
+a cold archive, a partner's share) used to mean loading the hash.json of each
+of them. Configure them under `[Libraries]` in config.ini::
+
+    [Libraries]
+    hash_dbs=/mnt/archive/.elodie/hash.json
+        /mnt/partner/.elodie/hash.json
+    false_positive_rate=0.001
+
+and :func:`~elodie.filesystem.FileSystem.process_checksum` probes a filter
+built from all of them first. Only a checksum the filter may contain is
+looked up in their hash dbs, so a new file costs one probe of an mmap'd file.
+
+The filter is kept at :data:`~elodie.constants.library_filter` with the
+size and mtime of every hash db it was built from and the false positive
+rate it was sized for, and is rebuilt when any of them changes.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from builtins import object
+
+import json
+import math
+import mmap
+import os
+import struct
+
+from elodie import compatability
+from elodie import constants
+from elodie import log
+from elodie.config import load_config
+from elodie.hashindex import HashIndex, digest
+
+#: Magic, number of bits, number of hashes, number of entries added and the
+#:  length of the JSON list of sources which follows.
+HEADER = struct.Struct('<8sQQQQ')
+
+MAGIC = b'ELODBLM1'
+
+
+def get_library_hash_dbs():
+    """Get the hash dbs of other libraries from config.ini.
+
+    Configured with `hash_dbs` under `[Libraries]`, one path per line.
+
+    :returns: list of str
+    """
+    config = load_config()
+    if 'Libraries' not in config or 'hash_dbs' not in config['Libraries']:
+        return []
+    return [
+        os.path.abspath(os.path.expanduser(line.strip()))
+        for line in config['Libraries']['hash_dbs'].splitlines()
+        if line.strip()
+    ]
+
+
+def get_false_positive_rate():
+    """Get the false positive rate of the library filter from config.ini.
+
+    Configured with `false_positive_rate` under `[Libraries]`.
+
+    :returns: float
+    """
+    config = load_config()
+    if 'Libraries' in config and 'false_positive_rate' in config['Libraries']:
+        try:
+            rate = float(config['Libraries']['false_positive_rate'])
+            if 0 < rate < 1:
+                return rate
+        except ValueError:
+            pass
+        log.warn('Invalid [Libraries] false_positive_rate, using default')
+    return constants.library_false_positive_rate
+
+
+class BloomFilter(object):
+    """A Bloom filter of sha256 digests.
+
+    Digests are uniformly distributed already so the bit positions are
+    derived from their first 16 bytes by double hashing.
+
+    :param int size: Number of bits.
+    :param int hashes: Number of bits set per digest.
+    :param bits: bytearray or mmap of `size` bits, all unset by default.
+    """
+
+    def __init__(self, size, hashes, bits=None, count=0):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bits if bits is not None else bytearray((size + 7) // 8)
+        self.count = count
+
+    @classmethod
+    def for_capacity(cls, capacity, false_positive_rate):
+        """Create a filter for `capacity` digests at the given error rate."""
+        capacity = max(capacity, 1)
+        size = int(math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        size = max(size, 64)
+        hashes = max(1, int(round(size / capacity * math.log(2))))
+        return cls(size, hashes)
+
+    def _positions(self, record_digest):
+        h1 = int.from_bytes(record_digest[:8], 'little')
+        h2 = int.from_bytes(record_digest[8:16], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, record_digest):
+        for position in self._positions(record_digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, record_digest):
+        bits = self.bits
+        for position in self._positions(record_digest):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def update(self, other):
+        """Merge another filter into this one.
+
+        Both must have the same size and number of hashes.
+        """
+        if (self.size, self.hashes) != (other.size, other.hashes):
+            raise ValueError('Filters of different sizes cannot be merged')
+        merged = int.from_bytes(self.bits, 'little') | int.from_bytes(other.bits, 'little')
+        self.bits = bytearray(merged.to_bytes(len(self.bits), 'little'))
+        self.count += other.count
+
+    def save(self, path, sources=()):
+        """Write the filter to `path`.
+
+        :param sources: What it was built from, anything JSON can store.
+        """
+        sources = json.dumps(sources).encode('utf-8')
+        tmp = '%s.tmp' % path
+        with open(tmp, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, self.size, self.hashes, self.count, len(sources)))
+            f.write(sources)
+            f.write(self.bits)
+        compatability._rename(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Open a filter written by :func:`save` without reading its bits.
+
+        :returns: tuple (BloomFilter, sources) or None if `path` isn't a
+            filter.
+        """
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(HEADER.size)
+                if len(header) != HEADER.size:
+                    return None
+                magic, size, hashes, count, sources_length = HEADER.unpack(header)
+                if magic != MAGIC:
+                    return None
+                sources = json.loads(f.read(sources_length).decode('utf-8'))
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError):
+            return None
+        start = HEADER.size + sources_length
+        bits = memoryview(buf)[start:start + (size + 7) // 8]
+        if len(bits) != (size + 7) // 8:
+            return None
+        return (cls(size, hashes, bits, count), sources)
+
+
+def _source(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return [path, None, None]
+    return [path, stat.st_size, stat.st_mtime_ns]
+
+
+class LibraryFilter(object):
+    """Find checksums in the hash dbs of other libraries.
+
+    :param list hash_dbs: Paths of the hash.json of each library.
+    :param str path: Where the filter is kept, defaults to
+        :data:`~elodie.constants.library_filter`.
+    :param float false_positive_rate: Defaults to
+        :func:`get_false_positive_rate`.
+    """
+
+    def __init__(self, hash_dbs, path=None, false_positive_rate=None):
+        self.hash_dbs = hash_dbs
+        self.path = path or constants.library_filter
+        if false_positive_rate is None:
+            false_positive_rate = get_false_positive_rate()
+        self.false_positive_rate = false_positive_rate
+        self._indexes = {}
+
+        sources = {
+            'hash_dbs': [_source(hash_db) for hash_db in hash_dbs],
+            'false_positive_rate': false_positive_rate
+        }
+        loaded = BloomFilter.load(self.path)
+        if loaded is not None and loaded[1] == sources:
+            self.filter = loaded[0]
+        else:
+            self.filter = self.build(sources)
+
+    def build(self, sources):
+        """Build the filter from every hash db and save it."""
+        log.info('Building the filter of %d libraries' % len(self.hash_dbs))
+        indexes = [
+            HashIndex(hash_db, read_only=True)
+            for hash_db in self.hash_dbs if os.path.isfile(hash_db)
+        ]
+        capacity = sum(index.record_count for index in indexes)
+        bloom = BloomFilter.for_capacity(capacity, self.false_positive_rate)
+        for index in indexes:
+            for record_digest in index.iterdigests():
+                bloom.add(record_digest)
+            index.close()
+        bloom.save(self.path, sources)
+        return bloom
+
+    def find(self, checksum):
+        """Find a checksum in the other libraries.
+
+        :returns: str path the checksum was recorded with, or None.
+        """
+        if digest(checksum) not in self.filter:
+            return None
+        for hash_db in self.hash_dbs:
+            if hash_db not in self._indexes:
+                if not os.path.isfile(hash_db):
+                    continue
+                self._indexes[hash_db] = HashIndex(hash_db, read_only=True)
+            path = self._indexes[hash_db].get(checksum)
+            if path is not None:
+                return path
+        return None
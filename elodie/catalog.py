@@ -0,0 +1,362 @@
+"""
+Catalog of imported media and their metadata.
+
+Imports record the metadata elodie already reads (date, camera, location,
+album, title, type and size) for every file they write, keyed by the file's
+path in the library. Questions about the library can then be answered with
+an indexed SQLite query instead of walking and parsing every file.
+"""
+from __future__ import print_function
+from builtins import object
+
+import os
+import sqlite3
+import threading
+import time
+from math import asin, cos, radians, sin, sqrt
+
+from elodie import constants
+
+#: Columns of the media table in the order records are returned.
+COLUMNS = (
+    'path', 'checksum', 'source', 'original_name', 'date_taken', 'camera_make', 'camera_model',
+    'latitude', 'longitude', 'city', 'state', 'country', 'place', 'album',
+    'title', 'mime_type', 'size', 'imported', 'dhash', 'phash'
+)
+
+SCHEMA_VERSION = 3
+
+#: Columns added after the first version, created on open if missing.
+ADDED_COLUMNS = (
+    ('original_name', 'TEXT'),
+    ('dhash', 'TEXT'),
+    ('phash', 'TEXT')
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    path TEXT PRIMARY KEY,
+    checksum TEXT,
+    source TEXT,
+    original_name TEXT,
+    date_taken TEXT,
+    camera_make TEXT COLLATE NOCASE,
+    camera_model TEXT COLLATE NOCASE,
+    latitude REAL,
+    longitude REAL,
+    city TEXT COLLATE NOCASE,
+    state TEXT COLLATE NOCASE,
+    country TEXT COLLATE NOCASE,
+    place TEXT COLLATE NOCASE,
+    album TEXT COLLATE NOCASE,
+    title TEXT,
+    mime_type TEXT,
+    size INTEGER,
+    imported TEXT,
+    dhash TEXT,
+    phash TEXT
+);
+CREATE INDEX IF NOT EXISTS media_date_taken ON media (date_taken);
+CREATE INDEX IF NOT EXISTS media_camera_make ON media (camera_make);
+CREATE INDEX IF NOT EXISTS media_camera_model ON media (camera_model);
+CREATE INDEX IF NOT EXISTS media_latitude ON media (latitude);
+CREATE INDEX IF NOT EXISTS media_city ON media (city);
+CREATE INDEX IF NOT EXISTS media_state ON media (state);
+CREATE INDEX IF NOT EXISTS media_country ON media (country);
+CREATE INDEX IF NOT EXISTS media_place ON media (place);
+CREATE INDEX IF NOT EXISTS media_album ON media (album);
+CREATE INDEX IF NOT EXISTS media_checksum ON media (checksum);
+CREATE INDEX IF NOT EXISTS media_size ON media (size);
+"""
+
+# Kilometers per degree of latitude, used to bound --near queries.
+KM_PER_DEGREE = 111.32
+
+
+class Catalog(object):
+    """A SQLite catalog of imported media at
+       %application_directory%/catalog.db.
+
+    Import threads share the connection so access is serialized with a lock.
+
+    :param str db_file: Path of the catalog, defaults to
+        :data:`~elodie.constants.catalog_db`.
+    """
+
+    def __init__(self, db_file=None):
+        self.db_file = db_file or constants.catalog_db
+        if not os.path.isdir(os.path.dirname(self.db_file)):
+            os.makedirs(os.path.dirname(self.db_file))
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        # WAL keeps queries from blocking on a running import and NORMAL
+        #  syncs on checkpoints instead of on every file.
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            columns = [row[1] for row in self.connection.execute('PRAGMA table_info(media)')]
+            for column, column_type in ADDED_COLUMNS:
+                if column not in columns:
+                    self.connection.execute(
+                        'ALTER TABLE media ADD COLUMN %s %s' % (column, column_type)
+                    )
+            self.connection.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+
+    def add(self, path, checksum, metadata, place=None, size=None, source=None, replaces=None,
+            hashes=None):
+        """Record a file written to the library.
+
+        :param str path: Path of the file in the library.
+        :param str checksum: sha256 of the file.
+        :param dict metadata: Metadata from :func:`~elodie.media.base.Base.get_metadata`.
+        :param dict place: Place from :func:`~elodie.geolocation_offline.place_name`.
+        :param int size: Size of the file in bytes.
+        :param str source: Path the file was imported from.
+        :param str replaces: Library path the file was moved from, removed
+            in the same transaction.
+        :param tuple hashes: (dhash, phash) from
+            :func:`~elodie.similarity.perceptual_hash`.
+        """
+        record = self.record(path, checksum, metadata, place, size, source, hashes)
+        with self.lock, self.connection:
+            if replaces is not None and replaces != path:
+                self.connection.execute('DELETE FROM media WHERE path = ?', (replaces,))
+            self.connection.execute(
+                'INSERT OR REPLACE INTO media (%s) VALUES (%s)' % (
+                    ', '.join(COLUMNS), ', '.join('?' * len(COLUMNS))
+                ),
+                [record[column] for column in COLUMNS]
+            )
+
+    def record(self, path, checksum, metadata, place=None, size=None, source=None, hashes=None):
+        """Normalize metadata into a catalog record.
+
+        :returns: dict keyed by :data:`COLUMNS`.
+        """
+        place = place or {}
+        dhash, phash = hashes or (None, None)
+        date_taken = metadata.get('date_taken')
+        return {
+            'path': path,
+            'checksum': checksum,
+            'source': source,
+            'original_name': metadata.get('original_name'),
+            'date_taken': time.strftime('%Y-%m-%d %H:%M:%S', date_taken) if date_taken else None,
+            'camera_make': metadata.get('camera_make'),
+            'camera_model': metadata.get('camera_model'),
+            'latitude': _float(metadata.get('latitude')),
+            'longitude': _float(metadata.get('longitude')),
+            'city': place.get('city'),
+            'state': place.get('state'),
+            'country': place.get('country'),
+            'place': place.get('default'),
+            'album': metadata.get('album'),
+            'title': metadata.get('title'),
+            'mime_type': metadata.get('mime_type'),
+            'size': size,
+            'imported': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'dhash': dhash,
+            'phash': phash
+        }
+
+    def remove(self, path):
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM media WHERE path = ?', (path,))
+
+    def get(self, path):
+        """Get the record for a library path.
+
+        :returns: dict or None
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT %s FROM media WHERE path = ?' % ', '.join(COLUMNS), (path,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def rename(self, moves):
+        """Change the path of records in a single transaction.
+
+        :param moves: Iterable of (old path, new path).
+        """
+        with self.lock, self.connection:
+            # A stale record at the new path is replaced.
+            self.connection.executemany(
+                'UPDATE OR REPLACE media SET path = ? WHERE path = ?',
+                [(new, old) for old, new in moves]
+            )
+
+    def images(self, directory=None):
+        """Get the path and perceptual hashes of catalogued images.
+
+        :param str directory: Only images below this directory.
+        :returns: list of dicts with path, dhash and phash sorted by path.
+        """
+        sql = "SELECT path, dhash, phash FROM media WHERE mime_type LIKE 'image/%'"
+        params = []
+        if directory is not None:
+            sql += ' AND path >= ? AND path < ?'
+            params += _prefix_range(directory)
+        with self.lock:
+            rows = self.connection.execute(sql + ' ORDER BY path', params).fetchall()
+        return [dict(row) for row in rows]
+
+    def set_hashes(self, hashes):
+        """Store perceptual hashes computed after a file was imported.
+
+        :param hashes: Iterable of (path, (dhash, phash)).
+        """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'UPDATE media SET dhash = ?, phash = ? WHERE path = ?',
+                [(dhash, phash, path) for path, (dhash, phash) in hashes]
+            )
+
+    def with_size(self, size):
+        """Get the paths of catalogued files of a size.
+
+        :param int size: Size in bytes.
+        :returns: list of str
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT path FROM media WHERE size = ?', (size,)
+            ).fetchall()
+        return [row['path'] for row in rows]
+
+    def paths(self):
+        """Get the path of every catalogued file.
+
+        :returns: set of str
+        """
+        with self.lock:
+            rows = self.connection.execute('SELECT path FROM media').fetchall()
+        return set(row['path'] for row in rows)
+
+    def under(self, directory):
+        """Get the records of every file below a directory.
+
+        :param str directory: Absolute path of the directory.
+        :returns: list of dicts sorted by path.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT %s FROM media WHERE path >= ? AND path < ? ORDER BY path' % ', '.join(COLUMNS),
+                _prefix_range(directory)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def query(self, camera=None, after=None, before=None, year=None, place=None,
+              album=None, title=None, mime_type=None, near=None, radius=5,
+              limit=None):
+        """Find catalogued media. All filters are optional and combined.
+
+        :param str camera: Camera make or model, case insensitive.
+        :param str after: Taken on or after this date (YYYY-MM-DD[ HH:MM:SS]).
+        :param str before: Taken before this date (YYYY-MM-DD[ HH:MM:SS]).
+        :param int year: Taken in this year.
+        :param str place: City, state, country or place name, case insensitive.
+        :param str album: Album name, case insensitive.
+        :param str title: Substring of the title.
+        :param str mime_type: Mime type or its prefix, like `image/`.
+        :param tuple near: (latitude, longitude) to search around.
+        :param float radius: Distance from `near` in kilometers.
+        :param int limit: Maximum number of records.
+        :returns: list of dicts sorted by date taken.
+        """
+        clauses = []
+        params = []
+        if camera:
+            clauses.append('(camera_make = ? OR camera_model = ?)')
+            params += [camera, camera]
+        if after:
+            clauses.append('date_taken >= ?')
+            params.append(after)
+        if before:
+            clauses.append('date_taken < ?')
+            params.append(before)
+        if year:
+            clauses.append('date_taken >= ? AND date_taken < ?')
+            params += ['%04d-01-01' % year, '%04d-01-01' % (year + 1)]
+        if place:
+            clauses.append('(city = ? OR state = ? OR country = ? OR place = ?)')
+            params += [place] * 4
+        if album:
+            clauses.append('album = ?')
+            params.append(album)
+        if title:
+            clauses.append("title LIKE ? ESCAPE '\\'")
+            params.append('%' + _escape_like(title) + '%')
+        if mime_type:
+            if mime_type.endswith('/'):
+                clauses.append("mime_type LIKE ? ESCAPE '\\'")
+                params.append(_escape_like(mime_type) + '%')
+            else:
+                clauses.append('mime_type = ?')
+                params.append(mime_type)
+        if near:
+            # Narrow down with the latitude index, exact distances are
+            #  checked below.
+            latitude_delta = radius / KM_PER_DEGREE
+            clauses.append('latitude BETWEEN ? AND ?')
+            params += [near[0] - latitude_delta, near[0] + latitude_delta]
+
+        sql = 'SELECT %s FROM media' % ', '.join(COLUMNS)
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY date_taken, path'
+        if limit and not near:
+            sql += ' LIMIT %d' % int(limit)
+
+        with self.lock:
+            rows = self.connection.execute(sql, params).fetchall()
+
+        records = [dict(row) for row in rows]
+        if near:
+            records = [
+                record for record in records
+                if record['longitude'] is not None and
+                distance_km(near[0], near[1], record['latitude'], record['longitude']) <= radius
+            ]
+            if limit:
+                records = records[:int(limit)]
+        return records
+
+    def count(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM media').fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def distance_km(latitude1, longitude1, latitude2, longitude2):
+    """Great circle distance in kilometers."""
+    latitude1, longitude1, latitude2, longitude2 = map(
+        radians, (latitude1, longitude1, latitude2, longitude2)
+    )
+    a = sin((latitude2 - latitude1) / 2) ** 2 + \
+        cos(latitude1) * cos(latitude2) * sin((longitude2 - longitude1) / 2) ** 2
+    return 2 * 6371 * asin(sqrt(a))
+
+
+def _prefix_range(directory):
+    # Bounds of the paths below a directory. A range over the primary key
+    #  uses its index where LIKE wouldn't.
+    prefix = directory.rstrip(os.sep) + os.sep
+    return [prefix, prefix[:-1] + chr(ord(os.sep) + 1)]
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _float(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
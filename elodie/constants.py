@@ -19,9 +19,71 @@ if (
 #: File in which to store details about media Elodie has seen.
 hash_db = '{}/hash.json'.format(application_directory)
 
+#: Extended attribute with a file's sha256 and the mtime and size it was
+#:  computed at. Written with [Checksum] xattr in config.ini.
+checksum_xattr = 'user.elodie.sha256'
+
 #: File in which to store geolocation details about media Elodie has seen.
 location_db = '{}/location.json'.format(application_directory)
 
+#: Bloom filter of the checksums in the hash dbs under [Libraries].
+library_filter = '{}/libraries.bloom'.format(application_directory)
+
+#: Rate at which the library filter may claim to have a checksum it doesn't.
+#:  Override with [Libraries] false_positive_rate.
+library_false_positive_rate = 0.001
+
+#: SQLite catalog of imported media and their metadata.
+catalog_db = '{}/catalog.db'.format(application_directory)
+
+#: Largest number of bits in which the 64 bit perceptual hashes of two
+#:  images may differ for them to be considered similar.
+similarity_distance = 6
+
+#: Moves of an unfinished `elodie relayout`, replayed by the next run.
+relayout_journal = '{}/relayout.journal'.format(application_directory)
+
+#: Directory inside a backup made by `elodie sync` with its hash db and
+#:  the high-water mark of the library's hash db.
+sync_directory = '.elodie-sync'
+
+#: Number of bytes read from the start of a file for EXIF parsing before
+#:  falling back to a full read. Override with [Exif] header_window.
+exif_header_window = 256 * 1024
+
+#: Number of files queued for an import which are read ahead of the one
+#:  being imported. Override with [Readahead] files, 0 turns it off.
+readahead_files = 4
+
+#: Archive members up to this many bytes are hashed in memory during an
+#:  import so duplicates are dropped without writing them to disk.
+archive_spool_size = 64 * 1024 * 1024
+
+#: Number of async plugin after() calls which can be queued per plugin
+#:  before the import waits for the plugin to catch up.
+plugin_async_queue_size = 64
+
+#: Number of records sent to a plugin's before_batch() and after_batch().
+plugin_batch_size = 50
+
+#: Size in bytes of the write buffer for session logs.
+session_log_buffer_size = 64 * 1024
+
+#: Number of records written to a session log between flushes.
+session_log_flush_every = 100
+
+#: Number of errors a session keeps in memory for its summary.
+session_log_recent_errors = 100
+
+#: Seconds between updates of the Prometheus metrics file during a run.
+metrics_interval = 15
+
+#: Upper bounds in seconds of the stage latency histogram buckets.
+metrics_buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+#: Unix socket the `elodie serve` daemon listens on.
+daemon_socket = '{}/elodie.sock'.format(application_directory)
+
 #: Elodie installation directory.
 script_directory = path.dirname(path.dirname(path.abspath(__file__)))
 
@@ -0,0 +1,225 @@
+"""Local daemon which serves elodie jobs over a Unix socket.
+
+Clients write one JSON-RPC 2.0 request per line. While a job runs the server
+streams newline delimited JSON (NDJSON) notifications, one ``progress`` event
+per file, and finishes with the JSON-RPC response for the request id.
+
+Only one job runs at a time. Commands share module level state (the session
+logger, the filesystem lock) so concurrent jobs would step on each other.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import threading
+from traceback import format_exc
+
+from elodie import constants
+from elodie import log
+
+
+#: JSON-RPC 2.0 error codes.
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+JOB_ERROR = -32000
+
+
+class DaemonError(Exception):
+    """Exception raised by :func:`call` when the daemon returns an error."""
+
+    def __init__(self, code, message):
+        super(DaemonError, self).__init__(message)
+        self.code = code
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            if not self.server.elodie_daemon.handle_line(line, self.write):
+                break
+
+    def write(self, payload):
+        self.wfile.write(json.dumps(payload).encode('utf-8') + b'\n')
+        self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class Daemon(object):
+    """Serve registered methods over a Unix socket.
+
+    Handlers are registered with :func:`register` and are called as
+    ``handler(params, emit)`` where ``emit(method, params)`` sends a
+    notification to the client. The handler's return value is sent as the
+    JSON-RPC result.
+
+    :param str socket_path: Path of the Unix socket to listen on.
+    """
+
+    def __init__(self, socket_path=None):
+        if socket_path is None:
+            socket_path = constants.daemon_socket
+        self.socket_path = socket_path
+        self.methods = {}
+        self.job_lock = threading.Lock()
+        self.server = None
+        self.register('ping', lambda params, emit: 'pong')
+        self.register('shutdown', self._shutdown)
+
+    def register(self, name, handler):
+        """Register a handler for a JSON-RPC method.
+
+        :param str name: Method name.
+        :param callable handler: Called with ``(params, emit)``.
+        """
+        self.methods[name] = handler
+
+    def handle_line(self, line, write):
+        """Run a single JSON-RPC request and write the response.
+
+        :returns: bool False if the connection should be closed.
+        """
+        try:
+            request = json.loads(line.decode('utf-8'))
+        except ValueError:
+            write(_error(None, PARSE_ERROR, 'Parse error'))
+            return False
+
+        if not isinstance(request, dict) or 'method' not in request:
+            write(_error(None, INVALID_REQUEST, 'Invalid request'))
+            return True
+
+        request_id = request.get('id')
+        method = request['method']
+        params = request.get('params') or {}
+        if method not in self.methods:
+            write(_error(request_id, METHOD_NOT_FOUND, 'Method not found: %s' % method))
+            return True
+        if not isinstance(params, dict):
+            write(_error(request_id, INVALID_PARAMS, 'Params must be an object'))
+            return True
+
+        # Set when the client went away. The job still runs to the end so
+        #  it isn't left half done, it just stops streaming events.
+        disconnected = []
+
+        def emit(event, payload):
+            if disconnected:
+                return
+            try:
+                write({'jsonrpc': '2.0', 'method': event, 'params': payload})
+            except (IOError, OSError):
+                log.warn('Client disconnected, %s continues without progress events' % method)
+                disconnected.append(True)
+
+        with self.job_lock:
+            try:
+                result = self.methods[method](params, emit)
+                response = {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+            except Exception as e:
+                log.error(format_exc())
+                response = _error(request_id, JOB_ERROR, str(e))
+
+        if disconnected:
+            return False
+        try:
+            write(response)
+        except (IOError, OSError):
+            return False
+        return True
+
+    def serve_forever(self):
+        """Listen on the socket until a shutdown request is received."""
+        if os.path.exists(self.socket_path):
+            if _is_listening(self.socket_path):
+                raise DaemonError(JOB_ERROR, 'A daemon is already listening on %s' % self.socket_path)
+            # Stale socket left behind by a daemon which didn't exit cleanly.
+            os.remove(self.socket_path)
+
+        # Anyone who can connect can run jobs on the library, so the socket
+        #  is created for the owner only.
+        umask = os.umask(0o177)
+        try:
+            self.server = _UnixServer(self.socket_path, _RequestHandler)
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, 0o600)
+        self.server.elodie_daemon = self
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def shutdown(self):
+        if self.server is not None:
+            # shutdown() blocks until serve_forever returns so it can't be
+            #  called from a request thread directly.
+            threading.Thread(target=self.server.shutdown).start()
+
+    def _shutdown(self, params, emit):
+        self.shutdown()
+        return True
+
+
+def call(method, params=None, socket_path=None, on_event=None):
+    """Call a method on a running daemon.
+
+    :param str method: Method name.
+    :param dict params: Method params.
+    :param str socket_path: Path of the daemon's socket.
+    :param callable on_event: Called as ``on_event(method, params)`` for every
+        notification streamed before the response.
+    :returns: The JSON-RPC result.
+    :raises DaemonError: If the daemon returns an error.
+    """
+    if socket_path is None:
+        socket_path = constants.daemon_socket
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(socket_path)
+    try:
+        request = {'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params or {}}
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        for line in sock.makefile('rb'):
+            message = json.loads(line.decode('utf-8'))
+            if 'id' not in message:
+                if on_event is not None:
+                    on_event(message['method'], message['params'])
+                continue
+            if 'error' in message:
+                raise DaemonError(message['error']['code'], message['error']['message'])
+            return message['result']
+    finally:
+        sock.close()
+
+    raise DaemonError(JOB_ERROR, 'Connection closed before a response was received')
+
+
+def _error(request_id, code, message):
+    return {
+        'jsonrpc': '2.0',
+        'id': request_id,
+        'error': {'code': code, 'message': message}
+    }
+
+
+def _is_listening(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        return True
+    except socket.error:
+        return False
+    finally:
+        sock.close()
@@ -6,7 +6,7 @@ from __future__ import print_function
 
 import os
 import sys
-from distutils.spawn import find_executable
+from shutil import which as find_executable
 
 
 #: Error to print when exiftool can't be found.
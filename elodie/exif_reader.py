@@ -1,22 +1,78 @@
 """Enhanced EXIF reader using ExifRead for better parallel processing."""
 
-import exifread
+import io
 import os
+import threading
 from datetime import datetime
+from elodie import constants
 from elodie import log
+from elodie.config import load_config
+
+
+# Per-extension counters of how often the header window was enough.
+#  {'nef': {'window': 10, 'full': 1}, ...}
+_window_stats = {}
+_window_stats_lock = threading.Lock()
+
+
+def get_window_stats():
+    """Get per-format header window hit rates.
+
+    :returns: dict keyed by extension with `window`, `full` and `hit_rate`
+    """
+    with _window_stats_lock:
+        stats = {}
+        for extension, counts in _window_stats.items():
+            total = counts['window'] + counts['full']
+            stats[extension] = {
+                'window': counts['window'],
+                'full': counts['full'],
+                'hit_rate': float(counts['window']) / total if total else 0.0
+            }
+        return stats
+
+
+def reset_window_stats():
+    """Reset the header window counters."""
+    with _window_stats_lock:
+        _window_stats.clear()
+
+
+def _record_window_result(extension, hit):
+    with _window_stats_lock:
+        counts = _window_stats.setdefault(extension, {'window': 0, 'full': 0})
+        counts['window' if hit else 'full'] += 1
+
+
+def get_header_window():
+    """Get the size of the header window from config.ini.
+
+    Configured with `header_window` (in bytes) under `[Exif]`.
+    A value of 0 disables the window and always reads the full file.
+
+    :returns: int
+    """
+    config = load_config()
+    if 'Exif' in config and 'header_window' in config['Exif']:
+        try:
+            return int(config['Exif']['header_window'])
+        except ValueError:
+            log.warn('Invalid [Exif] header_window, using default')
+    return constants.exif_header_window
 
 
 class ExifReader:
     """Thread-safe EXIF reader using ExifRead library."""
     
-    def __init__(self):
-        pass
+    def __init__(self, header_window=None):
+        if header_window is None:
+            header_window = get_header_window()
+        self.header_window = header_window
     
     def get_metadata(self, file_path):
         """Get EXIF metadata from a file."""
         try:
-            with open(file_path, 'rb') as f:
-                tags = exifread.process_file(f, details=False)
+            tags = self._process_file(file_path)
             
             # Convert ExifRead tags to our expected format
             metadata = {}
@@ -47,6 +103,42 @@ class ExifReader:
             # log.error(f"Error reading EXIF data from {file_path}: {e}")
             return {}
     
+    def _process_file(self, file_path):
+        """Run exifread over a bounded header window of the file.
+
+        Most formats keep their EXIF in the first few hundred KB, so we read
+        `self.header_window` bytes once and parse them from memory. Only when
+        the window doesn't contain a date tag and the file is larger than the
+        window do we fall back to letting exifread seek through the full file.
+        """
+        # Imported here so commands which never read EXIF don't pay for it.
+        import exifread
+
+        extension = os.path.splitext(file_path)[1][1:].lower()
+        with open(file_path, 'rb') as f:
+            if self.header_window > 0:
+                window = f.read(self.header_window)
+                try:
+                    tags = exifread.process_file(io.BytesIO(window), details=False)
+                except Exception:
+                    tags = {}
+
+                # The window is the whole file, there is nothing else to read.
+                if len(window) < self.header_window or self._has_date_tag(tags):
+                    _record_window_result(extension, True)
+                    return tags
+
+                _record_window_result(extension, False)
+                f.seek(0)
+
+            return exifread.process_file(f, details=False)
+
+    def _has_date_tag(self, tags):
+        for tag in ('EXIF DateTimeOriginal', 'EXIF DateTime', 'Image DateTime'):
+            if tag in tags:
+                return True
+        return False
+
     def _get_date_taken(self, tags):
         """Extract date taken from EXIF tags."""
         date_tags = [
@@ -14,8 +14,9 @@ import time
 from elodie import compatability
 from elodie import geolocation_offline as geolocation
 from elodie import log
+from elodie import trace
 from elodie.config import load_config
-from elodie.localstorage import Db
+from elodie.localstorage import Db, get_checksum_xattr, write_checksum_xattr
 from elodie.media.base import Base, get_all_subclasses
 from elodie.plugins.plugins import Plugins
 
@@ -47,6 +48,63 @@ class FileSystem(object):
         # Instantiate a plugins object
         self.plugins = Plugins()
 
+        # Opened on first use so commands which don't import don't pay for it.
+        self._catalog = None
+        # The last (latitude, longitude, place) looked up. Folder names and
+        #  the catalog need the same place for a file.
+        self.last_place = None
+        # (destination, SimilarIndex) built by the first --skip-similar import.
+        self._similar_index = None
+        # False until the [Libraries] config has been read.
+        self._library_filter = False
+
+    @property
+    def catalog(self):
+        """The :class:`~elodie.catalog.Catalog` imports are recorded in."""
+        if self._catalog is None:
+            from elodie.catalog import Catalog
+            self._catalog = Catalog()
+        return self._catalog
+
+    @property
+    def library_filter(self):
+        """The :class:`~elodie.bloom.LibraryFilter` of the other libraries in
+           config.ini, or None if there aren't any.
+        """
+        if self._library_filter is False:
+            from elodie.bloom import LibraryFilter, get_library_hash_dbs
+            hash_dbs = get_library_hash_dbs()
+            self._library_filter = LibraryFilter(hash_dbs) if hash_dbs else None
+        return self._library_filter
+
+    def get_similar_index(self, destination):
+        """Get the :class:`~elodie.similarity.SimilarIndex` of the images
+           catalogued below `destination`. Images which weren't hashed yet are
+           hashed the first time.
+        """
+        if self._similar_index is None or self._similar_index[0] != destination:
+            from elodie.similarity import SimilarIndex, hash_catalog
+            index = SimilarIndex()
+            for path, dhash, phash in hash_catalog(self.catalog, destination):
+                index.add((dhash, phash), path)
+            self._similar_index = (destination, index)
+        return self._similar_index[1]
+
+    def find_similar(self, _file, destination):
+        """Look for an image in the library which looks like `_file`.
+
+        :returns: tuple (path of the similar image or None, hashes of `_file`)
+        """
+        from elodie.similarity import perceptual_hash
+        hashes = perceptual_hash(_file)
+        if hashes is None:
+            return (None, None)
+
+        for distance, path in self.get_similar_index(destination).search(hashes):
+            if os.path.isfile(path):
+                return (path, hashes)
+        return (None, hashes)
+
     def create_directory(self, directory_path):
         """Create a directory if it does not already exist.
 
@@ -161,7 +219,7 @@ class FileSystem(object):
                         this_value = time.strftime(mask, metadata['date_taken'])
                     break
                 elif part in ('location', 'city', 'state', 'country'):
-                    place_name = geolocation.place_name(
+                    place_name = self.get_place_name(
                         metadata['latitude'],
                         metadata['longitude']
                     )
@@ -408,7 +466,7 @@ class FileSystem(object):
         elif part in ('day', 'month', 'year'):
             return time.strftime(mask, metadata['date_taken'])
         elif part in ('location', 'city', 'state', 'country'):
-            place_name = geolocation.place_name(
+            place_name = self.get_place_name(
                 metadata['latitude'],
                 metadata['longitude']
             )
@@ -429,6 +487,19 @@ class FileSystem(object):
 
         return ''
 
+    def get_place_name(self, latitude, longitude):
+        """Look up the place for a coordinate, reusing the previous lookup.
+
+        :returns: dict from :func:`~elodie.geolocation_offline.place_name`
+        """
+        last_place = self.last_place
+        if last_place is not None and last_place[0:2] == (latitude, longitude):
+            return last_place[2]
+
+        place_name = geolocation.place_name(latitude, longitude)
+        self.last_place = (latitude, longitude, place_name)
+        return place_name
+
     def parse_mask_for_location(self, mask, location_parts, place_name):
         """Takes a mask for a location and interpolates the actual place names.
 
@@ -489,9 +560,10 @@ class FileSystem(object):
 
         return folder_name
 
-    def process_checksum(self, _file, allow_duplicate):
+    def process_checksum(self, _file, allow_duplicate, checksum=None):
         db = Db()
-        checksum = db.checksum(_file)
+        if(checksum is None):
+            checksum = db.checksum(_file)
         if(checksum is None):
             log.info('Could not get checksum for %s.' % _file)
             return None
@@ -502,6 +574,11 @@ class FileSystem(object):
         # If we find a checksum match but the file doesn't exist where we
         #  believe it to be then we write a debug log and proceed to import.
         checksum_file = db.get_hash(checksum)
+        # Other libraries are only searched when their filter says they may
+        #  have the checksum.
+        if(allow_duplicate is False and self.library_filter is not None and
+                (checksum_file is None or not os.path.isfile(checksum_file))):
+            checksum_file = self.library_filter.find(checksum) or checksum_file
         if(allow_duplicate is False and checksum_file is not None):
             if(os.path.isfile(checksum_file)):
                 log.info('%s already at %s.' % (
@@ -521,23 +598,51 @@ class FileSystem(object):
         if('move' in kwargs):
             move = kwargs['move']
 
+        link = False
+        if('link' in kwargs):
+            link = kwargs['link']
+
         allow_duplicate = False
         if('allowDuplicate' in kwargs):
             allow_duplicate = kwargs['allowDuplicate']
 
+        skip_similar = False
+        if('skipSimilar' in kwargs):
+            skip_similar = kwargs['skipSimilar']
+
+        # Files staged from an archive were hashed while they were read.
+        checksum = None
+        if('checksum' in kwargs):
+            checksum = kwargs['checksum']
+
+        # Where the file came from if `_file` is a staged copy.
+        source = _file
+        if('source' in kwargs):
+            source = kwargs['source']
+
         stat_info_original = os.stat(_file)
-        metadata = media.get_metadata()
+        with trace.span('metadata'):
+            metadata = media.get_metadata()
 
         if(not media.is_valid()):
             print('%s is not a valid media file. Skipping...' % _file)
             return
 
-        checksum = self.process_checksum(_file, allow_duplicate)
+        with trace.span('checksum'):
+            checksum = self.process_checksum(_file, allow_duplicate, checksum)
         if(checksum is None):
             log.info('Original checksum returned None for %s. Skipping...' %
                      _file)
             return
 
+        hashes = None
+        if(skip_similar is True and (metadata['mime_type'] or '').startswith('image/')):
+            with trace.span('similarity'):
+                similar, hashes = self.find_similar(_file, destination)
+            if(similar is not None):
+                log.info('%s looks like %s. Skipping...' % (_file, similar))
+                return
+
         # Run `before()` for every loaded plugin and if any of them raise an exception
         #  then we skip importing the file and log a message.
         plugins_run_before_status = self.plugins.run_all_before(_file, destination)
@@ -545,10 +650,11 @@ class FileSystem(object):
             log.warn('At least one plugin pre-run failed for %s' % _file)
             return
 
-        directory_name = self.get_folder_path(metadata)
-        dest_directory = os.path.join(destination, directory_name)
-        file_name = self.get_file_name(metadata)
-        dest_path = os.path.join(dest_directory, file_name)        
+        with trace.span('destination_path'):
+            directory_name = self.get_folder_path(metadata)
+            dest_directory = os.path.join(destination, directory_name)
+            file_name = self.get_file_name(metadata)
+            dest_path = os.path.join(dest_directory, file_name)        
 
         media.set_original_name()
 
@@ -571,34 +677,81 @@ class FileSystem(object):
         if(os.path.exists(exif_original_file)):
             exif_original_file_exists = True
 
-        if(move is True):
-            stat = os.stat(_file)
-            # Move the processed file into the destination directory
-            shutil.move(_file, dest_path)
-
-            if(exif_original_file_exists is True):
-                # We can remove it as we don't need the initial file.
-                os.remove(exif_original_file)
-            os.utime(dest_path, (stat.st_atime, stat.st_mtime))
-        else:
-            if(exif_original_file_exists is True):
-                # Move the newly processed file with any updated tags to the
-                # destination directory
-                shutil.move(_file, dest_path)
-                # Move the exif _original back to the initial source file
-                shutil.move(exif_original_file, _file)
+        # Hardlinks can't cross devices so we fall back to a copy.
+        if(link is True and not self.is_same_device(_file, dest_directory)):
+            log.warn('Cannot link %s across devices, copying instead' % _file)
+            link = False
+
+        with trace.span('transfer'):
+            if(move is True or link is True):
+                stat = os.stat(_file)
+                if(link is True):
+                    # Link to a temporary name first so an existing destination
+                    #  is replaced atomically, same as a move would.
+                    temporary_path = '%s.elodie-link' % dest_path
+                    os.link(_file, temporary_path)
+                    compatability._rename(temporary_path, dest_path)
+                elif(not self.move_file(_file, dest_path, checksum)):
+                    log.error('Could not verify %s after copying to %s' % (
+                        _file,
+                        dest_path
+                    ))
+                    return
+
+                if(exif_original_file_exists is True):
+                    # We can remove it as we don't need the initial file.
+                    os.remove(exif_original_file)
+                if(link is True):
+                    # A hardlink shares the source's inode and with it the
+                    #  mtime, setting it from metadata would change the
+                    #  source as well.
+                    os.utime(dest_path, (stat.st_atime, stat.st_mtime))
+                else:
+                    # Same as a copy so an import's result doesn't depend
+                    #  on --move.
+                    self.set_utime_from_metadata(metadata, dest_path)
             else:
-                compatability._copyfile(_file, dest_path)
-
-            # Set the utime based on what the original file contained 
-            #  before we made any changes.
-            # Then set the utime on the destination file based on metadata.
-            os.utime(_file, (stat_info_original.st_atime, stat_info_original.st_mtime))
-            self.set_utime_from_metadata(metadata, dest_path)
-
-        db = Db()
-        db.add_hash(checksum, dest_path)
-        db.update_hash_db()
+                if(exif_original_file_exists is True):
+                    # Move the newly processed file with any updated tags to the
+                    # destination directory
+                    shutil.move(_file, dest_path)
+                    # Move the exif _original back to the initial source file
+                    shutil.move(exif_original_file, _file)
+                else:
+                    compatability._copyfile(_file, dest_path)
+
+                # Set the utime based on what the original file contained 
+                #  before we made any changes.
+                # Then set the utime on the destination file based on metadata.
+                os.utime(_file, (stat_info_original.st_atime, stat_info_original.st_mtime))
+                self.set_utime_from_metadata(metadata, dest_path)
+
+            # Metadata written on the way changes the bytes, otherwise the
+            #  copy is what was hashed and the first verify needn't hash it.
+            if(exif_original_file_exists is False and get_checksum_xattr() is not None):
+                write_checksum_xattr(dest_path, checksum, os.stat(dest_path))
+
+        with trace.span('db.write'):
+            db = Db()
+            db.add_hash(checksum, dest_path)
+            db.update_hash_db()
+
+        with trace.span('catalog.write'):
+            place = None
+            if(metadata['latitude'] is not None and metadata['longitude'] is not None):
+                place = self.get_place_name(metadata['latitude'], metadata['longitude'])
+            self.catalog.add(
+                dest_path,
+                checksum,
+                metadata,
+                place=place,
+                size=stat_info_original.st_size,
+                source=source,
+                replaces=_file if move else None,
+                hashes=hashes
+            )
+            if(hashes is not None):
+                self.get_similar_index(destination).add(hashes, dest_path)
 
         # Run `after()` for every loaded plugin and if any of them raise an exception
         #  then we skip importing the file and log a message.
@@ -610,6 +763,43 @@ class FileSystem(object):
 
         return dest_path
 
+    def is_same_device(self, _file, directory):
+        """Check whether a file and a directory are on the same device.
+
+        :param str _file: Path to an existing file.
+        :param str directory: Path to an existing directory.
+        :returns: bool
+        """
+        try:
+            return os.stat(_file).st_dev == os.stat(directory).st_dev
+        except OSError:
+            return False
+
+    def move_file(self, _file, dest_path, checksum=None):
+        """Move a file, renaming it when possible.
+
+        On the same device this is a single rename and no bytes are written.
+        Across devices we copy, verify the copy against `checksum` and only
+        then remove the original.
+
+        :param str _file: Path of the file to move.
+        :param str dest_path: Path to move the file to.
+        :param str checksum: Expected sha256 of the file, used to verify
+            copies across devices.
+        :returns: bool
+        """
+        if(self.is_same_device(_file, os.path.dirname(dest_path))):
+            compatability._rename(_file, dest_path)
+            return True
+
+        compatability._copyfile(_file, dest_path)
+        if(checksum is not None and Db().checksum(dest_path, library=True) != checksum):
+            os.remove(dest_path)
+            return False
+
+        os.remove(_file)
+        return True
+
     def set_utime_from_metadata(self, metadata, file_path):
         """ Set the modification time on the file based on the file name.
         """
@@ -1,11 +1,35 @@
 """Offline geolocation functionality for Elodie."""
 
-import reverse_geocoder as rg
+import threading
+
 from elodie import log
 from elodie.localstorage import Db
+from elodie.trace import traced
 
 __DEFAULT_LOCATION__ = 'Unknown Location'
 
+# Lookups answered from the location db vs. the geocoder.
+_cache_stats = {'hits': 0, 'misses': 0}
+_cache_stats_lock = threading.Lock()
+
+
+def get_cache_stats():
+    """Get location cache hits and misses for place_name since the last reset.
+
+    :returns: dict with hits, misses and hit_rate
+    """
+    with _cache_stats_lock:
+        stats = dict(_cache_stats)
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = float(stats['hits']) / total if total else 0.0
+    return stats
+
+
+def reset_cache_stats():
+    with _cache_stats_lock:
+        _cache_stats['hits'] = 0
+        _cache_stats['misses'] = 0
+
 
 def coordinates_by_name(name):
     """Get coordinates for a location name using cached data."""
@@ -54,6 +78,23 @@ def dms_string(decimal, type='latitude'):
     return '{} deg {}\' {}" {}'.format(dms[0], dms[1], dms[2], direction)
 
 
+def _reverse_geocoder():
+    # reverse_geocoder pulls in numpy and scipy, which dominate startup time,
+    #  so it's only imported once a lookup is needed.
+    import reverse_geocoder
+    return reverse_geocoder
+
+
+def load_geocoder():
+    """Load the reverse-geocoder dataset and K-D tree ahead of time.
+
+    reverse-geocoder keeps a single instance per process so long running
+    processes only pay this once.
+    """
+    _reverse_geocoder().RGeocoder(mode=2, verbose=False)
+
+
+@traced('geocode')
 def place_name(lat, lon):
     """Get place name from coordinates using offline reverse geocoding."""
     lookup_place_name_default = {'default': __DEFAULT_LOCATION__}
@@ -74,11 +115,16 @@ def place_name(lat, lon):
     # We check that it's a dict to coerce an upgrade of the location
     # db from a string location to a dictionary. See gh-160.
     if isinstance(cached_place_name, dict):
+        with _cache_stats_lock:
+            _cache_stats['hits'] += 1
         return cached_place_name
+
+    with _cache_stats_lock:
+        _cache_stats['misses'] += 1
     
     try:
         # Use reverse-geocoder for offline lookup
-        results = rg.search([(lat, lon)])
+        results = _reverse_geocoder().search([(lat, lon)])
         if results:
             result = results[0]
             lookup_place_name = {}
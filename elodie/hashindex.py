@@ -0,0 +1,421 @@
+"""
+A compact, disk backed index of the checksums in hash.json.
+
+Loading hash.json into a dict costs a few hundred bytes per entry, well over
+a GB for a library of a couple of million files, and it happened every time a
+:class:`~elodie.localstorage.Db` was created. The index keeps the checksums as
+sorted 32 byte digests in a file next to hash.json which is mmap'd and
+searched with bisect. Each digest is stored with the offset of its entry in
+hash.json so a path is only read when a lookup hits.
+
+Entries written since the digests were last sorted are appended to both
+files and kept in a small unsorted tail. Once the tail grows too large both
+files are rewritten in digest order.
+"""
+from __future__ import absolute_import
+from builtins import object
+
+import bisect
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import re
+import struct
+
+from json.decoder import scanstring
+
+from elodie import compatability
+
+#: Magic, sorted count, tail count, generation and the size, mtime and
+#:  inode of the hash.json the index was built from.
+HEADER = struct.Struct('<8sQQQQQQ')
+
+#: A sha256 digest and the offset of its entry in hash.json.
+RECORD = struct.Struct('<32sQ')
+
+MAGIC = b'ELODIDX2'
+
+#: The tail is merged into the sorted digests when it has more entries than
+#:  this, or than an eighth of the sorted digests.
+TAIL_SIZE = 4096
+
+HEX_DIGEST = re.compile(r'^[0-9a-f]{64}$')
+
+_decoder = json.JSONDecoder()
+
+
+def digest(key):
+    """Get the 32 byte digest a key is indexed by.
+
+    Keys are hex sha256 checksums. Anything else is hashed so it can still
+    be stored.
+
+    :param str key:
+    :returns: bytes
+    """
+    if HEX_DIGEST.match(key):
+        return bytes.fromhex(key)
+    return hashlib.sha256(key.encode('utf-8')).digest()
+
+
+def _entry_text(key, value):
+    return '%s: %s' % (json.dumps(key), json.dumps(value))
+
+
+class _Digests(object):
+    """The sorted records of an index as a sequence of digests for bisect."""
+
+    def __init__(self, buf, count):
+        self.buf = buf
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        start = HEADER.size + i * RECORD.size
+        return self.buf[start:start + 32]
+
+    def offset(self, i):
+        return RECORD.unpack_from(self.buf, HEADER.size + i * RECORD.size)[1]
+
+
+class HashIndex(object):
+    """A dict like view of hash.json which doesn't load it.
+
+    Changes are kept in memory until :func:`write` is called.
+
+    :param str path: Path of hash.json. The index is kept in `path`.idx.
+    :param bool read_only: Never write, for the hash.json of another
+        library. Without a current index it is loaded into memory instead.
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.index_path = '%s.idx' % path
+        self.read_only = read_only
+        self._added = {}
+        self._cleared = False
+        self._json = None
+        self._index = None
+        self._open()
+
+    def __contains__(self, key):
+        if key in self._added:
+            return True
+        if self._cleared:
+            return False
+        return self._find(digest(key)) is not None
+
+    def __getitem__(self, key):
+        if key in self._added:
+            return self._added[key]
+        if not self._cleared:
+            offset = self._find(digest(key))
+            if offset is not None:
+                return self._entry(offset)[1]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        self._added[key] = value
+
+    def __iter__(self):
+        for key, value in self.items():
+            yield key
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    @property
+    def record_count(self):
+        """Number of records, known without reading them.
+
+        A key which was saved or set again is counted again, so this is an
+        upper bound of ``len()``.
+        """
+        if self._cleared:
+            return len(self._added)
+        return self.digests.count + len(self.tail) + len(self._added)
+
+    def __repr__(self):
+        return '<HashIndex %s: %d sorted, %d appended, %d unsaved>' % (
+            self.path, self.digests.count, len(self.tail), len(self._added)
+        )
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self):
+        """Iterate over (checksum, path), unsaved changes first."""
+        for key, value in list(self._added.items()):
+            yield (key, value)
+        if self._cleared:
+            return
+        for record_digest, offset in self._records():
+            key, value = self._entry(offset)
+            if key not in self._added:
+                yield (key, value)
+
+    def iterdigests(self):
+        """Iterate over the digests of all entries, in no particular order."""
+        for key in list(self._added):
+            yield digest(key)
+        if self._cleared:
+            return
+        for record_digest, offset in self._records():
+            yield record_digest
+
+    def changes(self, mark=None):
+        """Get the entries saved since a high-water mark.
+
+        Saved entries are appended to hash.json until it is rewritten in
+        digest order, which replaces the file. Every rewrite gets a new
+        random generation, which with the size of hash.json is a high-water
+        mark of what was appended so far. The inode can't stand in for the
+        generation, a rewrite often gets back the inode of the one before.
+
+        :param mark: Mark returned by an earlier call, or None.
+        :returns: tuple (iterable of (key, value), mark). Every entry is
+            returned if hash.json was rewritten since `mark`.
+        """
+        if self._opened is not None and not self._is_current():
+            self._open()
+        if self._opened is None:
+            return (self.items(), None)
+        size = self._opened[0]
+        if mark is not None:
+            generation, marked = mark
+            if generation == self._generation and 0 < marked <= size:
+                with open(self.path, 'rb') as f:
+                    f.seek(marked - 1)
+                    # Without the closing brace of either.
+                    text = f.read(size - marked)
+                try:
+                    return (self._parse_appended(text.decode('utf-8')), [generation, size])
+                except ValueError:
+                    # Not the start of an entry, read it all to be safe.
+                    pass
+        return (self.items(), [self._generation, size])
+
+    def clear(self):
+        """Drop every entry, hash.json is emptied by the next :func:`write`."""
+        self._added = {}
+        self._cleared = True
+
+    def write(self):
+        """Save changes made since the index was opened."""
+        if self._cleared:
+            self._rewrite(self._added.items(), base=False)
+        elif self._added:
+            if not self._is_current():
+                # Someone else wrote hash.json since we opened it.
+                self._open()
+            if(self.digests.count == 0 or
+                    len(self.tail) + len(self._added) > max(TAIL_SIZE, self.digests.count // 8)):
+                self._rewrite(self._added.items(), base=True)
+            else:
+                self._append(self._added.items())
+        self._added = {}
+        self._cleared = False
+
+    def close(self):
+        for buf in (self._json, self._index):
+            if buf is not None:
+                buf.close()
+        self._json = None
+        self._index = None
+
+    def _open(self):
+        self.close()
+        self.digests = _Digests(b'', 0)
+        self.tail = {}
+        self._opened = None
+        self._generation = None
+        if not os.path.isfile(self.path):
+            return
+        if not self._is_current():
+            self._rebuild()
+            return
+
+        with open(self.index_path, 'rb') as f:
+            magic, count, tail_count, self._generation = HEADER.unpack(f.read(HEADER.size))[:4]
+            if count:
+                self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.digests = _Digests(self._index, count)
+            f.seek(HEADER.size + count * RECORD.size)
+            for i in range(tail_count):
+                record_digest, offset = RECORD.unpack(f.read(RECORD.size))
+                # Later entries replace earlier ones.
+                self.tail[record_digest] = offset
+
+        self._opened = self._stat()
+        if count or tail_count:
+            with open(self.path, 'rb') as f:
+                self._json = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _stat(self):
+        stat = os.stat(self.path)
+        return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def _is_current(self):
+        """Check if the index was built from hash.json as it is now."""
+        try:
+            with open(self.index_path, 'rb') as f:
+                header = f.read(HEADER.size)
+        except (IOError, OSError):
+            return False
+        if len(header) != HEADER.size:
+            return False
+        header = HEADER.unpack(header)
+        return header[0] == MAGIC and header[4:] == self._stat()
+
+    def _rebuild(self):
+        """Index a hash.json written by an older version or by hand."""
+        hash_db = {}
+        with open(self.path, 'r') as f:
+            try:
+                hash_db = json.load(f)
+            except ValueError:
+                pass
+        if self.read_only:
+            self._added = hash_db
+            return
+        self._rewrite(hash_db.items(), base=False)
+
+    def _find(self, record_digest):
+        if record_digest in self.tail:
+            return self.tail[record_digest]
+        count = self.digests.count
+        if count == 0:
+            return None
+
+        # Digests are uniformly distributed so start with a small window
+        #  around where this one would be and widen it if that misses.
+        guess = (int.from_bytes(record_digest[:8], 'big') * count) >> 64
+        window = 4 * int(count ** 0.5) + 16
+        lo = max(0, guess - window)
+        hi = min(count, guess + window)
+        if lo > 0 and self.digests[lo] > record_digest:
+            lo = 0
+        if hi < count and self.digests[hi - 1] < record_digest:
+            hi = count
+
+        i = bisect.bisect_left(self.digests, record_digest, lo, hi)
+        if i < count and self.digests[i] == record_digest:
+            return self.digests.offset(i)
+        return None
+
+    def _entry(self, offset):
+        """Read the (key, value) pair at `offset` in hash.json."""
+        size = 1024
+        while True:
+            text = self._json[offset:offset + size].decode('utf-8')
+            try:
+                key, end = scanstring(text, 1)
+                value, end = _decoder.raw_decode(text, end + 2)
+                return (key, value)
+            except ValueError:
+                # The entry runs past what we read.
+                if offset + size >= len(self._json):
+                    raise
+                size *= 4
+
+    def _parse_appended(self, text):
+        entries = []
+        position = 0
+        while position < len(text):
+            # Each entry is appended as `, "key": value`.
+            key, end = scanstring(text, position + 3)
+            value, position = _decoder.raw_decode(text, end + 2)
+            entries.append((key, value))
+        return entries
+
+    def _records(self):
+        """Iterate over (digest, offset) of saved entries in digest order."""
+        tail = sorted(self.tail.items())
+        def _sorted():
+            for i in range(self.digests.count):
+                record_digest = self.digests[i]
+                if record_digest not in self.tail:
+                    yield (record_digest, self.digests.offset(i))
+        return heapq.merge(_sorted(), tail)
+
+    def _append(self, entries):
+        records = []
+        with open(self.path, 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            position = f.tell()
+            for key, value in entries:
+                f.write(b', ')
+                records.append(RECORD.pack(digest(key), position + 2))
+                text = _entry_text(key, value).encode('utf-8')
+                f.write(text)
+                position += 2 + len(text)
+            f.write(b'}')
+            f.truncate()
+
+        count = self.digests.count
+        with open(self.index_path, 'r+b') as f:
+            # Superseded tail records are dropped along the way.
+            f.seek(HEADER.size + count * RECORD.size)
+            old_tail = dict(self.tail)
+            for record in records:
+                old_tail.pop(record[:32], None)
+            f.writelines(RECORD.pack(*item) for item in old_tail.items())
+            f.writelines(records)
+            f.truncate()
+            tail_count = len(old_tail) + len(records)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, count, tail_count, self._generation, *self._stat()))
+        self._open()
+
+    def _rewrite(self, entries, base):
+        """Write hash.json and the index in digest order.
+
+        :param entries: iterable of new (key, value) pairs.
+        :param bool base: Keep the saved entries which aren't replaced.
+        """
+        entries = sorted((digest(key), key, value) for key, value in entries)
+        replaced = set(item[0] for item in entries)
+        saved = []
+        if base:
+            saved = (
+                (record_digest, None, offset)
+                for record_digest, offset in self._records()
+                if record_digest not in replaced
+            )
+
+        json_tmp = '%s.tmp' % self.path
+        index_tmp = '%s.tmp' % self.index_path
+        count = 0
+        with open(json_tmp, 'wb') as json_file, open(index_tmp, 'wb') as index_file:
+            json_file.write(b'{')
+            index_file.write(b'\0' * HEADER.size)
+            position = 1
+            for record_digest, key, value in heapq.merge(saved, entries, key=lambda item: item[0]):
+                if key is None:
+                    key, value = self._entry(value)
+                if count:
+                    json_file.write(b', ')
+                    position += 2
+                index_file.write(RECORD.pack(record_digest, position))
+                text = _entry_text(key, value).encode('utf-8')
+                json_file.write(text)
+                position += len(text)
+                count += 1
+            json_file.write(b'}')
+
+        self.close()
+        compatability._rename(json_tmp, self.path)
+        # Random rather than counted up, the last generation is lost when
+        #  hash.json was written by someone else.
+        generation = struct.unpack('<Q', os.urandom(8))[0]
+        with open(index_tmp, 'r+b') as f:
+            f.write(HEADER.pack(MAGIC, count, 0, generation, *self._stat()))
+        compatability._rename(index_tmp, self.index_path)
+        self._open()
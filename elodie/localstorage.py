@@ -14,12 +14,18 @@ from shutil import copyfile
 from time import strftime
 
 from elodie import constants
+from elodie import log
+from elodie.config import load_config
+from elodie.hashindex import HashIndex
+from elodie.readahead import advise
+from elodie.trace import traced
 
 
 class Db(object):
 
     """A class for interacting with the JSON files created by Elodie."""
 
+    @traced('db.load')
     def __init__(self):
         # verify that the application directory (~/.elodie) exists,
         #   else create it
@@ -32,15 +38,9 @@ class Db(object):
             with open(constants.hash_db, 'a'):
                 os.utime(constants.hash_db, None)
 
-        self.hash_db = {}
-
-        # We know from above that this file exists so we open it
-        #   for reading only.
-        with open(constants.hash_db, 'r') as f:
-            try:
-                self.hash_db = json.load(f)
-            except ValueError:
-                pass
+        # Checksums are looked up in a compact index of hash.json rather
+        #  than loading all of it.
+        self.hash_db = HashIndex(constants.hash_db)
 
         # If the location db doesn't exist we create it.
         # Otherwise we only open for reading
@@ -109,25 +109,68 @@ class Db(object):
         """
         return key in self.hash_db
 
-    def checksum(self, file_path, blocksize=65536):
+    @traced('db.checksum')
+    def checksum(self, file_path, blocksize=65536, library=False, cached=True):
         """Create a hash value for the given file.
 
         See http://stackoverflow.com/a/3431835/1318758.
 
+        With [Checksum] xattr configured a checksum cached in the file's
+        extended attributes is used while the file's mtime and size are
+        unchanged. See :func:`get_checksum_xattr`.
+
         :param str file_path: Path to the file to create a hash for.
         :param int blocksize: Read blocks of this size from the file when
             creating the hash.
+        :param bool library: The file is in a library, cache its checksum
+            with xattr=library.
+        :param bool cached: Use a cached checksum.
         :returns: str or None
         """
+        mode = get_checksum_xattr()
+        if(mode is not None and cached is True):
+            checksum = read_checksum_xattr(file_path)
+            if(checksum is not None):
+                return checksum
+
         hasher = hashlib.sha256()
         with open(file_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            advise(f.fileno(), 'SEQUENTIAL')
             buf = f.read(blocksize)
 
             while len(buf) > 0:
                 hasher.update(buf)
                 buf = f.read(blocksize)
+            checksum = hasher.hexdigest()
+
+        if(mode == 'all' or (mode == 'library' and library is True)):
+            write_checksum_xattr(file_path, checksum, stat)
+        return checksum
+
+    @traced('db.partial_checksum')
+    def partial_checksum(self, file_path, blocksize=65536):
+        """Create a cheap fingerprint from the size, head and tail of a file.
+
+        Two files with different fingerprints are never identical, so this
+        lets us rule out duplicates without reading a whole file. Equal
+        fingerprints still need a full :func:`checksum` to confirm.
+
+        :param str file_path: Path to the file to fingerprint.
+        :param int blocksize: Bytes to read from the start and end of the file.
+        :returns: str or None
+        """
+        hasher = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            hasher.update(str(size).encode('ascii'))
+            f.seek(0)
+            hasher.update(f.read(blocksize))
+            if size > blocksize:
+                f.seek(max(blocksize, size - blocksize))
+                hasher.update(f.read(blocksize))
             return hasher.hexdigest()
-        return None
 
     def get_hash(self, key):
         """Get the hash value for a given key.
@@ -139,6 +182,7 @@ class Db(object):
             return self.hash_db[key]
         return None
 
+    @traced('db.location_lookup')
     def get_location_name(self, latitude, longitude, threshold_m):
         """Find a name for a location in the database.
 
@@ -192,14 +236,66 @@ class Db(object):
             yield (checksum, path)
 
     def reset_hash_db(self):
-        self.hash_db = {}
+        self.hash_db.clear()
 
+    @traced('db.update_hash_db')
     def update_hash_db(self):
         """Write the hash db to disk."""
-        with open(constants.hash_db, 'w') as f:
-            json.dump(self.hash_db, f)
+        self.hash_db.write()
 
+    @traced('db.update_location_db')
     def update_location_db(self):
         """Write the location db to disk."""
         with open(constants.location_db, 'w') as f:
             json.dump(self.location_db, f)
+
+
+def get_checksum_xattr():
+    """Get which files checksums are cached on from config.ini.
+
+    Configured with `xattr` under `[Checksum]`: `library` caches the
+    checksums of library files, `all` also those of import sources. Off by
+    default and where the platform has no extended attributes.
+
+    :returns: str 'library', 'all' or None
+    """
+    config = load_config()
+    if 'Checksum' not in config or 'xattr' not in config['Checksum']:
+        return None
+    mode = config['Checksum']['xattr'].strip().lower()
+    if mode not in ('library', 'all'):
+        if mode not in ('', 'off', 'false'):
+            log.warn('Invalid [Checksum] xattr, not caching checksums')
+        return None
+    if not hasattr(os, 'getxattr'):
+        return None
+    return mode
+
+
+def read_checksum_xattr(file_path):
+    """Get the checksum cached on a file if it's still valid.
+
+    :returns: str or None
+    """
+    try:
+        value = os.getxattr(file_path, constants.checksum_xattr)
+        stat = os.stat(file_path)
+        checksum, mtime_ns, size = value.decode('ascii').split(' ')
+        mtime_ns, size = int(mtime_ns), int(size)
+    except (OSError, UnicodeDecodeError, ValueError):
+        return None
+    if(mtime_ns != stat.st_mtime_ns or size != stat.st_size):
+        return None
+    return checksum
+
+
+def write_checksum_xattr(file_path, checksum, stat):
+    """Cache a checksum on a file.
+
+    :param stat: os.stat_result of the file when it was hashed.
+    """
+    value = '%s %d %d' % (checksum, stat.st_mtime_ns, stat.st_size)
+    try:
+        os.setxattr(file_path, constants.checksum_xattr, value.encode('ascii'))
+    except OSError as e:
+        log.info('Could not cache checksum on %s: %s' % (file_path, e))
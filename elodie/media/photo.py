@@ -36,14 +36,20 @@ class Photo(Media):
         # We only want to parse EXIF once so we store it here
         self.exif = None
 
-        # Optionally import Pillow - see gh-325
-        # https://github.com/jmathai/elodie/issues/325
-        self.pillow = None
+    @property
+    def pillow(self):
+        """Pillow's Image module, or None if Pillow isn't installed.
+
+        Optionally import Pillow - see gh-325
+        https://github.com/jmathai/elodie/issues/325
+        It's only needed when imghdr can't identify a file so it's imported
+        on first use rather than at startup.
+        """
         try:
             from PIL import Image
-            self.pillow = Image
+            return Image
         except ImportError:
-            pass
+            return None
 
     def get_date_taken(self):
         """Get the date which the photo was taken.
@@ -15,6 +15,7 @@ import os
 import re
 import time
 
+from elodie.quicktime_reader import QuickTimeReader
 from .media import Media
 
 
@@ -30,6 +31,9 @@ class Video(Media):
     #: Valid extensions for video files.
     extensions = ('avi', 'm4v', 'mov', 'mp4', 'mpg', 'mpeg', '3gp', 'mts')
 
+    #: Extensions of QuickTime/ISO-BMFF containers read with QuickTimeReader.
+    quicktime_extensions = ('m4a', 'm4v', 'mov', 'mp4', '3gp')
+
     def __init__(self, source=None):
         super(Video, self).__init__(source)
         self.exif_map['date_taken'] = [
@@ -54,6 +58,28 @@ class Video(Media):
         self.longitude_ref_key = 'EXIF:GPSLongitudeRef'
         self.set_gps_ref = False
 
+    def get_exiftool_attributes(self):
+        """Get attributes for the media object from its QuickTime atoms.
+
+        ExifRead can't parse QuickTime containers so we use a streaming box
+        parser which only reads the moov metadata boxes. Other containers,
+        like AVI or MPEG-TS, are read as before.
+
+        :returns: dict, or None if no metadata was found.
+        """
+        extension = os.path.splitext(self.source)[1][1:].lower()
+        if extension not in self.quicktime_extensions:
+            return super(Video, self).get_exiftool_attributes()
+
+        if(self.exif_metadata is None):
+            reader = QuickTimeReader()
+            self.exif_metadata = reader.get_metadata(self.source)
+
+        if not self.exif_metadata:
+            return None
+
+        return self.exif_metadata
+
     def get_date_taken(self):
         """Get the date which the photo was taken.
 
@@ -0,0 +1,182 @@
+"""
+Prometheus metrics for import, verify and generate-db runs.
+
+Metrics are written in the text exposition format to a file which
+node_exporter's textfile collector picks up. The file is rewritten
+atomically every :data:`~elodie.constants.metrics_interval` seconds while a
+run is in progress and once more when it finishes.
+"""
+from __future__ import print_function
+from builtins import object
+
+import os
+import threading
+import time
+
+from elodie import constants
+from elodie import exif_reader
+from elodie import geolocation_offline as geolocation
+from elodie import trace
+
+
+class MetricsWriter(object):
+    """Periodically write a run's counters to a Prometheus textfile.
+
+    Counters come from :class:`~elodie.result.Result` and, for imports,
+    :class:`~elodie.session_log.SessionLogger`. Stage latencies are collected
+    by observing :mod:`elodie.trace` spans.
+
+    :param str path: File to write.
+    :param str command: Command name used as the `command` label.
+    :param result: The run's :class:`~elodie.result.Result`.
+    :param session_logger: Optional :class:`~elodie.session_log.SessionLogger`.
+    """
+
+    def __init__(self, path, command, result, session_logger=None, interval=None):
+        self.path = path
+        self.command = command
+        self.result = result
+        self.session_logger = session_logger
+        self.interval = constants.metrics_interval if interval is None else interval
+        self.buckets = constants.metrics_buckets
+        self.lock = threading.Lock()
+        # stage -> [bucket counts..., count, sum]
+        self.histograms = {}
+        self.start_time = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.start_time = time.time()
+        geolocation.reset_cache_stats()
+        exif_reader.reset_window_stats()
+        trace.observe(self.observe)
+        self.write()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def finish(self):
+        """Stop periodic updates and write the final metrics."""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        trace.unobserve(self.observe)
+        self.write(completed=True)
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = [0] * len(self.buckets) + [0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+
+    def render(self, completed=False):
+        """Render all metrics in the Prometheus text format.
+
+        :returns: str
+        """
+        now = time.time()
+        duration = max(now - self.start_time, 0.000001)
+        result = self.result
+        # Files left out by --where were never looked at for duplicates.
+        considered = result.success + result.error + result.skipped
+        total = considered + result.filtered
+        command = 'command="%s"' % self.command
+
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, metric_type))
+            for labels, value in samples:
+                lines.append('%s{%s} %s' % (name, labels, _format(value)))
+
+        metric('elodie_files_total', 'counter', 'Files processed by status.', [
+            ('%s,status="success"' % command, result.success),
+            ('%s,status="error"' % command, result.error),
+            ('%s,status="skipped"' % command, result.skipped),
+            ('%s,status="filtered"' % command, result.filtered)
+        ])
+        metric('elodie_bytes_total', 'counter', 'Bytes copied or hashed.', [
+            (command, result.bytes)
+        ])
+        metric('elodie_files_per_second', 'gauge', 'Average files processed per second.', [
+            (command, total / duration)
+        ])
+        metric('elodie_bytes_per_second', 'gauge', 'Average bytes copied or hashed per second.', [
+            (command, result.bytes / duration)
+        ])
+        metric('elodie_duplicate_ratio', 'gauge', 'Share of files skipped as duplicates.', [
+            (command, float(result.skipped) / considered if considered else 0.0)
+        ])
+        if self.session_logger is not None:
+            metric('elodie_session_errors_total', 'counter', 'Errors written to the session log.', [
+                (command, self.session_logger.error_count)
+            ])
+
+        cache_stats = geolocation.get_cache_stats()
+        metric('elodie_geocoder_cache_requests_total', 'counter', 'Place lookups by location cache result.', [
+            ('%s,result="hit"' % command, cache_stats['hits']),
+            ('%s,result="miss"' % command, cache_stats['misses'])
+        ])
+        metric('elodie_geocoder_cache_hit_ratio', 'gauge', 'Share of place lookups answered from the location cache.', [
+            (command, cache_stats['hit_rate'])
+        ])
+
+        window_stats = exif_reader.get_window_stats()
+        formats = sorted(window_stats)
+        metric('elodie_exif_window_requests_total', 'counter', 'EXIF reads by format and whether the header window was enough.', [
+            ('%s,format="%s",result="%s"' % (command, extension, result), window_stats[extension][result])
+            for extension in formats for result in ('window', 'full')
+        ])
+        metric('elodie_exif_window_hit_ratio', 'gauge', 'Share of EXIF reads answered from the header window.', [
+            ('%s,format="%s"' % (command, extension), window_stats[extension]['hit_rate'])
+            for extension in formats
+        ])
+
+        with self.lock:
+            histograms = dict((name, list(values)) for name, values in self.histograms.items())
+        lines.append('# HELP elodie_stage_duration_seconds Time spent per stage.')
+        lines.append('# TYPE elodie_stage_duration_seconds histogram')
+        for name in sorted(histograms):
+            values = histograms[name]
+            labels = '%s,stage="%s"' % (command, name)
+            for i, bound in enumerate(self.buckets):
+                lines.append('elodie_stage_duration_seconds_bucket{%s,le="%s"} %d' % (labels, _format(bound), values[i]))
+            lines.append('elodie_stage_duration_seconds_bucket{%s,le="+Inf"} %d' % (labels, values[-2]))
+            lines.append('elodie_stage_duration_seconds_count{%s} %d' % (labels, values[-2]))
+            lines.append('elodie_stage_duration_seconds_sum{%s} %s' % (labels, _format(values[-1])))
+
+        metric('elodie_run_start_timestamp_seconds', 'gauge', 'When the run started.', [
+            (command, self.start_time)
+        ])
+        metric('elodie_run_duration_seconds', 'gauge', 'Seconds since the run started.', [
+            (command, duration)
+        ])
+        metric('elodie_run_completed', 'gauge', '1 once the run has finished.', [
+            (command, 1 if completed else 0)
+        ])
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, completed=False):
+        # The collector may read at any time so never expose a partial file.
+        temporary_path = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(temporary_path, 'w') as f:
+            f.write(self.render(completed))
+        os.replace(temporary_path, self.path)
+
+
+def _format(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
@@ -23,12 +23,17 @@ from __future__ import print_function
 
 import json
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from os.path import basename, isfile
 
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import AuthorizedSession
 from google.oauth2.credentials import Credentials
 
+from elodie import log
 from elodie.media.photo import Photo
 from elodie.media.video import Video
 from elodie.plugins.plugins import PluginBase
@@ -41,6 +46,8 @@ class GooglePhotos(PluginBase):
             The full file path where to find the downloaded secrets.
        auth_file:
             The full file path where to store authenticated tokens.
+       upload_workers (optional):
+            Number of files batch() uploads at the same time. Defaults to 4.
     
     """
 
@@ -51,6 +58,8 @@ class GooglePhotos(PluginBase):
         self.upload_url = 'https://photoslibrary.googleapis.com/v1/uploads'
         self.media_create_url = 'https://photoslibrary.googleapis.com/v1/mediaItems:batchCreate'
         self.scopes = ['https://www.googleapis.com/auth/photoslibrary.appendonly']
+        # mediaItems:batchCreate accepts up to 50 items per call.
+        self.batch_create_size = 50
         
         self.secrets_file = None
         if('secrets_file' in self.config_for_plugin):
@@ -59,36 +68,99 @@ class GooglePhotos(PluginBase):
         self.auth_file = None
         if('auth_file' in self.config_for_plugin):
             self.auth_file = self.config_for_plugin['auth_file']
+        # Number of files uploaded at the same time by batch().
+        self.upload_workers = 4
+        if('upload_workers' in self.config_for_plugin):
+            try:
+                upload_workers = int(self.config_for_plugin['upload_workers'])
+            except ValueError:
+                upload_workers = 0
+            if(upload_workers > 0):
+                self.upload_workers = upload_workers
+            else:
+                log.warn('Invalid [PluginGooglePhotos] upload_workers, using default')
         self.session = None
 
     def after(self, file_path, destination_folder, final_file_path, metadata):
-        extension = metadata['extension']
-        if(extension in Photo.extensions or extension in Video.extensions):
-            self.log(u'Added {} to db.'.format(final_file_path))
-            self.db.set(final_file_path, metadata['original_name'])
-        else:
-            self.log(u'Skipping {} which is not a supported media type.'.format(final_file_path))
+        self.after_batch([{
+            'file_path': file_path,
+            'destination_folder': destination_folder,
+            'final_file_path': final_file_path,
+            'metadata': metadata
+        }])
+
+    def after_batch(self, records):
+        # Queue every supported file from the batch in a single transaction.
+        queue = {}
+        for record in records:
+            final_file_path = record['final_file_path']
+            extension = record['metadata']['extension']
+            if(extension in Photo.extensions or extension in Video.extensions):
+                self.log(u'Added {} to db.'.format(final_file_path))
+                queue[final_file_path] = record['metadata']['original_name']
+            else:
+                self.log(u'Skipping {} which is not a supported media type.'.format(final_file_path))
+        self.db.set_many(queue)
 
     def batch(self):
-        queue = self.db.get_all()
+        queue = list(self.db.get_all())
         status = True
-        count = 0
-        for key in queue:
-            this_status = self.upload(key)
-            if(this_status):
-                # Remove from queue if successful then increment count
-                self.db.delete(key)
-                count = count + 1
-                self.display('{} uploaded successfully.'.format(key))
-            else:
+        uploaded = []
+        if(not queue):
+            return (status, 0)
+
+        self.set_session()
+        if(self.session is None):
+            self.display('Could not initialize session')
+            return (False, 0)
+
+        # Upload bytes concurrently and create media items as soon as
+        #  batch_create_size upload tokens are ready.
+        pending = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.upload_workers) as executor:
+                futures = {executor.submit(self.upload_file, key): key for key in queue}
+                for future in as_completed(futures):
+                    key = futures[future]
+                    upload_token = future.result()
+                    if(upload_token is None):
+                        status = False
+                        self.display('{} failed to upload.'.format(key))
+                        continue
+
+                    pending.append((key, upload_token))
+                    if(len(pending) == self.batch_create_size):
+                        status = self._create_pending(pending, uploaded) and status
+                        pending = []
+
+            if(pending):
+                status = self._create_pending(pending, uploaded) and status
+        finally:
+            # Remove everything which uploaded successfully from the queue
+            #  in one transaction, even if a later upload raised.
+            self.db.delete_many(uploaded)
+        return (status, len(uploaded))
+
+    def _create_pending(self, pending, uploaded):
+        status = True
+        results = self.create_media_items([upload_token for key, upload_token in pending])
+        for (key, upload_token), result in zip(pending, results):
+            if(result is None):
                 status = False
                 self.display('{} failed to upload.'.format(key))
-        return (status, count)
+            else:
+                uploaded.append(key)
+                self.display('{} uploaded successfully.'.format(key))
+        return status
 
     def before(self, file_path, destination_folder):
         pass
 
     def set_session(self):
+        # The session is authorized once and reused for every upload.
+        if(self.session is not None):
+            return
+
         # Try to load credentials from an auth file.
         # If it doesn't exist or is not valid then catch the 
         #  exception and reauthenticate.
@@ -114,9 +186,14 @@ class GooglePhotos(PluginBase):
             except:
                 return
 
-        self.session = AuthorizedSession(creds)
-        self.session.headers["Content-type"] = "application/octet-stream"
-        self.session.headers["X-Goog-Upload-Protocol"] = "raw"
+        session = AuthorizedSession(creds)
+        # Keep a connection per upload worker alive between requests.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.upload_workers)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers["Content-type"] = "application/octet-stream"
+        session.headers["X-Goog-Upload-Protocol"] = "raw"
+        self.session = session
 
     def upload(self, path_to_photo):
         self.set_session()
@@ -124,32 +201,84 @@ class GooglePhotos(PluginBase):
             self.log('Could not initialize session')
             return None
 
-        self.session.headers["X-Goog-Upload-File-Name"] = basename(path_to_photo)
+        upload_token = self.upload_file(path_to_photo)
+        if(upload_token is None):
+            return None
+
+        return self.create_media_items([upload_token])[0]
+
+    def upload_file(self, path_to_photo):
+        """Upload the bytes of a file and return its upload token.
+           The file is streamed from disk rather than read into memory.
+        """
+        if(self.session is None):
+            self.log('Could not initialize session')
+            return None
+
         if(not isfile(path_to_photo)):
             self.log('Could not find file: {}'.format(path_to_photo))
             return None
 
-        with open(path_to_photo, 'rb') as f:
-            photo_bytes = f.read()
+        # The file name header is set per request since the session is
+        #  shared between upload workers.
+        headers = {"X-Goog-Upload-File-Name": basename(path_to_photo)}
+        try:
+            with open(path_to_photo, 'rb') as f:
+                upload_token = self.session.post(self.upload_url, data=f, headers=headers)
+        except (IOError, OSError, RequestException) as e:
+            # Unreadable files fail like any other upload so the tokens
+            #  of the rest of a batch are still used.
+            self.log('Uploading media failed: {}'.format(e))
+            return None
 
-        upload_token = self.session.post(self.upload_url, photo_bytes)
         if(upload_token.status_code != 200 or not upload_token.content):
             self.log('Uploading media failed: ({}) {}'.format(upload_token.status_code, upload_token.content))
             return None
 
-        create_body = json.dumps({'newMediaItems':[{'description':'','simpleMediaItem':{'uploadToken':upload_token.content.decode()}}]}, indent=4)
-        resp = self.session.post(self.media_create_url, create_body).json()
-        if(
-            'newMediaItemResults' not in resp or
-            'status' not in resp['newMediaItemResults'][0] or
-            'message' not in resp['newMediaItemResults'][0]['status'] or
-            (
-                resp['newMediaItemResults'][0]['status']['message'] != 'Success' and # photos
-                resp['newMediaItemResults'][0]['status']['message'] != 'OK' # videos
-            )
-
-        ):
-            self.log('Creating new media item failed: {}'.format(json.dumps(resp)))
-            return None
-        
-        return resp['newMediaItemResults'][0]
+        return upload_token.content.decode()
+
+    def create_media_items(self, upload_tokens):
+        """Create media items for up to batch_create_size upload tokens with
+           a single batchCreate call.
+           Returns a list with the newMediaItemResult for each token, or None
+           where the item could not be created.
+        """
+        create_body = json.dumps({'newMediaItems':[
+            {'description':'','simpleMediaItem':{'uploadToken':upload_token}}
+            for upload_token in upload_tokens
+        ]}, indent=4)
+        try:
+            resp = self.session.post(self.media_create_url, create_body).json()
+        except (RequestException, ValueError) as e:
+            self.log('Creating new media items failed: {}'.format(e))
+            return [None] * len(upload_tokens)
+
+        if('newMediaItemResults' not in resp):
+            self.log('Creating new media items failed: {}'.format(json.dumps(resp)))
+            return [None] * len(upload_tokens)
+
+        by_token = {}
+        for result in resp['newMediaItemResults']:
+            if('uploadToken' in result):
+                by_token[result['uploadToken']] = result
+
+        results = []
+        for i, upload_token in enumerate(upload_tokens):
+            # Results are returned in request order and echo their token.
+            result = by_token.get(upload_token)
+            if(result is None and i < len(resp['newMediaItemResults'])):
+                result = resp['newMediaItemResults'][i]
+            if(
+                result is None or
+                'status' not in result or
+                'message' not in result['status'] or
+                (
+                    result['status']['message'] != 'Success' and # photos
+                    result['status']['message'] != 'OK' # videos
+                )
+            ):
+                self.log('Creating new media item failed: {}'.format(json.dumps(result)))
+                results.append(None)
+            else:
+                results.append(result)
+        return results
@@ -7,18 +7,21 @@ from __future__ import print_function
 from builtins import object
 
 import io
+import sqlite3
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
 from json import dumps, loads
 from importlib import import_module
 from os.path import dirname, dirname, isdir, isfile
-from os import mkdir
+from os import mkdir, rename
 from sys import exc_info
 from traceback import format_exc
 
-from elodie.compatability import _bytes
 from elodie.config import load_config_for_plugin, load_plugin_config
-from elodie.constants import application_directory
+from elodie.constants import application_directory, plugin_async_queue_size, plugin_batch_size
 from elodie import log
+from elodie.trace import traced
 
 
 class ElodiePluginError(Exception):
@@ -33,6 +36,14 @@ class PluginBase(object):
     """
     __name__ = 'PluginBase'
 
+    #: Plugins whose after() only has side effects can set this to True.
+    #:  Their after() then runs on a background executor and can't fail
+    #:  the import.
+    async_after = False
+
+    #: Number of after() calls run at the same time when async_after is set.
+    max_concurrency = 1
+
     def __init__(self):
         # Loads the config for the plugin from config.ini
         self.config_for_plugin = load_config_for_plugin(self.__name__)
@@ -41,12 +52,35 @@ class PluginBase(object):
     def after(self, file_path, destination_folder, final_file_path, metadata):
         pass
 
+    def after_batch(self, records):
+        """Called with a list of completed imports.
+           Each record is a dict with file_path, destination_folder, final_file_path and metadata.
+           Plugins which override this are sent chunks of records instead of single after() calls.
+           The default calls after() for every record.
+        """
+        for record in records:
+            self.after(
+                record['file_path'],
+                record['destination_folder'],
+                record['final_file_path'],
+                record['metadata']
+            )
+
     def batch(self):
         pass
 
     def before(self, file_path, destination_folder):
         pass
 
+    def before_batch(self, records):
+        """Called with a list of files about to be imported.
+           Each record is a dict with file_path and destination_folder.
+           Raising ElodiePluginError skips every file in the records.
+           The default calls before() for every record.
+        """
+        for record in records:
+            self.before(record['file_path'], record['destination_folder'])
+
     def log(self, msg):
         # Writes an info log not shown unless being run in --debug mode.
         log.info(dumps(
@@ -61,10 +95,17 @@ class PluginBase(object):
 
 class PluginDb(object):
     """A database module which provides a simple key/value database.
-       The database is a JSON file located at %application_directory%/plugins/%pluginname.lower()%.json
+       The database is a SQLite file located at %application_directory%/plugins/%pluginname.lower()%.db
+       with the key as primary index, so single key operations don't touch the rest of the data.
+       Values are stored as JSON.
+       A JSON database from older versions at %pluginname.lower()%.json is migrated on first use.
     """
     def __init__(self, plugin_name):
-        self.db_file = '{}/plugins/{}.json'.format(
+        self.db_file = '{}/plugins/{}.db'.format(
+            application_directory,
+            plugin_name.lower()
+        )
+        self.legacy_db_file = '{}/plugins/{}.json'.format(
             application_directory,
             plugin_name.lower()
         )
@@ -73,45 +114,79 @@ class PluginDb(object):
         if(not isdir(dirname(self.db_file))):
             mkdir(dirname(self.db_file))
 
-        # If the db file does not exist we initialize it
-        if(not isfile(self.db_file)):
-            with io.open(self.db_file, 'wb') as f:
-                f.write(_bytes(dumps({})))
+        # Plugins are called from the import worker threads so the connection
+        #  is shared and access is serialized with a lock.
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.db_file, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL)'
+            )
+
+        if(isfile(self.legacy_db_file)):
+            self._migrate()
 
+    def _migrate(self):
+        with io.open(self.legacy_db_file, 'r') as f:
+            try:
+                db = loads(f.read())
+            except ValueError:
+                log.warn('Could not migrate plugin db {}'.format(self.legacy_db_file))
+                return
+
+        # Keys already written to the new db win over the legacy file.
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO kv (key, value) VALUES (?, ?)',
+                [(key, dumps(value)) for key, value in db.items()]
+            )
+        rename(self.legacy_db_file, '{}.migrated'.format(self.legacy_db_file))
 
     def get(self, key):
-        with io.open(self.db_file, 'r') as f:
-            db = loads(f.read())
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT value FROM kv WHERE key = ?', (key,)
+            ).fetchone()
 
-        if(key not in db):
+        if(row is None):
             return None
 
-        return db[key]
+        return loads(row[0])
 
     def set(self, key, value):
-        with io.open(self.db_file, 'r') as f:
-            data = f.read()
-            db = loads(data)
+        self.set_many({key: value})
+
+    def set_many(self, items):
+        """Set several keys in a single transaction.
 
-        db[key] = value
-        new_content = dumps(db, ensure_ascii=False).encode('utf8')
-        with io.open(self.db_file, 'wb') as f:
-            f.write(new_content)
+        :param dict items: Keys and values to set.
+        """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)',
+                [(key, dumps(value)) for key, value in items.items()]
+            )
 
     def get_all(self):
-        with io.open(self.db_file, 'r') as f:
-            db = loads(f.read())
-        return db
+        with self.lock:
+            rows = self.connection.execute('SELECT key, value FROM kv').fetchall()
+        return {key: loads(value) for key, value in rows}
 
     def delete(self, key):
-        with io.open(self.db_file, 'r') as f:
-            db = loads(f.read())
-
         # delete key without throwing an exception
-        db.pop(key, None)
-        new_content = dumps(db, ensure_ascii=False).encode('utf8')
-        with io.open(self.db_file, 'wb') as f:
-            f.write(new_content)
+        self.delete_many([key])
+
+    def delete_many(self, keys):
+        """Delete several keys in a single transaction.
+           Keys which don't exist are ignored.
+
+        :param list keys: Keys to delete.
+        """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'DELETE FROM kv WHERE key = ?',
+                [(key,) for key in keys]
+            )
 
 
 class Plugins(object):
@@ -123,6 +198,17 @@ class Plugins(object):
         self.plugins = []
         self.classes = {}
         self.loaded = False
+        # Executors and queue slots for plugins with async_after set.
+        self.executors = {}
+        self.slots = {}
+        # Completed imports waiting to be sent to after_batch().
+        self.after_records = {}
+        self.after_records_lock = threading.Lock()
+        # Files already sent to before_batch() and the ones it rejected.
+        self.before_batched = set()
+        self.before_rejected = set()
+        self.errors = []
+        self.errors_lock = threading.Lock()
 
     def load(self):
         """Load plugins from config file.
@@ -151,12 +237,31 @@ class Plugins(object):
 
         self.loaded = True
 
+    @traced('plugins.after')
     def run_all_after(self, file_path, destination_folder, final_file_path, metadata):
         """Process `before` methods of each plugin that was loaded.
         """
         self.load()
         pass_status = True
         for cls in self.classes:
+            if self._overrides(cls, 'after_batch'):
+                self._buffer_after(cls, {
+                    'file_path': file_path,
+                    'destination_folder': destination_folder,
+                    'final_file_path': final_file_path,
+                    'metadata': metadata
+                })
+                continue
+
+            if getattr(self.classes[cls], 'async_after', False) is True:
+                self._submit_after(cls, [{
+                    'file_path': file_path,
+                    'destination_folder': destination_folder,
+                    'final_file_path': final_file_path,
+                    'metadata': metadata
+                }])
+                continue
+
             this_method = getattr(self.classes[cls], 'after')
             # We try to call the plugin's `before()` method.
             # If the method explicitly raises an ElodiePluginError we'll fail the import
@@ -175,6 +280,120 @@ class Plugins(object):
                 log.error(format_exc())
         return pass_status
 
+    def _overrides(self, cls, method):
+        """Whether a plugin implements a batch hook instead of relying on
+           the per-file default.
+        """
+        return getattr(type(self.classes[cls]), method, None) is not getattr(PluginBase, method)
+
+    def _buffer_after(self, cls, record):
+        with self.after_records_lock:
+            records = self.after_records.setdefault(cls, [])
+            records.append(record)
+            if len(records) < plugin_batch_size:
+                return
+            self.after_records[cls] = []
+
+        if getattr(self.classes[cls], 'async_after', False) is True:
+            self._submit_after(cls, records)
+        else:
+            self._run_after_batch(cls, records)
+
+    def _submit_after(self, cls, records):
+        plugin = self.classes[cls]
+        if cls not in self.executors:
+            self.executors[cls] = ThreadPoolExecutor(
+                max_workers=max(1, getattr(plugin, 'max_concurrency', 1)),
+                thread_name_prefix='plugin-{}'.format(cls)
+            )
+            self.slots[cls] = threading.BoundedSemaphore(plugin_async_queue_size)
+
+        # Blocks once the plugin's queue is full so a slow plugin can't
+        #  buffer an unbounded number of calls.
+        self.slots[cls].acquire()
+        future = self.executors[cls].submit(self._run_after_batch, cls, records)
+        future.add_done_callback(lambda f: self.slots[cls].release())
+
+    @traced('plugins.after_batch')
+    def _run_after_batch(self, cls, records):
+        # Imports in `records` have already completed so failures here can't
+        #  fail them. They're collected and returned by drain().
+        try:
+            self.classes[cls].after_batch(records)
+            log.info('Called after_batch() with {} records for {}'.format(len(records), cls))
+        except:
+            log.error(format_exc())
+            with self.errors_lock:
+                for record in records:
+                    self.errors.append({
+                        'plugin': cls,
+                        'file': record['final_file_path'],
+                        'message': str(exc_info()[1])
+                    })
+
+    @traced('plugins.drain')
+    def drain(self):
+        """Flush buffered after_batch() records, wait for queued async calls
+           and shut down their executors.
+
+        :returns: list of dicts with the plugin, file and message of every
+            deferred `after` call which raised.
+        """
+        for cls in list(self.executors):
+            self.executors.pop(cls).shutdown(wait=True)
+            self.slots.pop(cls, None)
+
+        with self.after_records_lock:
+            pending = self.after_records
+            self.after_records = {}
+        for cls, records in pending.items():
+            if records:
+                self._run_after_batch(cls, records)
+
+        self.before_batched = set()
+        self.before_rejected = set()
+
+        with self.errors_lock:
+            errors = self.errors
+            self.errors = []
+        return errors
+
+    @traced('plugins.before_batch')
+    def run_all_before_batch(self, file_paths, destination_folder):
+        """Process `before_batch` methods of each plugin which implements one.
+           Files are sent in chunks of constants.plugin_batch_size.
+           run_all_before() then skips these plugins for the files and fails
+           any file in a chunk which raised an ElodiePluginError.
+        """
+        self.load()
+        batch_plugins = [cls for cls in self.classes if self._overrides(cls, 'before_batch')]
+        if not batch_plugins:
+            return
+
+        for i in range(0, len(file_paths), plugin_batch_size):
+            chunk = file_paths[i:i + plugin_batch_size]
+            records = [
+                {'file_path': file_path, 'destination_folder': destination_folder}
+                for file_path in chunk
+            ]
+            for cls in batch_plugins:
+                if not self._call_before_batch(cls, records):
+                    self.before_rejected.update(chunk)
+            self.before_batched.update(chunk)
+
+    def _call_before_batch(self, cls, records):
+        try:
+            self.classes[cls].before_batch(records)
+            log.info('Called before_batch() with {} records for {}'.format(len(records), cls))
+        except ElodiePluginError as err:
+            log.warn('Plugin {} raised an exception in run_all_before_batch: {}'.format(cls, err))
+            log.error(format_exc())
+            return False
+        except:
+            log.error(format_exc())
+        return True
+
+    @traced('plugins.batch')
     def run_batch(self):
         self.load()
         pass_status = True
@@ -196,12 +415,24 @@ class Plugins(object):
                 log.error(format_exc())
         return pass_status
 
+    @traced('plugins.before')
     def run_all_before(self, file_path, destination_folder):
         """Process `before` methods of each plugin that was loaded.
         """
         self.load()
         pass_status = True
+        if file_path in self.before_rejected:
+            return False
+
         for cls in self.classes:
+            if self._overrides(cls, 'before_batch'):
+                # Already handled by run_all_before_batch() or called on its own,
+                #  e.g. from `update`, as a batch of one.
+                if file_path not in self.before_batched:
+                    if not self._call_before_batch(cls, [{'file_path': file_path, 'destination_folder': destination_folder}]):
+                        pass_status = False
+                continue
+
             this_method = getattr(self.classes[cls], 'before')
             # We try to call the plugin's `before()` method.
             # If the method explicitly raises an ElodiePluginError we'll fail the import
@@ -0,0 +1,270 @@
+"""Streaming QuickTime/MP4 metadata reader.
+
+Walks the box (atom) tree of MOV, MP4, M4V, M4A and 3GP files and only reads
+the boxes which carry metadata: ``moov/mvhd``, the first ``trak/mdia/mdhd``,
+``moov/udta`` and ``moov/meta`` (``keys`` + ``ilst``). Every other box,
+``mdat`` and the sample tables in particular, is skipped with a seek so a
+multi-GB video costs a few KB of I/O.
+
+Keys are named the way exiftool names them so :class:`~elodie.media.video.Video`
+can consume them through its existing ``exif_map`` and coordinate keys.
+"""
+
+import re
+import struct
+from datetime import datetime, timedelta
+
+
+#: Seconds between the QuickTime epoch (1904-01-01) and the Unix epoch.
+QUICKTIME_EPOCH = datetime(1904, 1, 1)
+
+#: Container boxes we descend into. Anything else is skipped.
+CONTAINER_BOXES = (b'moov', b'trak', b'mdia', b'udta')
+
+#: Boxes larger than this are never read into memory.
+MAX_METADATA_BOX_SIZE = 1024 * 1024
+
+#: Maps mdta keys (moov/meta/keys) to exiftool tag names.
+MDTA_KEYS = {
+    'com.apple.quicktime.creationdate': 'QuickTime:CreationDate',
+    'com.apple.quicktime.make': 'QuickTime:Make',
+    'com.apple.quicktime.model': 'QuickTime:Model',
+    'com.apple.quicktime.software': 'QuickTime:Software',
+    'com.apple.quicktime.displayname': 'QuickTime:DisplayName',
+    'com.apple.quicktime.title': 'QuickTime:Title',
+    'com.apple.quicktime.album': 'QuickTime:Album',
+    'com.apple.quicktime.location.ISO6709': 'QuickTime:GPSCoordinates',
+}
+
+#: Maps udta (and udta/meta/ilst) atoms to exiftool tag names.
+USER_DATA_KEYS = {
+    b'\xa9day': 'QuickTime:ContentCreateDate',
+    b'\xa9mak': 'QuickTime:Make',
+    b'\xa9mod': 'QuickTime:Model',
+    b'\xa9swr': 'QuickTime:Software',
+    b'\xa9too': 'QuickTime:Encoder',
+    b'\xa9nam': 'QuickTime:Title',
+    b'\xa9alb': 'QuickTime:Album',
+    b'\xa9xyz': 'QuickTime:GPSCoordinates',
+}
+
+ISO6709_REGEX = re.compile(
+    r'([+-][0-9]+(?:\.[0-9]*)?)([+-][0-9]+(?:\.[0-9]*)?)([+-][0-9]+(?:\.[0-9]*)?)?'
+)
+
+
+class QuickTimeReader:
+    """Thread-safe, streaming reader for QuickTime/ISO base media files."""
+
+    def get_metadata(self, file_path):
+        """Get QuickTime metadata from a file."""
+        try:
+            metadata = {}
+            with open(file_path, 'rb') as f:
+                f.seek(0, 2)
+                file_size = f.tell()
+                moov = self._find_box(f, 0, file_size, b'moov')
+                if moov is None:
+                    return {}
+                self._parse_moov(f, moov[0], moov[1], metadata)
+
+            if 'QuickTime:GPSCoordinates' in metadata:
+                coordinates = self._parse_iso6709(
+                    metadata['QuickTime:GPSCoordinates']
+                )
+                if coordinates:
+                    metadata['Composite:GPSLatitude'] = coordinates[0]
+                    metadata['Composite:GPSLongitude'] = coordinates[1]
+                    if coordinates[2] is not None:
+                        metadata['Composite:GPSAltitude'] = coordinates[2]
+
+            return metadata
+
+        except Exception:
+            # Truncated or non-QuickTime files are normal, same as ExifReader.
+            return {}
+
+    def _boxes(self, f, start, end):
+        """Yield (type, payload_start, box_end) for boxes in [start, end)."""
+        position = start
+        while position + 8 <= end:
+            f.seek(position)
+            header = f.read(8)
+            if len(header) < 8:
+                return
+            size, box_type = struct.unpack('>I4s', header)
+            header_size = 8
+            if size == 1:
+                size = struct.unpack('>Q', f.read(8))[0]
+                header_size = 16
+            elif size == 0:
+                size = end - position
+            if size < header_size:
+                return
+            yield (box_type, position + header_size, min(position + size, end))
+            position += size
+
+    def _find_box(self, f, start, end, wanted):
+        for box_type, payload_start, box_end in self._boxes(f, start, end):
+            if box_type == wanted:
+                return (payload_start, box_end)
+        return None
+
+    def _read_payload(self, f, start, end):
+        if end - start > MAX_METADATA_BOX_SIZE:
+            return b''
+        f.seek(start)
+        return f.read(end - start)
+
+    def _parse_moov(self, f, start, end, metadata):
+        for box_type, payload_start, box_end in self._boxes(f, start, end):
+            if box_type == b'mvhd':
+                date = self._parse_header_date(
+                    self._read_payload(f, payload_start, box_end)
+                )
+                if date:
+                    metadata['QuickTime:CreateDate'] = date
+            elif box_type == b'mdhd':
+                date = self._parse_header_date(
+                    self._read_payload(f, payload_start, box_end)
+                )
+                if date and 'QuickTime:MediaCreateDate' not in metadata:
+                    metadata['QuickTime:MediaCreateDate'] = date
+            elif box_type == b'meta':
+                self._parse_meta(f, payload_start, box_end, metadata)
+            elif box_type in USER_DATA_KEYS:
+                value = self._parse_user_data(
+                    self._read_payload(f, payload_start, box_end)
+                )
+                if value:
+                    metadata.setdefault(USER_DATA_KEYS[box_type], value)
+            elif box_type in CONTAINER_BOXES:
+                self._parse_moov(f, payload_start, box_end, metadata)
+
+    def _parse_meta(self, f, start, end, metadata):
+        # In ISO files meta is a full box (4 byte version/flags) while
+        #  QuickTime writes it as a plain container. We peek to find out.
+        f.seek(start)
+        peek = f.read(8)
+        if len(peek) == 8 and peek[4:8] != b'hdlr':
+            start += 4
+
+        keys = []
+        for box_type, payload_start, box_end in self._boxes(f, start, end):
+            if box_type == b'keys':
+                keys = self._parse_keys(
+                    self._read_payload(f, payload_start, box_end)
+                )
+            elif box_type == b'ilst':
+                self._parse_ilst(f, payload_start, box_end, keys, metadata)
+
+    def _parse_keys(self, payload):
+        keys = []
+        if len(payload) < 8:
+            return keys
+        count = struct.unpack('>I', payload[4:8])[0]
+        position = 8
+        for _ in range(count):
+            if position + 8 > len(payload):
+                break
+            size = struct.unpack('>I', payload[position:position + 4])[0]
+            if size < 8:
+                break
+            keys.append(payload[position + 8:position + size].decode('utf-8', 'replace'))
+            position += size
+        return keys
+
+    def _parse_ilst(self, f, start, end, keys, metadata):
+        for box_type, payload_start, box_end in self._boxes(f, start, end):
+            if box_type in USER_DATA_KEYS:
+                key = USER_DATA_KEYS[box_type]
+            else:
+                # Items in an mdta ilst are named by their 1-based key index.
+                index = struct.unpack('>I', box_type)[0]
+                if index < 1 or index > len(keys) or keys[index - 1] not in MDTA_KEYS:
+                    continue
+                key = MDTA_KEYS[keys[index - 1]]
+
+            value = self._parse_data_box(
+                self._read_payload(f, payload_start, box_end)
+            )
+            if value:
+                metadata[key] = value
+
+    def _parse_data_box(self, payload):
+        # data box: size, 'data', type indicator (4), locale (4), value
+        if len(payload) < 16 or payload[4:8] != b'data':
+            return None
+        size = struct.unpack('>I', payload[0:4])[0]
+        return self._decode(payload[16:size])
+
+    def _parse_user_data(self, payload):
+        # QuickTime user data text: 16 bit length, 16 bit language, text.
+        # iTunes style atoms wrap the value in a data box instead.
+        if payload[4:8] == b'data':
+            return self._parse_data_box(payload)
+        if len(payload) < 4:
+            return None
+        length = struct.unpack('>H', payload[0:2])[0]
+        return self._decode(payload[4:4 + length])
+
+    def _parse_header_date(self, payload):
+        # mvhd and mdhd share the layout we need:
+        #  version (1), flags (3), creation_time (4 or 8 bytes when version 1)
+        if len(payload) < 8:
+            return None
+        if payload[0] == 1:
+            if len(payload) < 12:
+                return None
+            seconds = struct.unpack('>Q', payload[4:12])[0]
+        else:
+            seconds = struct.unpack('>I', payload[4:8])[0]
+        if seconds == 0:
+            return None
+        date = QUICKTIME_EPOCH + timedelta(seconds=seconds)
+        return date.strftime('%Y:%m:%d %H:%M:%S')
+
+    def _decode(self, value):
+        value = value.rstrip(b'\x00').decode('utf-8', 'replace').strip()
+        if not value:
+            return None
+        # Convert ISO 8601 dates (2015-01-19T12:45:11-0800) into the
+        #  exiftool format (2015:01:19 12:45:11-08:00) Video expects.
+        date = re.match(
+            r'^(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.\d+)?(Z|[-+]\d{2}:?\d{2})?$',
+            value
+        )
+        if date is not None:
+            year, month, day, hour, minute, second, offset = date.groups()
+            value = '{}:{}:{} {}:{}:{}'.format(year, month, day, hour, minute, second)
+            if offset == 'Z':
+                value += 'Z'
+            elif offset is not None:
+                offset = offset.replace(':', '')
+                value += '{}:{}'.format(offset[0:3], offset[3:5])
+        return value
+
+    def _parse_iso6709(self, value):
+        """Parse an ISO 6709 string like +38.1893-119.9558+2004.158/."""
+        match = ISO6709_REGEX.match(value)
+        if match is None:
+            return None
+        latitude = self._iso6709_component(match.group(1), 2)
+        longitude = self._iso6709_component(match.group(2), 3)
+        altitude = float(match.group(3)) if match.group(3) else None
+        return (latitude, longitude, altitude)
+
+    def _iso6709_component(self, component, degree_digits):
+        # Components may be encoded as (D)DD.D, (D)DDMM.M or (D)DDMMSS.S
+        sign = -1.0 if component[0] == '-' else 1.0
+        integer, _, fraction = component[1:].partition('.')
+        fraction = float('0.' + fraction) if fraction else 0.0
+        if len(integer) <= degree_digits:
+            return sign * (int(integer) + fraction)
+        degrees = int(integer[:degree_digits])
+        minutes = int(integer[degree_digits:degree_digits + 2])
+        if len(integer) <= degree_digits + 2:
+            return sign * (degrees + (minutes + fraction) / 60.0)
+        seconds = int(integer[degree_digits + 2:degree_digits + 4]) + fraction
+        return sign * (degrees + minutes / 60.0 + seconds / 3600.0)
+
@@ -0,0 +1,232 @@
+"""
+Read ahead of an import and keep it from flooding the page cache.
+
+While one file is detected, hashed and copied, the next files queued for
+the import are brought into the page cache. That uses
+``posix_fadvise(WILLNEED)`` where the platform has it, or reads the files on
+a background thread where it doesn't or where it's configured to.
+
+With ``[Readahead] drop_cache`` the pages of a source and of its copy are
+dropped once the copy is on disk, so importing a few terabytes doesn't
+evict everything else from the cache.
+"""
+from __future__ import absolute_import
+from builtins import object
+
+import collections
+import os
+import threading
+
+from elodie import constants
+from elodie import log
+from elodie.config import load_config
+
+#: Bytes read at a time by background readahead.
+BLOCK_SIZE = 1024 * 1024
+
+
+def get_readahead_files():
+    """Get how many queued files to read ahead from config.ini.
+
+    Configured with `files` under `[Readahead]`, 0 turns readahead off.
+
+    :returns: int
+    """
+    config = load_config()
+    if 'Readahead' not in config or 'files' not in config['Readahead']:
+        return constants.readahead_files
+    try:
+        files = int(config['Readahead']['files'])
+    except ValueError:
+        files = -1
+    if files < 0:
+        log.warn('Invalid [Readahead] files, using default')
+        return constants.readahead_files
+    return files
+
+
+def get_readahead_method():
+    """Get how files are read ahead from config.ini.
+
+    Configured with `method` under `[Readahead]`: `fadvise` asks the kernel
+    to read them, `read` reads them on a background thread. Defaults to
+    `fadvise` where the platform has posix_fadvise.
+
+    :returns: str 'fadvise' or 'read'
+    """
+    default = 'fadvise' if hasattr(os, 'posix_fadvise') else 'read'
+    config = load_config()
+    if 'Readahead' not in config or 'method' not in config['Readahead']:
+        return default
+    method = config['Readahead']['method'].strip().lower()
+    if method not in ('fadvise', 'read'):
+        log.warn('Invalid [Readahead] method, using default')
+        return default
+    if method == 'fadvise' and not hasattr(os, 'posix_fadvise'):
+        return 'read'
+    return method
+
+
+def get_drop_cache():
+    """Get if imported files are dropped from the page cache from config.ini.
+
+    Configured with `drop_cache` under `[Readahead]`, off by default.
+
+    :returns: bool
+    """
+    config = load_config()
+    if 'Readahead' not in config or 'drop_cache' not in config['Readahead']:
+        return False
+    value = config['Readahead']['drop_cache'].strip().lower()
+    if value not in ('true', 'false', 'yes', 'no', 'on', 'off', '1', '0'):
+        log.warn('Invalid [Readahead] drop_cache, using default')
+        return False
+    return value in ('true', 'yes', 'on', '1')
+
+
+def advise(fd, advice, offset=0, length=0):
+    """Give the kernel advice about how a file will be read.
+
+    Does nothing where the platform has no posix_fadvise.
+
+    :param int fd: Open file descriptor.
+    :param str advice: `SEQUENTIAL`, `WILLNEED` or `DONTNEED`.
+    :returns: bool True if the advice was given.
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    try:
+        os.posix_fadvise(fd, offset, length, getattr(os, 'POSIX_FADV_%s' % advice))
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def drop(file_path, sync=False):
+    """Drop a file's pages from the page cache.
+
+    Dirty pages aren't dropped, pass `sync` for a file which was just
+    written to flush it to disk first.
+
+    :param str file_path: Path to the file.
+    :param bool sync: Flush the file to disk first.
+    :returns: bool True if the advice was given.
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        if sync:
+            os.fsync(fd)
+        return advise(fd, 'DONTNEED')
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+
+
+class Readahead(object):
+    """Read ahead of the files of an import.
+
+    Call :meth:`started` when a file's import starts and :meth:`finished`
+    when it's copied or found to be a duplicate. Files can be started in any order, as they are
+    by parallel workers, every queued file is read ahead at most once.
+
+    :param list files: Paths in the order they're queued.
+    :param int depth: Number of files to read ahead of the one started.
+        Defaults to :func:`get_readahead_files`.
+    :param str method: `fadvise` or `read`. Defaults to
+        :func:`get_readahead_method`.
+    :param bool drop_cache: Drop sources and copies from the page cache
+        when they're done. Defaults to :func:`get_drop_cache`.
+    """
+
+    def __init__(self, files, depth=None, method=None, drop_cache=None):
+        self.files = list(files)
+        self.depth = get_readahead_files() if depth is None else depth
+        self.method = get_readahead_method() if method is None else method
+        self.drop_cache = get_drop_cache() if drop_cache is None else drop_cache
+
+        self.position = dict((path, index) for index, path in enumerate(self.files))
+        # Index of the first file which hasn't been read ahead.
+        self.next = 0
+        # Highest index started, background reads behind it are skipped.
+        self.started_index = -1
+        self.lock = threading.Lock()
+        self.queue = collections.deque()
+        self.thread = None
+
+    def started(self, file_path):
+        """Read ahead of a file whose import just started."""
+        index = self.position.get(file_path)
+        if index is None or self.depth <= 0:
+            return
+        with self.lock:
+            self.started_index = max(self.started_index, index)
+            start = max(self.next, index + 1)
+            end = min(index + 1 + self.depth, len(self.files))
+            self.next = max(self.next, end)
+        for i in range(start, end):
+            self._prefetch(i)
+
+    def finished(self, file_path, dest_path):
+        """Drop a source and its copy, if any, from the page cache if configured."""
+        if not self.drop_cache:
+            return
+        drop(file_path)
+        if dest_path and dest_path != file_path:
+            drop(dest_path, sync=True)
+
+    def wait(self):
+        """Wait for background reads to finish."""
+        thread = self.thread
+        if thread is not None:
+            thread.join()
+
+    def _prefetch(self, index):
+        if self.method == 'fadvise':
+            try:
+                fd = os.open(self.files[index], os.O_RDONLY)
+            except OSError:
+                return
+            try:
+                # The kernel reads it asynchronously, the fd can go.
+                advise(fd, 'WILLNEED')
+            finally:
+                os.close(fd)
+            return
+
+        with self.lock:
+            self.queue.append(index)
+            if self.thread is None:
+                # The thread exits when the queue is empty so nothing is
+                #  left behind when an import stops early.
+                self.thread = threading.Thread(target=self._read_queued)
+                self.thread.daemon = True
+                self.thread.start()
+
+    def _read_queued(self):
+        buffer = bytearray(BLOCK_SIZE)
+        while True:
+            with self.lock:
+                if not self.queue:
+                    self.thread = None
+                    return
+                index = self.queue.popleft()
+                # Reading a file which is already being imported only
+                #  competes with it.
+                skip = index <= self.started_index
+            if not skip:
+                self._read(self.files[index], buffer)
+
+    def _read(self, file_path, buffer):
+        try:
+            with open(file_path, 'rb') as f:
+                advise(f.fileno(), 'SEQUENTIAL')
+                while f.readinto(buffer):
+                    pass
+        except (IOError, OSError):
+            pass
@@ -0,0 +1,291 @@
+"""
+Move an existing library into the layout of the current config.
+
+Destinations are computed from the catalog with the same
+:func:`~elodie.filesystem.FileSystem.get_folder_path` and
+:func:`~elodie.filesystem.FileSystem.get_file_name` an import uses, so no
+media is opened or hashed. Files are moved with renames inside the library.
+
+Files in the hash db which the catalog doesn't have, because they were
+imported before there was a catalog or the hash db was rebuilt with
+`generate-db`, are catalogued from their headers first.
+"""
+from __future__ import print_function
+from builtins import object
+
+import errno
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from elodie import compatability
+from elodie import constants
+from elodie import log
+from elodie.localstorage import Db
+from elodie.media.base import Base, get_all_subclasses
+from elodie.media.media import Media
+# Imported so get_all_subclasses() finds every media type.
+from elodie.media.audio import Audio  # noqa
+from elodie.media.photo import Photo  # noqa
+from elodie.media.text import Text  # noqa
+from elodie.media.video import Video  # noqa
+
+
+class Relayout(object):
+    """Re-layout the catalogued files below a library directory.
+
+    Every planned move is written to a journal before anything is renamed.
+    If a run is interrupted the next one replays the journal, finishing the
+    renames which didn't happen and updating the hash db and catalog for
+    the ones which did.
+
+    A file whose destination is taken, by a file on disk or by an earlier
+    file of the same plan, is left in place and reported. Running relayout
+    again after the other file moved resolves it.
+
+    :param filesystem: A :class:`~elodie.filesystem.FileSystem` instance.
+    :param str library: Absolute path of the library.
+    :param str journal_file: Path of the journal, defaults to
+        :data:`~elodie.constants.relayout_journal`.
+    """
+
+    def __init__(self, filesystem, library, journal_file=None):
+        self.filesystem = filesystem
+        self.library = library.rstrip(os.sep)
+        self.journal_file = journal_file or constants.relayout_journal
+
+        self.moved = 0
+        self.unchanged = 0
+        self.recovered = 0
+        self.catalogued = 0
+        # (path, reason) for every file which couldn't be moved.
+        self.errors = []
+
+    def plan(self):
+        """Compute the moves the current config calls for.
+
+        :returns: list of (old path, new path, checksum)
+        """
+        self.backfill()
+
+        moves = []
+        taken = set()
+        for record in self.filesystem.catalog.under(self.library):
+            metadata = record_metadata(record)
+            if metadata['date_taken'] is None:
+                self.errors.append((record['path'], 'No date in catalog'))
+                continue
+
+            # The catalog has the place the import looked up, seeding the
+            #  lookup with it means nothing is geocoded again.
+            place = record_place(record)
+            if place is not None:
+                self.filesystem.last_place = (
+                    metadata['latitude'], metadata['longitude'], place
+                )
+
+            dest_path = os.path.join(
+                self.library,
+                self.filesystem.get_folder_path(metadata),
+                self.filesystem.get_file_name(metadata)
+            )
+            if dest_path == record['path']:
+                self.unchanged += 1
+                continue
+            if dest_path in taken or os.path.lexists(dest_path):
+                self.errors.append((record['path'], 'Destination exists: %s' % dest_path))
+                continue
+
+            taken.add(dest_path)
+            moves.append((record['path'], dest_path, record['checksum']))
+        return moves
+
+    def backfill(self):
+        """Catalog the files of the library which are only in the hash db.
+
+        Their headers are read the way an import reads them. Files which
+        aren't media are reported as errors.
+        """
+        catalog = self.filesystem.catalog
+        catalogued = set(record['path'] for record in catalog.under(self.library))
+        subclasses = get_all_subclasses(Base)
+        for checksum, path in Db().all():
+            if not path.startswith(self.library + os.sep) or path in catalogued:
+                continue
+            if not os.path.isfile(path):
+                # Stale entry, there's nothing to move.
+                continue
+            media = Media.get_class_by_file(path, subclasses)
+            metadata = media.get_metadata() if media else None
+            if metadata is None:
+                self.errors.append((path, 'Not in catalog and not a supported file'))
+                continue
+
+            place = None
+            if metadata['latitude'] is not None and metadata['longitude'] is not None:
+                place = self.filesystem.get_place_name(metadata['latitude'], metadata['longitude'])
+            catalog.add(path, checksum, metadata, place=place, size=os.path.getsize(path))
+            self.catalogued += 1
+
+    def execute(self, moves, workers=1):
+        """Journal and perform moves from :func:`plan`."""
+        if not moves:
+            return
+        self._write_journal(moves)
+        self._apply(self.library, moves, workers, False)
+
+    def recover(self, workers=1):
+        """Finish the moves of an interrupted run, if there was one.
+
+        :returns: str library of the interrupted run or None
+        """
+        if not os.path.isfile(self.journal_file):
+            return None
+
+        library, moves = self._read_journal()
+        self._apply(library, moves, workers, True)
+        return library
+
+    def _apply(self, library, moves, workers, recovering):
+        for directory in sorted(set(os.path.dirname(new) for old, new, checksum in moves)):
+            self.filesystem.create_directory(directory)
+
+        done = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            statuses = executor.map(lambda move: self._move(move, recovering), moves)
+            for move, status in zip(moves, statuses):
+                if status in ('moved', 'recovered'):
+                    done.append(move)
+                    if status == 'moved':
+                        self.moved += 1
+                    else:
+                        self.recovered += 1
+                    log.progress()
+                else:
+                    self.errors.append((move[0], status))
+                    log.progress('x')
+        log.progress('', True)
+
+        self._update_indexes(done)
+        self._remove_empty_directories(library, [os.path.dirname(move[0]) for move in done])
+        os.remove(self.journal_file)
+
+    def _move(self, move, recovering):
+        """Move a single file.
+
+        :returns: str 'moved', 'recovered' or the reason it failed.
+        """
+        old, new, checksum = move
+        if recovering and os.path.lexists(new):
+            if os.path.lexists(old):
+                return 'Destination exists: %s' % new
+            return 'recovered'
+
+        try:
+            compatability._rename(old, new)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                return e.strerror or str(e)
+            # The library spans devices, copy and verify instead.
+            if not self.filesystem.move_file(old, new, checksum):
+                return 'Could not verify copy at %s' % new
+        return 'moved'
+
+    def _update_indexes(self, moves):
+        db = Db()
+        for old, new, checksum in moves:
+            # Leave the hash db alone where it points to a duplicate.
+            if checksum is not None and db.get_hash(checksum) in (None, old):
+                db.add_hash(checksum, new)
+        db.update_hash_db()
+        self.filesystem.catalog.rename([(old, new) for old, new, checksum in moves])
+
+    def _remove_empty_directories(self, library, directories):
+        # Deepest first so parents are empty by the time we get to them.
+        for directory in sorted(set(directories), key=len, reverse=True):
+            while directory.startswith(library + os.sep):
+                if not self.filesystem.delete_directory_if_empty(directory):
+                    break
+                directory = os.path.dirname(directory)
+
+    def _write_journal(self, moves):
+        # Written to a temporary file and renamed so a journal is either
+        #  complete or absent.
+        temporary_file = '%s.tmp' % self.journal_file
+        with open(temporary_file, 'w') as f:
+            f.write(json.dumps({'library': self.library}) + '\n')
+            for move in moves:
+                f.write(json.dumps(move) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        compatability._rename(temporary_file, self.journal_file)
+
+    def _read_journal(self):
+        with open(self.journal_file, 'r') as f:
+            header = json.loads(f.readline())
+            moves = [tuple(json.loads(line)) for line in f if line.strip()]
+        return header['library'], moves
+
+    def write(self):
+        from tabulate import tabulate
+
+        if self.errors:
+            print("****** ERROR DETAILS ******")
+            print(tabulate(self.errors, headers=["File", "Reason"]))
+            print("\n")
+
+        headers = ["Metric", "Count"]
+        result = [
+                    ["Moved", self.moved],
+                    ["Unchanged", self.unchanged],
+                    ["Recovered", self.recovered],
+                    ["Catalogued", self.catalogued],
+                    ["Error", len(self.errors)],
+                 ]
+
+        print("****** RELAYOUT ******")
+        print(tabulate(result, headers=headers))
+
+
+def record_metadata(record):
+    """Rebuild the metadata an import saw from a catalog record.
+
+    :param dict record: Record from :class:`~elodie.catalog.Catalog`.
+    :returns: dict with the keys of
+        :func:`~elodie.media.base.Base.get_metadata`.
+    """
+    # File names are derived from the file as it was imported.
+    source = record['source'] or record['path']
+    date_taken = None
+    if record['date_taken']:
+        date_taken = time.strptime(record['date_taken'], '%Y-%m-%d %H:%M:%S')
+    return {
+        'date_taken': date_taken,
+        'camera_make': record['camera_make'],
+        'camera_model': record['camera_model'],
+        'latitude': record['latitude'],
+        'longitude': record['longitude'],
+        'album': record['album'],
+        'title': record['title'],
+        'mime_type': record['mime_type'],
+        'original_name': record['original_name'],
+        'base_name': os.path.splitext(os.path.basename(source))[0],
+        'extension': os.path.splitext(source)[1][1:].lower(),
+        'directory_path': os.path.dirname(source)
+    }
+
+
+def record_place(record):
+    """Rebuild the place of a catalog record.
+
+    :returns: dict like :func:`~elodie.geolocation_offline.place_name` or
+        None if the record has no place.
+    """
+    if record['place'] is None:
+        return None
+    place = {'default': record['place']}
+    for key in ('city', 'state', 'country'):
+        if record[key] is not None:
+            place[key] = record[key]
+    return place
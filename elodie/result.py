@@ -1,27 +1,39 @@
-from tabulate import tabulate
-
-
 class Result(object):
 
-    def __init__(self):
+    def __init__(self, listener=None):
+        # Optional callable invoked as listener(id, status) for every row.
+        self.listener = listener
         self.records = []
         self.success = 0
         self.error = 0
+        self.skipped = 0
+        # Files left out by import --where.
+        self.filtered = 0
+        # Bytes copied or hashed for the rows appended with a size.
+        self.bytes = 0
         self.error_items = []
 
-    def append(self, row):
+    def append(self, row, size=0):
         id, status = row
+        self.bytes += size
 
-        if status and status != 'SKIPPED':
+        if status == 'FILTERED':
+            self.filtered += 1
+        elif status and status != 'SKIPPED':
             self.success += 1
         elif status == 'SKIPPED':
             # Don't count skipped files as errors
-            pass
+            self.skipped += 1
         else:
             self.error += 1
             self.error_items.append(id)
 
+        if self.listener is not None:
+            self.listener(id, status)
+
     def write(self):
+        from tabulate import tabulate
+
         if self.error > 0:
             error_headers = ["File"]
             error_result = []
@@ -37,6 +49,8 @@ class Result(object):
                     ["Success", self.success],
                     ["Error", self.error],
                  ]
+        if self.filtered > 0:
+            result.append(["Filtered", self.filtered])
 
         print("****** SUMMARY ******")
         print(tabulate(result, headers=headers))
@@ -0,0 +1,170 @@
+"""
+Pre-import scan which reports what an import would do without copying.
+"""
+from __future__ import print_function
+from builtins import object
+
+import os
+import time
+
+from elodie.localstorage import Db
+from elodie.media.media import Media
+
+
+class Scan(object):
+    """Classify source files as new, duplicate or unsupported.
+
+    Full checksums are expensive so we try to prove a file is new first.
+    A file whose size matches nothing in the library (or earlier in the
+    scan) is new. A file whose partial checksum matches nothing of the same
+    size is new. Only the remaining candidates are fully hashed through
+    :func:`~elodie.filesystem.FileSystem.process_checksum`.
+
+    Sizes of library files come from the catalog so the library isn't
+    stat'd. If the hash db has files the catalog doesn't, as after
+    `generate-db`, their sizes are unknown and every source file is hashed.
+
+    :param filesystem: A :class:`~elodie.filesystem.FileSystem` instance.
+    """
+
+    def __init__(self, filesystem):
+        self.filesystem = filesystem
+        self.db = Db()
+
+        self.new = 0
+        self.duplicate = 0
+        self.unsupported = 0
+        self.bytes_to_copy = 0
+        self.hashed = 0
+        self.by_type = {}
+        self.by_date = {}
+
+        # size -> list of library paths, looked up in the catalog per size.
+        self.library_sizes = {}
+        # Set on first use, True if the hash db has files the catalog hasn't.
+        self.uncatalogued = None
+        # size -> list of source paths already classified as new.
+        self.source_sizes = {}
+        # path -> partial or full checksum, so nothing is read twice.
+        self.fingerprints = {}
+        self.checksums = {}
+
+    def _library_paths(self, size):
+        if size not in self.library_sizes:
+            self.library_sizes[size] = self.filesystem.catalog.with_size(size)
+        return self.library_sizes[size]
+
+    def _has_uncatalogued(self):
+        if self.uncatalogued is None:
+            catalogued = self.filesystem.catalog.paths()
+            self.uncatalogued = any(
+                path not in catalogued for checksum, path in self.db.all()
+            )
+        return self.uncatalogued
+
+    def _fingerprint(self, path):
+        if path not in self.fingerprints:
+            try:
+                self.fingerprints[path] = self.db.partial_checksum(path)
+            except (IOError, OSError):
+                self.fingerprints[path] = None
+        return self.fingerprints[path]
+
+    def _checksum(self, path):
+        if path not in self.checksums:
+            self.checksums[path] = self.db.checksum(path)
+        return self.checksums[path]
+
+    def _is_duplicate(self, _file, size):
+        library_paths = self._library_paths(size)
+        source_paths = self.source_sizes.get(size, [])
+        # A file missing from the catalog could have any size.
+        uncatalogued = self._has_uncatalogued()
+        if not library_paths and not source_paths and not uncatalogued:
+            return False
+
+        fingerprint = self._fingerprint(_file)
+        library_match = uncatalogued or any(
+            self._fingerprint(path) == fingerprint for path in library_paths
+        )
+        source_matches = [
+            path for path in source_paths
+            if self._fingerprint(path) == fingerprint
+        ]
+        if not library_match and not source_matches:
+            return False
+
+        self.hashed += 1
+        checksum = self.filesystem.process_checksum(_file, False)
+        if checksum is None:
+            return True
+
+        self.checksums[_file] = checksum
+        return any(self._checksum(path) == checksum for path in source_matches)
+
+    def scan_file(self, _file, subclasses):
+        """Classify a single file and add it to the report.
+
+        :param str _file: Path of the source file.
+        :param set subclasses: Media classes from
+            :func:`~elodie.media.base.get_all_subclasses`.
+        :returns: str 'new', 'duplicate' or 'unsupported'
+        """
+        media = Media.get_class_by_file(_file, subclasses)
+        if not media or not media.is_valid():
+            self.unsupported += 1
+            return 'unsupported'
+
+        size = os.path.getsize(_file)
+        if self._is_duplicate(_file, size):
+            status = 'duplicate'
+            self.duplicate += 1
+        else:
+            status = 'new'
+            self.new += 1
+            self.bytes_to_copy += size
+            self.source_sizes.setdefault(size, []).append(_file)
+
+        metadata = media.get_metadata()
+        date = 'Unknown'
+        if metadata and metadata['date_taken']:
+            date = time.strftime('%Y-%m', metadata['date_taken'])
+        self._add_to_breakdown(self.by_type, media.__name__, status, size)
+        self._add_to_breakdown(self.by_date, date, status, size)
+
+        return status
+
+    def _add_to_breakdown(self, breakdown, key, status, size):
+        row = breakdown.setdefault(key, {'new': 0, 'duplicate': 0, 'bytes': 0})
+        row[status] += 1
+        if status == 'new':
+            row['bytes'] += size
+
+    def write(self):
+        from tabulate import tabulate
+
+        for title, key_header, breakdown in (
+            ('BY TYPE', 'Type', self.by_type),
+            ('BY DATE', 'Date', self.by_date)
+        ):
+            if not breakdown:
+                continue
+            rows = []
+            for key in sorted(breakdown):
+                row = breakdown[key]
+                rows.append([key, row['new'], row['duplicate'], row['bytes']])
+            print("****** %s ******" % title)
+            print(tabulate(rows, headers=[key_header, "New", "Duplicate", "Bytes"]))
+            print("\n")
+
+        headers = ["Metric", "Count"]
+        result = [
+                    ["New", self.new],
+                    ["Duplicate", self.duplicate],
+                    ["Unsupported", self.unsupported],
+                    ["Bytes to copy", self.bytes_to_copy],
+                    ["Fully hashed", self.hashed],
+                 ]
+
+        print("****** SCAN ******")
+        print(tabulate(result, headers=headers))
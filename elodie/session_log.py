@@ -1,24 +1,32 @@
-"""Session logging functionality for Elodie."""
+"""Session logging functionality for Elodie.
+
+Sessions are written incrementally as JSON Lines. The first line describes
+the session, every processed file and error gets its own line and the last
+line is a summary footer. Only the summary counters and the most recent
+errors are kept in memory so long imports don't grow the process.
+"""
 
 import os
 import json
 import datetime
+import threading
+from collections import deque
 from elodie import constants
 
 
 class SessionLogger:
     """Handles session logging for Elodie operations."""
-    
+
     def __init__(self):
         self.log_dir = os.path.join(constants.application_directory, 'logs')
         self.session_id = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-        self.log_file = os.path.join(self.log_dir, f'session_{self.session_id}.json')
+        self.log_file = os.path.join(self.log_dir, f'session_{self.session_id}.jsonl')
         self.session_data = {
             'session_id': self.session_id,
             'start_time': datetime.datetime.now().isoformat(),
             'command': None,
-            'files_processed': [],
-            'errors': [],
+            # Most recent errors. Every error is written to the log file.
+            'errors': deque(maxlen=constants.session_log_recent_errors),
             'summary': {
                 'total_files': 0,
                 'successful': 0,
@@ -26,38 +34,77 @@ class SessionLogger:
                 'skipped': 0
             }
         }
+        self.error_count = 0
+        self.lock = threading.Lock()
+        self.handle = None
+        self.unflushed = 0
         self._ensure_log_directory()
-    
+
     def _ensure_log_directory(self):
         """Ensure the log directory exists."""
         if not os.path.exists(self.log_dir):
             os.makedirs(self.log_dir)
-    
+
+    def _open_log_file(self):
+        # Session ids have a one second resolution so another session may
+        #  already own the file name. Don't interleave with it.
+        base, extension = os.path.splitext(self.log_file)
+        suffix = 1
+        while True:
+            try:
+                return open(self.log_file, 'x', buffering=constants.session_log_buffer_size)
+            except FileExistsError:
+                suffix += 1
+                self.log_file = '{}_{}{}'.format(base, suffix, extension)
+
+    def _write(self, record):
+        """Append a record to the log file. Callers hold self.lock."""
+        if self.handle is None:
+            self.handle = self._open_log_file()
+            header = {
+                'type': 'session',
+                'session_id': self.session_id,
+                'start_time': self.session_data['start_time'],
+                'command': self.session_data['command'],
+                'args': self.session_data.get('args')
+            }
+            self.handle.write(json.dumps(header) + '\n')
+
+        self.handle.write(json.dumps(record) + '\n')
+        # Flush every so often so a crash loses at most a few records.
+        self.unflushed += 1
+        if self.unflushed >= constants.session_log_flush_every:
+            self.handle.flush()
+            self.unflushed = 0
+
     def set_command(self, command, args):
         """Set the command and arguments for this session."""
         self.session_data['command'] = command
         self.session_data['args'] = args
-    
+
     def log_file_processed(self, source_file, destination_file, status, error_msg=None):
         """Log a processed file."""
         entry = {
+            'type': 'file',
             'source': source_file,
             'destination': destination_file,
             'status': status,  # 'success', 'failed', 'skipped'
             'timestamp': datetime.datetime.now().isoformat(),
             'error_msg': error_msg
         }
-        self.session_data['files_processed'].append(entry)
-        
-        # Update summary
-        self.session_data['summary']['total_files'] += 1
-        if status == 'success':
-            self.session_data['summary']['successful'] += 1
-        elif status == 'failed':
-            self.session_data['summary']['failed'] += 1
-        elif status == 'skipped':
-            self.session_data['summary']['skipped'] += 1
-    
+
+        with self.lock:
+            self._write(entry)
+
+            # Update summary
+            self.session_data['summary']['total_files'] += 1
+            if status == 'success':
+                self.session_data['summary']['successful'] += 1
+            elif status == 'failed':
+                self.session_data['summary']['failed'] += 1
+            elif status == 'skipped':
+                self.session_data['summary']['skipped'] += 1
+
     def log_error(self, error_msg, context=None):
         """Log a general error."""
         error_entry = {
@@ -65,28 +112,40 @@ class SessionLogger:
             'context': context,
             'timestamp': datetime.datetime.now().isoformat()
         }
-        self.session_data['errors'].append(error_entry)
-    
+
+        with self.lock:
+            self._write(dict(error_entry, type='error'))
+            self.session_data['errors'].append(error_entry)
+            self.error_count += 1
+
     def finalize_session(self):
-        """Finalize the session and write to log file."""
+        """Finalize the session and write the summary footer to the log file."""
         self.session_data['end_time'] = datetime.datetime.now().isoformat()
-        
+
         # Calculate duration
         start_time = datetime.datetime.fromisoformat(self.session_data['start_time'])
         end_time = datetime.datetime.fromisoformat(self.session_data['end_time'])
         duration = (end_time - start_time).total_seconds()
         self.session_data['duration_seconds'] = duration
-        
-        # Write to log file
-        with open(self.log_file, 'w') as f:
-            json.dump(self.session_data, f, indent=2)
-        
+
+        footer = {
+            'type': 'summary',
+            'end_time': self.session_data['end_time'],
+            'duration_seconds': duration,
+            'summary': self.session_data['summary'],
+            'error_count': self.error_count
+        }
+        with self.lock:
+            self._write(footer)
+            self.handle.close()
+            self.handle = None
+
         return self.log_file
-    
+
     def get_summary(self):
         """Get a summary of the session."""
         return self.session_data['summary']
-    
+
     def print_summary(self):
         """Print a summary of the session."""
         summary = self.session_data['summary']
@@ -95,5 +154,31 @@ class SessionLogger:
         print(f"Successful: {summary['successful']}")
         print(f"Failed: {summary['failed']}")
         print(f"Skipped: {summary['skipped']}")
-        if self.session_data['errors']:
-            print(f"Errors encountered: {len(self.session_data['errors'])}")
\ No newline at end of file
+        if self.error_count:
+            print(f"Errors encountered: {self.error_count}")
+
+
+def load_session_log(log_file):
+    """Read a JSON Lines session log back into a single dict.
+
+    The dict has the session fields, the summary footer (if the session was
+    finalized) and the `files_processed` and `errors` lists.
+
+    :param str log_file: Path to a session log.
+    :returns: dict
+    """
+    session = {'files_processed': [], 'errors': []}
+    with open(log_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            record_type = record.pop('type', None)
+            if record_type == 'file':
+                session['files_processed'].append(record)
+            elif record_type == 'error':
+                session['errors'].append(record)
+            else:
+                session.update(record)
+    return session
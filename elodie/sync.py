@@ -0,0 +1,149 @@
+"""
+Keep a backup of a library up to date from its hash db.
+
+The backup is an elodie library of its own: its hash db in
+:data:`~elodie.constants.sync_directory` records which checksum is at which
+path, next to the high-water mark of the library's hash db. A run reads only
+the entries the library saved since the mark, copies the checksums the
+backup doesn't have and renames the ones which moved. Nothing in the library
+or the backup is stat'd or compared to find them.
+"""
+from __future__ import print_function
+from builtins import object
+
+import json
+import os
+
+from elodie import compatability
+from elodie import constants
+from elodie import log
+from elodie.hashindex import HashIndex
+from elodie.localstorage import Db
+
+
+class Sync(object):
+    """Sync the files of a library to a backup directory.
+
+    :param str library: Absolute path of the library. Hash db entries
+        outside of it are ignored.
+    :param str backup: Absolute path of the backup.
+    :param bool verify: Compare every copy to the library before it's put
+        in place.
+    """
+
+    def __init__(self, library, backup, verify=False):
+        self.library = library.rstrip(os.sep)
+        self.backup = backup.rstrip(os.sep)
+        self.verify = verify
+        self.directory = os.path.join(self.backup, constants.sync_directory)
+        self.state_file = os.path.join(self.directory, 'sync.json')
+
+        self.copied = 0
+        self.moved = 0
+        self.unchanged = 0
+        # (path, reason) for every file which couldn't be synced.
+        self.errors = []
+        # Set when a copy failed and the next run has to try again.
+        self.retry = False
+
+    def run(self):
+        """Copy and rename what changed since the last run."""
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        state = self._read_state()
+        mark = None
+        if state.get('library') == self.library:
+            mark = state.get('mark')
+
+        db = Db()
+        backup = HashIndex(os.path.join(self.directory, 'hash.json'))
+        entries, mark = db.hash_db.changes(mark)
+        try:
+            for checksum, path in entries:
+                self._sync(backup, checksum, path)
+        finally:
+            backup.write()
+        if not self.retry:
+            self._write_state({'library': self.library, 'mark': mark})
+
+    def _sync(self, backup, checksum, path):
+        if not path.startswith(self.library + os.sep):
+            return
+        target = os.path.join(self.backup, os.path.relpath(path, self.library))
+        synced = backup.get(checksum)
+        if synced == target:
+            self.unchanged += 1
+            return
+        if not os.path.isfile(path):
+            self.errors.append((path, 'Not in library'))
+            return
+
+        directory = os.path.dirname(target)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        if synced is not None and os.path.isfile(synced):
+            # Moved in the library since it was synced.
+            compatability._rename(synced, target)
+            self.moved += 1
+        else:
+            error = self._copy(path, target)
+            if error is not None:
+                self.errors.append((path, error))
+                self.retry = True
+                return
+            self.copied += 1
+        backup[checksum] = target
+        log.progress()
+
+    def _copy(self, path, target):
+        # Copy next to the target so a partial copy never takes its place.
+        tmp = '%s.elodie-sync' % target
+        try:
+            compatability._copyfile(path, tmp)
+            stat = os.stat(path)
+            os.utime(tmp, (stat.st_atime, stat.st_mtime))
+            # The hash db has the checksum of the file which was imported,
+            #  metadata may have been written to the library's copy since.
+            if self.verify and Db().checksum(tmp) != Db().checksum(path, library=True):
+                os.remove(tmp)
+                return 'Copy does not match the library'
+            compatability._rename(tmp, target)
+        except (IOError, OSError) as e:
+            if os.path.lexists(tmp):
+                os.remove(tmp)
+            return e.strerror or str(e)
+        return None
+
+    def _read_state(self):
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write_state(self, state):
+        tmp = '%s.tmp' % self.state_file
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        compatability._rename(tmp, self.state_file)
+
+    def write(self):
+        from tabulate import tabulate
+
+        if self.errors:
+            print("****** ERROR DETAILS ******")
+            print(tabulate(self.errors, headers=["File", "Reason"]))
+            print("\n")
+
+        headers = ["Metric", "Count"]
+        result = [
+                    ["Copied", self.copied],
+                    ["Moved", self.moved],
+                    ["Unchanged", self.unchanged],
+                    ["Error", len(self.errors)],
+                 ]
+
+        print("****** SYNC ******")
+        print(tabulate(result, headers=headers))
@@ -0,0 +1,95 @@
+from __future__ import absolute_import
+# Project imports
+import hashlib
+import io
+import os
+import sys
+import shutil
+import tarfile
+import zipfile
+from tempfile import mkdtemp
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+
+from . import helper
+from elodie.archive import Staging, is_archive, members
+
+os.environ['TZ'] = 'GMT'
+
+def _zip(folder):
+    path = os.path.join(folder, 'takeout.zip')
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.write(helper.get_file('valid.txt'), 'Trip/valid.txt')
+        archive.writestr('Trip/', '')
+        archive.writestr(zipfile.ZipInfo('notes.md', (2019, 3, 1, 10, 0, 0)), 'notes')
+    return path
+
+def _tar(folder):
+    path = os.path.join(folder, 'backup.tar.gz')
+    with tarfile.open(path, 'w:gz') as archive:
+        archive.add(helper.get_file('valid.txt'), 'Trip/valid.txt')
+        info = tarfile.TarInfo('notes.md')
+        info.size = 5
+        info.mtime = 1551434400
+        archive.addfile(info, io.BytesIO(b'notes'))
+    return path
+
+def test_is_archive():
+    folder = mkdtemp()
+    zip_path = _zip(folder)
+    tar_path = _tar(folder)
+    result = (is_archive(zip_path), is_archive(tar_path), is_archive(helper.get_file('valid.txt')), is_archive(os.path.join(folder, 'missing.zip')))
+    shutil.rmtree(folder)
+
+    assert result == (True, True, False, False), result
+
+def test_members_of_zip_and_tar():
+    folder = mkdtemp()
+    zip_members = [(name, mtime, f.read()) for name, mtime, f in members(_zip(folder))]
+    tar_members = [(name, mtime, f.read()) for name, mtime, f in members(_tar(folder))]
+    shutil.rmtree(folder)
+
+    with open(helper.get_file('valid.txt'), 'rb') as f:
+        valid = f.read()
+
+    # Directories are left out.
+    assert [(name, content) for name, mtime, content in zip_members] == [('Trip/valid.txt', valid), ('notes.md', b'notes')], zip_members
+    assert [(name, content) for name, mtime, content in tar_members] == [('Trip/valid.txt', valid), ('notes.md', b'notes')], tar_members
+    assert tar_members[1][1] == 1551434400, tar_members
+
+def test_staging_holds_small_members_in_memory():
+    folder = mkdtemp()
+    staging = Staging(folder, spool_size=100)
+    checksum, spool = staging.read('Trip/small.txt', io.BytesIO(b'x' * 100))
+    written = os.path.exists(staging.path('small.txt'))
+    path = staging.write('Trip/small.txt', spool, 1551434400)
+    with open(path, 'rb') as f:
+        content = f.read()
+    mtime = os.path.getmtime(path)
+    staging.close()
+    remaining = os.listdir(folder)
+    shutil.rmtree(folder)
+
+    assert checksum == hashlib.sha256(b'x' * 100).hexdigest(), checksum
+    assert written is False
+    assert os.path.basename(path) == 'small.txt', path
+    assert content == b'x' * 100
+    assert mtime == 1551434400, mtime
+    assert remaining == [], remaining
+
+def test_staging_writes_large_members_while_hashing():
+    folder = mkdtemp()
+    staging = Staging(folder, spool_size=100)
+    data = os.urandom(5000)
+    checksum, spool = staging.read('large.bin', io.BytesIO(data))
+    with open(staging.path('large.bin'), 'rb') as f:
+        content = f.read()
+    staging.discard('large.bin')
+    discarded = not os.path.exists(staging.path('large.bin'))
+    staging.close()
+    shutil.rmtree(folder)
+
+    assert checksum == hashlib.sha256(data).hexdigest(), checksum
+    assert spool is None
+    assert content == data
+    assert discarded
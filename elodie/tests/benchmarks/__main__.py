@@ -0,0 +1,147 @@
+"""
+Command line for the benchmark suite.
+
+    python -m elodie.tests.benchmarks run --preset small --output results.json
+    python -m elodie.tests.benchmarks run --baseline results.json
+    python -m elodie.tests.benchmarks run --latency 2 --bandwidth 50 import
+    python -m elodie.tests.benchmarks run --latency 2 --bandwidth 50 --page-cache import
+    python -m elodie.tests.benchmarks generate /tmp/library --preset medium
+    python -m elodie.tests.benchmarks compare baseline.json results.json
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+
+import click
+
+from elodie.tests.benchmarks.library import PRESETS, generate_library
+
+
+@click.group()
+def main():
+    pass
+
+
+@main.command('generate')
+@click.argument('destination', type=click.Path(file_okay=False))
+@click.option('--preset', type=click.Choice(sorted(PRESETS)), default='small',
+              help='Size and shape of the library.')
+@click.option('--seed', type=int, default=0, help='Seed for the generated content.')
+def _generate(destination, preset, seed):
+    """Write a synthetic library to DESTINATION."""
+    manifest = generate_library(destination, seed=seed, **PRESETS[preset])
+    print('Generated %d files (%d duplicates, %d bytes) in %s' % (
+        len(manifest['files']) + len(manifest['duplicates']),
+        len(manifest['duplicates']),
+        manifest['bytes'],
+        destination
+    ))
+
+
+@main.command('run')
+@click.option('--preset', type=click.Choice(sorted(PRESETS)), default='small',
+              help='Size and shape of the generated library.')
+@click.option('--seed', type=int, default=0, help='Seed for the generated content.')
+@click.option('--repeat', type=int, default=5, help='Timed runs per benchmark.')
+@click.option('--output', type=click.Path(dir_okay=False),
+              help='Write results as JSON to this file.')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False),
+              help='Compare results against this results file.')
+@click.option('--threshold', type=float, default=0.1,
+              help='Relative change in median time reported as slower or faster.')
+@click.option('--latency', type=float, default=None,
+              help='Milliseconds added to every stat, scandir, open and read '
+                   'of library files, to mimic a network share.')
+@click.option('--bandwidth', type=float, default=None,
+              help='Cap reads of library files to this many MB/s.')
+@click.option('--page-cache', default=False, is_flag=True,
+              help='Serve library files which were read to the end from '
+                   'memory, like a page cache. Needs --latency or --bandwidth.')
+@click.argument('names', nargs=-1)
+def _run(preset, seed, repeat, output, baseline, threshold, latency, bandwidth, page_cache, names):
+    """Run benchmarks, optionally only those starting with NAMES.
+
+    Exits with 1 if a baseline was given and a benchmark got slower.
+    """
+    # Benchmarks reset the hash and location dbs so they must never see the
+    #  user's ~/.elodie. constants reads this when it's first imported.
+    application_directory = tempfile.mkdtemp(prefix='elodie-bench-app-')
+    os.environ['ELODIE_APPLICATION_DIRECTORY'] = application_directory
+    from elodie import constants
+    if constants.application_directory != application_directory:
+        sys.exit('elodie.constants was imported before the benchmark environment was set up')
+
+    from elodie.tests.benchmarks import runner
+    from elodie.tests.benchmarks import suite  # noqa registers the benchmarks
+
+    benchmarks = runner.select(names)
+    if not benchmarks:
+        sys.exit('No benchmarks match %s' % ', '.join(names))
+
+    root = tempfile.mkdtemp(prefix='elodie-bench-library-')
+    context = {}
+    try:
+        manifest = generate_library(root, seed=seed, **PRESETS[preset])
+        context.update({
+            'root': root,
+            'manifest': manifest,
+            'library_info': {
+                'preset': preset,
+                'seed': seed,
+                'files': len(manifest['files']),
+                'duplicates': len(manifest['duplicates']),
+                'bytes': manifest['bytes']
+            }
+        })
+        if latency is not None or bandwidth is not None:
+            from elodie.tests.benchmarks.slowfs import SlowFilesystem
+            context['slowfs'] = SlowFilesystem(
+                root,
+                latency=(latency or 0) / 1000.0,
+                bandwidth=bandwidth * 1000 * 1000 if bandwidth else None,
+                page_cache=page_cache
+            )
+
+        def report(name, result):
+            print('%-30s median %.4fs' % (name, result['median']))
+
+        results = runner.run(benchmarks, context, repeat, report)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+        if context.get('destination'):
+            shutil.rmtree(context['destination'], ignore_errors=True)
+        shutil.rmtree(application_directory, ignore_errors=True)
+
+    print('')
+    runner.write_results(results)
+    if output:
+        runner.save(results, output)
+        print('Results saved to: %s' % output)
+
+    if baseline:
+        rows = runner.compare(results, runner.load(baseline), threshold)
+        runner.write_comparison(rows)
+        if any(row[4] == 'slower' for row in rows):
+            sys.exit(1)
+
+
+@main.command('compare')
+@click.argument('baseline', type=click.Path(exists=True, dir_okay=False))
+@click.argument('results', type=click.Path(exists=True, dir_okay=False))
+@click.option('--threshold', type=float, default=0.1,
+              help='Relative change in median time reported as slower or faster.')
+def _compare(baseline, results, threshold):
+    """Compare two results files. Exits with 1 if anything got slower."""
+    from elodie.tests.benchmarks import runner
+
+    rows = runner.compare(runner.load(results), runner.load(baseline), threshold)
+    runner.write_comparison(rows)
+    if any(row[4] == 'slower' for row in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""
+Generate synthetic media libraries for benchmarks.
+
+Libraries are built from a seed so the same arguments always produce the
+same bytes. Files carry the metadata elodie reads:
+
+* JPEGs with EXIF DateTimeOriginal, camera make/model and GPS.
+* TIFF based RAW files (NEF, CR2, ARW, DNG) of realistic size.
+* MP4s with a ``moov/mvhd`` creation time and a ``udta`` location atom.
+* ``.txt`` media with a JSON metadata line.
+
+A share of the files is copied a second time under another name so imports
+see duplicates, and files are spread over folders ``depth`` levels deep.
+"""
+from __future__ import print_function
+
+import json
+import os
+import random
+import shutil
+import struct
+import time
+from datetime import datetime, timedelta
+
+#: Library shapes used by the benchmark suite.
+PRESETS = {
+    'tiny': {
+        'photos': 12, 'raws': 2, 'videos': 2, 'texts': 4,
+        'duplicates': 0.2, 'depth': 2, 'fanout': 2,
+        'photo_size': 16 * 1024, 'raw_size': 256 * 1024, 'video_size': 256 * 1024
+    },
+    'small': {
+        'photos': 200, 'raws': 20, 'videos': 10, 'texts': 50,
+        'duplicates': 0.1, 'depth': 3, 'fanout': 3,
+        'photo_size': 256 * 1024, 'raw_size': 4 * 1024 * 1024, 'video_size': 4 * 1024 * 1024
+    },
+    'medium': {
+        'photos': 2000, 'raws': 200, 'videos': 50, 'texts': 200,
+        'duplicates': 0.1, 'depth': 4, 'fanout': 4,
+        'photo_size': 2 * 1024 * 1024, 'raw_size': 24 * 1024 * 1024, 'video_size': 32 * 1024 * 1024
+    },
+}
+
+#: Places photos are taken around, so lookups cluster like a real library.
+PLACES = (
+    (37.7749, -122.4194),   # San Francisco
+    (40.7128, -74.0060),    # New York
+    (51.5074, -0.1278),     # London
+    (48.8566, 2.3522),      # Paris
+    (35.6762, 139.6503),    # Tokyo
+    (-33.8688, 151.2093),   # Sydney
+    (19.4326, -99.1332),    # Mexico City
+    (-22.9068, -43.1729),   # Rio de Janeiro
+)
+
+RAW_EXTENSIONS = ('nef', 'cr2', 'arw', 'dng')
+
+CAMERAS = (
+    ('Canon', 'Canon EOS 5D Mark IV'),
+    ('NIKON CORPORATION', 'NIKON D850'),
+    ('SONY', 'ILCE-7M3'),
+    ('Apple', 'iPhone 12 Pro'),
+)
+
+# A 16x16 baseline JPEG without any APP segments. Generated photos are this
+#  image with an EXIF segment in front and a comment segment as filler.
+_JPEG_BODY = None
+
+_QUICKTIME_EPOCH = datetime(1904, 1, 1)
+
+# TIFF field types.
+_ASCII = 2
+_LONG = 4
+_RATIONAL = 5
+
+
+def _jpeg_body():
+    global _JPEG_BODY
+    if _JPEG_BODY is None:
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'files', 'no-exif.jpg')
+        with open(path, 'rb') as f:
+            data = f.read()
+        # Drop SOI and the JFIF APP0 segment.
+        position = 2
+        while data[position:position + 2] in (b'\xff\xe0', b'\xff\xe1'):
+            length = struct.unpack('>H', data[position + 2:position + 4])[0]
+            position += 2 + length
+        _JPEG_BODY = data[position:]
+    return _JPEG_BODY
+
+
+def _ifd(entries, offset, next_ifd=0):
+    """Serialize an IFD which starts at `offset` in the TIFF.
+
+    :param list entries: (tag, type, count, value bytes) tuples.
+    :returns: bytes of the IFD followed by its out of line values.
+    """
+    entries = sorted(entries)
+    data_offset = offset + 2 + 12 * len(entries) + 4
+    header = struct.pack('<H', len(entries))
+    data = b''
+    for tag, field_type, count, value in entries:
+        if len(value) <= 4:
+            header += struct.pack('<HHI', tag, field_type, count) + value.ljust(4, b'\x00')
+        else:
+            header += struct.pack('<HHII', tag, field_type, count, data_offset + len(data))
+            data += value
+            if len(data) % 2:
+                data += b'\x00'
+    return header + struct.pack('<I', next_ifd) + data
+
+
+def _ascii(tag, text):
+    value = text.encode('ascii') + b'\x00'
+    return (tag, _ASCII, len(value), value)
+
+
+def _long(tag, value):
+    return (tag, _LONG, 1, struct.pack('<I', value))
+
+
+def _dms(tag, decimal):
+    decimal = abs(decimal)
+    degrees = int(decimal)
+    minutes = int((decimal - degrees) * 60)
+    seconds = int(round(((decimal - degrees) * 60 - minutes) * 60 * 1000))
+    value = struct.pack('<IIIIII', degrees, 1, minutes, 1, seconds, 1000)
+    return (tag, _RATIONAL, 3, value)
+
+
+def tiff_exif(date_taken, latitude, longitude, make, model):
+    """Build a little endian TIFF with IFD0, an EXIF IFD and a GPS IFD.
+
+    :param datetime date_taken:
+    :returns: bytes
+    """
+    exif_entries = [_ascii(0x9003, date_taken.strftime('%Y:%m:%d %H:%M:%S'))]
+    gps_entries = [
+        _ascii(0x0001, 'N' if latitude >= 0 else 'S'),
+        _dms(0x0002, latitude),
+        _ascii(0x0003, 'E' if longitude >= 0 else 'W'),
+        _dms(0x0004, longitude),
+    ]
+    ifd0_entries = [
+        _ascii(0x010F, make),
+        _ascii(0x0110, model),
+        _long(0x8769, 0),
+        _long(0x8825, 0),
+    ]
+
+    # Sub IFD pointers are inline LONGs so IFD sizes don't depend on them.
+    ifd0_size = len(_ifd(ifd0_entries, 8))
+    exif_offset = 8 + ifd0_size
+    exif = _ifd(exif_entries, exif_offset)
+    gps_offset = exif_offset + len(exif)
+    gps = _ifd(gps_entries, gps_offset)
+
+    ifd0_entries[2] = _long(0x8769, exif_offset)
+    ifd0_entries[3] = _long(0x8825, gps_offset)
+    return b'II*\x00' + struct.pack('<I', 8) + _ifd(ifd0_entries, 8) + exif + gps
+
+
+def jpeg_bytes(date_taken, latitude, longitude, make, model, filler):
+    """Build a JPEG with an EXIF APP1 segment.
+
+    :param bytes filler: Padding stored in COM segments to reach a realistic
+        size. It also makes every photo's checksum unique.
+    """
+    exif = b'Exif\x00\x00' + tiff_exif(date_taken, latitude, longitude, make, model)
+    data = b'\xff\xd8' + b'\xff\xe1' + struct.pack('>H', len(exif) + 2) + exif
+    for start in range(0, len(filler), 65533):
+        chunk = filler[start:start + 65533]
+        data += b'\xff\xfe' + struct.pack('>H', len(chunk) + 2) + chunk
+    return data + _jpeg_body()
+
+
+def raw_bytes(date_taken, latitude, longitude, make, model, filler):
+    """Build a TIFF based RAW file with `filler` as the image data."""
+    return tiff_exif(date_taken, latitude, longitude, make, model) + filler
+
+
+def _box(box_type, payload):
+    return struct.pack('>I', len(payload) + 8) + box_type + payload
+
+
+def mp4_bytes(date_taken, latitude, longitude, filler):
+    """Build an MP4 with the moov box before mdat, like camera output."""
+    seconds = int((date_taken - _QUICKTIME_EPOCH).total_seconds())
+    mvhd = struct.pack('>I', 0) + struct.pack('>IIII', seconds, seconds, 1000, 10000)
+    mvhd += b'\x00\x01\x00\x00' + b'\x01\x00' + b'\x00' * 10
+    mvhd += struct.pack('>9I', 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+    mvhd += b'\x00' * 24 + struct.pack('>I', 2)
+    location = ('%+08.4f%+09.4f/' % (latitude, longitude)).encode('ascii')
+    udta = _box(b'\xa9xyz', struct.pack('>HH', len(location), 0x15c7) + location)
+
+    ftyp = _box(b'ftyp', b'isom' + struct.pack('>I', 512) + b'isomiso2mp41')
+    moov = _box(b'moov', _box(b'mvhd', mvhd) + _box(b'udta', udta))
+    return ftyp + moov + _box(b'mdat', filler)
+
+
+def text_bytes(date_taken, latitude, longitude, title, filler):
+    header = {
+        'date_taken': time.mktime(date_taken.timetuple()),
+        'latitude': '%.6f' % latitude,
+        'longitude': '%.6f' % longitude,
+        'title': title
+    }
+    return (json.dumps(header) + '\n\n' + filler).encode('utf-8')
+
+
+def _folders(root, depth, fanout):
+    """Leaf folders of a tree `depth` levels deep with `fanout` children."""
+    folders = [root]
+    for level in range(depth):
+        folders = [
+            os.path.join(folder, 'level%d-%d' % (level, child))
+            for folder in folders for child in range(fanout)
+        ]
+    return folders
+
+
+def generate_library(root, photos=100, raws=10, videos=5, texts=20,
+                     duplicates=0.1, depth=3, fanout=3,
+                     photo_size=256 * 1024, raw_size=4 * 1024 * 1024,
+                     video_size=4 * 1024 * 1024, seed=0):
+    """Write a synthetic library to `root`.
+
+    :param float duplicates: Share of files to copy a second time.
+    :param int seed: Seed for names, dates, places and file contents.
+    :returns: dict with `files` (unique paths), `duplicates` (copies),
+        `coordinates` ((latitude, longitude) per geotagged file) and `bytes`.
+    """
+    rng = random.Random(seed)
+    folders = _folders(root, depth, fanout)
+    start = datetime(2005, 1, 1)
+    span = int((datetime(2023, 12, 31) - start).total_seconds())
+    manifest = {'files': [], 'duplicates': [], 'coordinates': [], 'bytes': 0}
+
+    kinds = (
+        ['photo'] * photos + ['raw'] * raws +
+        ['video'] * videos + ['text'] * texts
+    )
+    rng.shuffle(kinds)
+
+    for index, kind in enumerate(kinds):
+        date_taken = start + timedelta(seconds=rng.randrange(span))
+        place = rng.choice(PLACES)
+        latitude = place[0] + rng.uniform(-0.05, 0.05)
+        longitude = place[1] + rng.uniform(-0.05, 0.05)
+        make, model = rng.choice(CAMERAS)
+        folder = rng.choice(folders)
+        name = '%s_%05d' % (kind.upper(), index)
+
+        if kind == 'photo':
+            path = os.path.join(folder, name + '.jpg')
+            data = jpeg_bytes(date_taken, latitude, longitude, make, model,
+                              rng.randbytes(photo_size))
+        elif kind == 'raw':
+            path = os.path.join(folder, '%s.%s' % (name, rng.choice(RAW_EXTENSIONS)))
+            data = raw_bytes(date_taken, latitude, longitude, make, model,
+                             rng.randbytes(raw_size))
+        elif kind == 'video':
+            path = os.path.join(folder, name + '.mp4')
+            data = mp4_bytes(date_taken, latitude, longitude, rng.randbytes(video_size))
+        else:
+            path = os.path.join(folder, name + '.txt')
+            data = text_bytes(date_taken, latitude, longitude, name,
+                              'Notes %s\n' % rng.randrange(1 << 62))
+
+        _write(path, data)
+        manifest['files'].append(path)
+        manifest['coordinates'].append((latitude, longitude))
+        manifest['bytes'] += len(data)
+
+    copies = int(round(len(manifest['files']) * duplicates))
+    for index, original in enumerate(rng.sample(manifest['files'], copies)):
+        name, extension = os.path.splitext(os.path.basename(original))
+        path = os.path.join(rng.choice(folders), '%s-copy%d%s' % (name, index, extension))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        shutil.copyfile(original, path)
+        manifest['duplicates'].append(path)
+        manifest['bytes'] += os.path.getsize(path)
+
+    return manifest
+
+
+def _write(path, data):
+    folder = os.path.dirname(path)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    with open(path, 'wb') as f:
+        f.write(data)
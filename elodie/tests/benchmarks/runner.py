@@ -0,0 +1,232 @@
+"""
+Time registered benchmarks and compare results against a baseline.
+
+Benchmarks are functions registered with :func:`benchmark`. Each repeat
+calls the optional setup outside the timed region and then times the
+benchmark once. Results are stored as JSON so a run can be saved as a
+baseline and later runs compared against it.
+"""
+from __future__ import print_function
+from builtins import object
+
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+#: Version of the results file format.
+RESULTS_VERSION = 1
+
+#: Registered :class:`Benchmark` instances in definition order.
+BENCHMARKS = []
+
+
+class Benchmark(object):
+    """A timed function.
+
+    :param str name: Name results are stored under.
+    :param function: Called as `function(context, state)` and timed.
+    :param setup: Optional `setup(context)` called before every repeat. Its
+        return value is passed to the benchmark as `state`.
+    :param items: Optional `items(context)` returning how many items one
+        call processes, used to report a rate.
+    """
+
+    def __init__(self, name, function, setup=None, items=None):
+        self.name = name
+        self.function = function
+        self.setup = setup
+        self.items = items
+
+    def run(self, context, repeat):
+        """Run the benchmark `repeat` times.
+
+        :returns: dict with the samples in seconds and their statistics.
+        """
+        # A SlowFilesystem in the context only applies to the timed calls.
+        filesystem = context.get('slowfs')
+        samples = []
+        for i in range(repeat):
+            state = self.setup(context) if self.setup else None
+            if filesystem is not None:
+                filesystem.reset()
+                filesystem.install()
+            start = time.perf_counter()
+            try:
+                self.function(context, state)
+            finally:
+                samples.append(time.perf_counter() - start)
+                if filesystem is not None:
+                    filesystem.uninstall()
+
+        median = statistics.median(samples)
+        result = {
+            'samples': samples,
+            'min': min(samples),
+            'median': median,
+            'mean': statistics.mean(samples),
+            'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0
+        }
+        if self.items:
+            result['items'] = self.items(context)
+            result['items_per_second'] = result['items'] / median if median else 0.0
+        if filesystem is not None:
+            # Calls of the last run. They don't vary between runs.
+            result['calls'] = dict(filesystem.counts)
+            result['bytes_read'] = filesystem.bytes_read
+        return result
+
+
+def benchmark(name, setup=None, items=None):
+    """Decorator which registers a function as a :class:`Benchmark`."""
+    def decorator(function):
+        BENCHMARKS.append(Benchmark(name, function, setup, items))
+        return function
+    return decorator
+
+
+def select(names=None):
+    """Get registered benchmarks whose name starts with one of `names`."""
+    if not names:
+        return list(BENCHMARKS)
+    return [
+        bench for bench in BENCHMARKS
+        if any(bench.name == name or bench.name.startswith(name + '.') for name in names)
+    ]
+
+
+def run(benchmarks, context, repeat=5, report=None):
+    """Run benchmarks and collect their results.
+
+    :param callable report: Called with (name, result) after each benchmark.
+    :returns: dict in the results file format.
+    """
+    results = {
+        'version': RESULTS_VERSION,
+        'created': datetime.datetime.now().isoformat(),
+        'machine': machine_info(),
+        'commit': _commit(),
+        'library': context.get('library_info', {}),
+        'slowfs': _slowfs_info(context.get('slowfs')),
+        'repeat': repeat,
+        'benchmarks': {}
+    }
+    for bench in benchmarks:
+        result = bench.run(context, repeat)
+        results['benchmarks'][bench.name] = result
+        if report:
+            report(bench.name, result)
+    return results
+
+
+def compare(results, baseline, threshold=0.1):
+    """Compare median times of two result sets.
+
+    :param float threshold: Relative change below which timings are
+        considered unchanged.
+    :returns: list of (name, baseline median, current median, ratio, status)
+        where status is `faster`, `slower`, `same`, `new` or `missing`.
+    """
+    rows = []
+    current = results['benchmarks']
+    previous = baseline['benchmarks']
+    for name in sorted(set(current) | set(previous)):
+        if name not in previous:
+            rows.append((name, None, current[name]['median'], None, 'new'))
+            continue
+        if name not in current:
+            rows.append((name, previous[name]['median'], None, None, 'missing'))
+            continue
+
+        before = previous[name]['median']
+        after = current[name]['median']
+        ratio = after / before if before else None
+        status = 'same'
+        if ratio is not None and ratio > 1 + threshold:
+            status = 'slower'
+        elif ratio is not None and ratio < 1 - threshold:
+            status = 'faster'
+        rows.append((name, before, after, ratio, status))
+    return rows
+
+
+def write_comparison(rows):
+    from tabulate import tabulate
+
+    print("****** BENCHMARK COMPARISON ******")
+    print(tabulate(
+        [
+            [name, before, after, '' if ratio is None else '%.2fx' % ratio, status]
+            for name, before, after, ratio, status in rows
+        ],
+        headers=["Benchmark", "Baseline (s)", "Current (s)", "Ratio", "Status"],
+        floatfmt=".4f"
+    ))
+    print("\n")
+
+
+def write_results(results):
+    from tabulate import tabulate
+
+    from elodie.tests.benchmarks.slowfs import CALLS
+
+    with_calls = results.get('slowfs') is not None
+    rows = []
+    for name, result in results['benchmarks'].items():
+        row = [
+            name, result['min'], result['median'], result['stdev'],
+            result.get('items_per_second', '')
+        ]
+        if with_calls:
+            row += [result['calls'][call] for call in CALLS]
+        rows.append(row)
+
+    headers = ["Benchmark", "Min", "Median", "Stdev", "Items/s"]
+    if with_calls:
+        headers += [call.capitalize() for call in CALLS]
+
+    print("****** BENCHMARKS (s) ******")
+    print(tabulate(rows, headers=headers, floatfmt=".4f"))
+    print("\n")
+
+
+def save(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def machine_info():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def _slowfs_info(filesystem):
+    if filesystem is None:
+        return None
+    return {'latency': filesystem.latency, 'bandwidth': filesystem.bandwidth}
+
+
+def _commit():
+    # Results are most useful when we know which tree produced them.
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.realpath(__file__)),
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,284 @@
+"""
+Make a local directory behave like a network share.
+
+:class:`SlowFilesystem` patches ``os.stat``, ``os.lstat``, ``os.scandir`` and
+``open`` so that calls for paths under a prefix sleep for a fixed latency,
+and reads from files opened there are capped to a bandwidth. Every call is
+counted, which makes stat and open counts comparable between runs even when
+timings are noisy.
+
+It's a plain Python shim, no FUSE or root is needed, so it only sees calls
+made through Python. Copies are forced through ``read()`` while it's
+installed because ``shutil`` would otherwise use ``sendfile``.
+
+With `page_cache` a file which was read to the end is served from memory
+until the counters are reset, like the client's page cache would. Only
+reads through Python fill it, ``posix_fadvise`` isn't seen.
+"""
+from __future__ import print_function
+from builtins import object
+
+import builtins
+import io
+import os
+import shutil
+import threading
+import time
+
+#: Calls which are counted.
+CALLS = ('stat', 'scandir', 'open', 'read')
+
+
+class SlowFilesystem(object):
+    """Inject latency and cap bandwidth for paths under `prefix`.
+
+    Use it as a context manager::
+
+        with SlowFilesystem('/mnt/library', latency=0.002, bandwidth=50e6) as fs:
+            ...
+        print(fs.counts)
+
+    :param str prefix: Directory whose contents are slowed down.
+    :param float latency: Seconds added to every stat, scandir, open and read.
+    :param float bandwidth: Bytes per second reads are limited to, or None.
+    :param bool page_cache: Read files a second time for free.
+    """
+
+    # Only one shim can own the patched functions at a time.
+    _installed = None
+    _install_lock = threading.Lock()
+
+    def __init__(self, prefix, latency=0.0, bandwidth=None, page_cache=False):
+        self.prefix = os.path.abspath(prefix)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.page_cache = page_cache
+        self.lock = threading.Lock()
+        self.originals = None
+        self.reset()
+
+    def reset(self):
+        """Zero the call and byte counters and empty the page cache."""
+        with self.lock:
+            self.counts = dict((call, 0) for call in CALLS)
+            self.bytes_read = 0
+            self.cached = set()
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *args):
+        self.uninstall()
+        return False
+
+    def install(self):
+        with SlowFilesystem._install_lock:
+            if SlowFilesystem._installed is not None:
+                raise RuntimeError('A SlowFilesystem is already installed')
+            SlowFilesystem._installed = self
+
+        self.originals = {
+            'stat': os.stat,
+            'lstat': os.lstat,
+            'scandir': os.scandir,
+            'open': builtins.open,
+            'io_open': io.open,
+            'sendfile': getattr(shutil, '_USE_CP_SENDFILE', None)
+        }
+        os.stat = self._wrap_stat(self.originals['stat'])
+        os.lstat = self._wrap_stat(self.originals['lstat'])
+        os.scandir = self._scandir
+        builtins.open = io.open = self._open
+        if self.originals['sendfile'] is not None:
+            shutil._USE_CP_SENDFILE = False
+
+    def uninstall(self):
+        if self.originals is None:
+            return
+        os.stat = self.originals['stat']
+        os.lstat = self.originals['lstat']
+        os.scandir = self.originals['scandir']
+        builtins.open = self.originals['open']
+        io.open = self.originals['io_open']
+        if self.originals['sendfile'] is not None:
+            shutil._USE_CP_SENDFILE = self.originals['sendfile']
+        self.originals = None
+
+        with SlowFilesystem._install_lock:
+            SlowFilesystem._installed = None
+
+    def matches(self, path):
+        """Check if `path` is under the slowed down prefix."""
+        if isinstance(path, int):
+            return False
+        try:
+            path = os.fspath(path)
+        except TypeError:
+            return False
+        if isinstance(path, bytes):
+            path = os.fsdecode(path)
+        path = os.path.abspath(path)
+        return path == self.prefix or path.startswith(self.prefix + os.sep)
+
+    def delay(self, call, size=0):
+        """Count a call and sleep for its latency plus transfer time."""
+        with self.lock:
+            self.counts[call] += 1
+            self.bytes_read += size
+        seconds = self.latency
+        if self.bandwidth and size:
+            seconds += float(size) / self.bandwidth
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def delay_read(self, path, size, end=False):
+        """Count a read of `path` and sleep unless it's in the page cache.
+
+        :param bool end: The read went to the end of the file.
+        """
+        if self.page_cache:
+            with self.lock:
+                cached = path in self.cached
+                if end or not size:
+                    # Read to the end, the whole file is in the cache now.
+                    self.cached.add(path)
+                if cached:
+                    self.counts['read'] += 1
+                    return
+        self.delay('read', size)
+
+    def _wrap_stat(self, stat):
+        def slow_stat(path, *args, **kwargs):
+            if self.matches(path):
+                self.delay('stat')
+            return stat(path, *args, **kwargs)
+        return slow_stat
+
+    def _scandir(self, path='.'):
+        iterator = self.originals['scandir'](path)
+        if not self.matches(path):
+            return iterator
+        self.delay('scandir')
+        return _SlowScandir(iterator, self)
+
+    def _open(self, file, *args, **kwargs):
+        handle = self.originals['open'](file, *args, **kwargs)
+        if not self.matches(file):
+            return handle
+        self.delay('open')
+        return _SlowFile(handle, self, os.path.abspath(os.fspath(file)))
+
+
+class _SlowScandir(object):
+    """Iterator returned by os.scandir() for slowed down directories."""
+
+    def __init__(self, iterator, filesystem):
+        self.iterator = iterator
+        self.filesystem = filesystem
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return _SlowDirEntry(next(self.iterator), self.filesystem)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def close(self):
+        self.iterator.close()
+
+
+class _SlowDirEntry(object):
+    """DirEntry whose stat() costs a round trip, like it does on NFS/SMB.
+
+    is_dir() and is_file() are answered from the directory listing and stay
+    free, same as with d_type on a real share.
+    """
+
+    def __init__(self, entry, filesystem):
+        self.entry = entry
+        self.filesystem = filesystem
+        self.name = entry.name
+        self.path = entry.path
+
+    def stat(self, follow_symlinks=True):
+        self.filesystem.delay('stat')
+        return self.entry.stat(follow_symlinks=follow_symlinks)
+
+    def is_dir(self, follow_symlinks=True):
+        return self.entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, follow_symlinks=True):
+        return self.entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        return self.entry.is_symlink()
+
+    def inode(self):
+        return self.entry.inode()
+
+    def __fspath__(self):
+        return self.entry.path
+
+    def __repr__(self):
+        return '<_SlowDirEntry %r>' % self.name
+
+
+class _SlowFile(object):
+    """File object whose reads pay latency and bandwidth."""
+
+    def __init__(self, handle, filesystem, path):
+        self.handle = handle
+        self.filesystem = filesystem
+        self.path = path
+
+    def read(self, *args):
+        data = self.handle.read(*args)
+        end = not args or args[0] is None or args[0] < 0
+        self.filesystem.delay_read(self.path, len(data), end)
+        return data
+
+    def read1(self, *args):
+        data = self.handle.read1(*args)
+        self.filesystem.delay_read(self.path, len(data))
+        return data
+
+    def readinto(self, buffer):
+        size = self.handle.readinto(buffer)
+        self.filesystem.delay_read(self.path, size or 0)
+        return size
+
+    def readline(self, *args):
+        line = self.handle.readline(*args)
+        self.filesystem.delay_read(self.path, len(line))
+        return line
+
+    def readlines(self, *args):
+        lines = self.handle.readlines(*args)
+        self.filesystem.delay_read(self.path, sum(len(line) for line in lines), not args)
+        return lines
+
+    def __iter__(self):
+        return iter(self.readline, self.handle.read(0))
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.handle.close()
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self.handle, name)
@@ -0,0 +1,207 @@
+"""
+Benchmarks for elodie's commands and hot paths.
+
+Every benchmark gets a context dict with the generated library's `root` and
+`manifest`. Command benchmarks run in process through click's test runner
+against the application directory in :data:`elodie.constants`.
+"""
+from __future__ import print_function
+
+import importlib.util
+import os
+import shutil
+import tempfile
+
+from click.testing import CliRunner
+
+from elodie import config
+from elodie import constants
+from elodie import geolocation_offline as geolocation
+from elodie.filesystem import FileSystem
+from elodie.localstorage import Db
+from elodie.media.base import Base, get_all_subclasses
+from elodie.media.media import Media
+# Imported so get_all_subclasses() finds every media type.
+from elodie.media.audio import Audio  # noqa
+from elodie.media.photo import Photo  # noqa
+from elodie.media.text import Text  # noqa
+from elodie.media.video import Video  # noqa
+from elodie.tests.benchmarks.runner import benchmark
+
+_cli = None
+
+
+def cli():
+    """Load elodie.py, which isn't importable as a module."""
+    global _cli
+    if _cli is None:
+        path = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))),
+            'elodie.py'
+        )
+        spec = importlib.util.spec_from_file_location('elodie_cli', path)
+        _cli = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(_cli)
+    return _cli
+
+
+def invoke(command, args):
+    result = CliRunner().invoke(command, args)
+    if result.exit_code != 0:
+        raise RuntimeError('%s failed: %s' % (command.name, result.output))
+    return result
+
+
+def reset_dbs(context):
+    """Remove the hash and location dbs."""
+    for path in (constants.hash_db, constants.location_db):
+        if os.path.isfile(path):
+            os.remove(path)
+    context['hashed'] = False
+    context['locations'] = False
+
+
+def all_files(context):
+    return len(context['manifest']['files']) + len(context['manifest']['duplicates'])
+
+
+def unique_files(context):
+    return len(context['manifest']['files'])
+
+
+def _hashed_library(context):
+    # verify needs a hash db of the library, generate it once.
+    if not context.get('hashed'):
+        reset_dbs(context)
+        invoke(cli()._generate_db, ['--source', context['root']])
+        context['hashed'] = True
+
+
+def _configure(text):
+    """Replace config.ini in the application directory."""
+    with open(config.config_file, 'w') as f:
+        f.write(text)
+    if hasattr(config.load_config, 'config'):
+        del config.load_config.config
+
+
+def _fresh_import(context, readahead=''):
+    _configure(readahead)
+    reset_dbs(context)
+    if context.get('destination'):
+        shutil.rmtree(context['destination'], ignore_errors=True)
+    context['destination'] = tempfile.mkdtemp(prefix='elodie-bench-')
+    return context['destination']
+
+
+def _metadata(context):
+    # Read every file's metadata once, the path benchmarks only format it.
+    if 'metadata' not in context:
+        subclasses = get_all_subclasses(Base)
+        metadata = []
+        for path in context['manifest']['files']:
+            media = Media.get_class_by_file(path, subclasses)
+            if media:
+                metadata.append(media.get_metadata())
+        context['metadata'] = metadata
+    return context['metadata']
+
+
+def _checksums(context):
+    if 'checksums' not in context:
+        db = Db()
+        context['checksums'] = [db.checksum(path) for path in context['manifest']['files']]
+    return context['checksums']
+
+
+def _warm_location_db(context):
+    if not context.get('locations'):
+        reset_dbs(context)
+        for latitude, longitude in context['manifest']['coordinates']:
+            geolocation.place_name(latitude, longitude)
+        context['locations'] = True
+
+
+@benchmark('import', setup=_fresh_import, items=all_files)
+def bench_import(context, destination):
+    invoke(cli()._import, ['--destination', destination, context['root']])
+
+
+# Readahead is on by default. With the latency shim only the read method is
+#  seen, run these with --page-cache to compare it to no readahead.
+@benchmark('import.no-readahead',
+           setup=lambda context: _fresh_import(context, '[Readahead]\nfiles=0\n'),
+           items=all_files)
+def bench_import_no_readahead(context, destination):
+    invoke(cli()._import, ['--destination', destination, context['root']])
+
+
+@benchmark('import.readahead-read',
+           setup=lambda context: _fresh_import(context, '[Readahead]\nmethod=read\n'),
+           items=all_files)
+def bench_import_readahead_read(context, destination):
+    invoke(cli()._import, ['--destination', destination, context['root']])
+
+
+@benchmark('generate-db', setup=reset_dbs, items=all_files)
+def bench_generate_db(context, state):
+    invoke(cli()._generate_db, ['--source', context['root']])
+    context['hashed'] = True
+
+
+@benchmark('verify', setup=_hashed_library, items=unique_files)
+def bench_verify(context, state):
+    invoke(cli()._verify, [])
+
+
+@benchmark('filesystem.get_file_name', setup=_metadata, items=unique_files)
+def bench_get_file_name(context, metadata):
+    filesystem = FileSystem()
+    for item in metadata:
+        filesystem.get_file_name(item)
+
+
+@benchmark('filesystem.get_folder_path',
+           setup=lambda context: (_warm_location_db(context), _metadata(context))[1],
+           items=unique_files)
+def bench_get_folder_path(context, metadata):
+    filesystem = FileSystem()
+    for item in metadata:
+        filesystem.get_folder_path(item)
+
+
+@benchmark('db.get_hash',
+           setup=lambda context: (_hashed_library(context), _checksums(context))[1],
+           items=unique_files)
+def bench_db_get_hash(context, checksums):
+    db = Db()
+    for checksum in checksums:
+        db.get_hash(checksum)
+
+
+@benchmark('db.get_location_name',
+           setup=_warm_location_db,
+           items=unique_files)
+def bench_db_get_location_name(context, state):
+    db = Db()
+    for latitude, longitude in context['manifest']['coordinates']:
+        db.get_location_name(latitude, longitude, 3000)
+
+
+def _cold_geocoder(context):
+    # Load the geocoder's dataset outside the timed region.
+    geolocation.place_name(0.0, 0.0)
+    reset_dbs(context)
+
+
+@benchmark('geocode.cold', setup=_cold_geocoder, items=unique_files)
+def bench_geocode_cold(context, state):
+    for latitude, longitude in context['manifest']['coordinates']:
+        geolocation.place_name(latitude, longitude)
+    context['locations'] = True
+
+
+@benchmark('geocode.cached', setup=_warm_location_db, items=unique_files)
+def bench_geocode_cached(context, state):
+    for latitude, longitude in context['manifest']['coordinates']:
+        geolocation.place_name(latitude, longitude)
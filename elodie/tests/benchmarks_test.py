@@ -0,0 +1,262 @@
+# Project imports
+import builtins
+import os
+import sys
+import shutil
+import time
+from tempfile import mkdtemp
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+
+import helper
+from elodie.compatability import _copyfile
+from elodie.exif_reader import ExifReader
+from elodie.media.text import Text
+from elodie.media.photo import Photo
+from elodie.media.video import Video
+from elodie.quicktime_reader import QuickTimeReader
+from elodie.tests.benchmarks import runner
+from elodie.tests.benchmarks.library import PRESETS, generate_library
+from elodie.tests.benchmarks.slowfs import SlowFilesystem
+
+os.environ['TZ'] = 'GMT'
+
+def _library(**kwargs):
+    root = mkdtemp()
+    options = dict(PRESETS['tiny'])
+    options.update(kwargs)
+    return root, generate_library(root, **options)
+
+def test_generate_library_counts_and_depth():
+    root, manifest = _library()
+    paths = manifest['files'] + manifest['duplicates']
+    on_disk = sum(os.path.getsize(path) for path in paths)
+    depths = set(os.path.relpath(path, root).count(os.sep) for path in paths)
+    extensions = set(os.path.splitext(path)[1] for path in manifest['files'])
+    shutil.rmtree(root)
+
+    assert len(manifest['files']) == 20, len(manifest['files'])
+    assert len(manifest['duplicates']) == 4, len(manifest['duplicates'])
+    assert manifest['bytes'] == on_disk, (manifest['bytes'], on_disk)
+    assert depths == set([2]), depths
+    assert set(['.jpg', '.mp4', '.txt']) <= extensions, extensions
+
+def test_generate_library_is_reproducible():
+    root_a, manifest_a = _library(seed=7)
+    root_b, manifest_b = _library(seed=7)
+    root_c, manifest_c = _library(seed=8)
+    checksums_a = [helper.checksum(path) for path in manifest_a['files']]
+    checksums_b = [helper.checksum(path) for path in manifest_b['files']]
+    checksums_c = [helper.checksum(path) for path in manifest_c['files']]
+    for root in (root_a, root_b, root_c):
+        shutil.rmtree(root)
+
+    assert checksums_a == checksums_b
+    assert checksums_a != checksums_c
+    assert len(set(checksums_a)) == len(checksums_a)
+
+def test_generate_library_duplicates_match_originals():
+    root, manifest = _library()
+    originals = set(helper.checksum(path) for path in manifest['files'])
+    copies = [helper.checksum(path) for path in manifest['duplicates']]
+    shutil.rmtree(root)
+
+    assert copies and all(checksum in originals for checksum in copies), copies
+
+def test_generated_media_metadata():
+    root, manifest = _library(photos=1, raws=1, videos=1, texts=1, duplicates=0)
+    by_extension = {}
+    for path, coordinates in zip(manifest['files'], manifest['coordinates']):
+        by_extension[os.path.splitext(path)[1]] = (path, coordinates)
+
+    photo, photo_coordinates = by_extension['.jpg']
+    raw = [path for path, _ in by_extension.values() if path.endswith(('.nef', '.cr2', '.arw', '.dng'))][0]
+    video, video_coordinates = by_extension['.mp4']
+    text, text_coordinates = by_extension['.txt']
+
+    reader = ExifReader(header_window=0)
+    photo_exif = reader.get_metadata(photo)
+    raw_exif = reader.get_metadata(raw)
+    video_metadata = QuickTimeReader().get_metadata(video)
+    valid = (Photo(photo).is_valid(), Photo(raw).is_valid(), Video(video).is_valid())
+    text_metadata = Text(text).get_metadata()
+    shutil.rmtree(root)
+
+    assert all(valid), valid
+    assert 'DateTimeOriginal' in photo_exif, photo_exif
+    assert helper.isclose(photo_exif['GPS GPSLatitude'], photo_coordinates[0]), photo_exif
+    assert helper.isclose(photo_exif['GPS GPSLongitude'], photo_coordinates[1]), photo_exif
+    assert 'DateTimeOriginal' in raw_exif and 'Image Make' in raw_exif, raw_exif
+    assert 'QuickTime:CreateDate' in video_metadata, video_metadata
+    assert helper.isclose(video_metadata['Composite:GPSLatitude'], video_coordinates[0]), video_metadata
+    assert text_metadata['date_taken'].tm_year >= 2005, text_metadata
+    assert helper.isclose(float(text_metadata['latitude']), text_coordinates[0]), text_metadata
+
+def test_benchmark_run_collects_statistics():
+    calls = []
+    bench = runner.Benchmark(
+        'sleep',
+        lambda context, state: (calls.append(state), time.sleep(0.001)),
+        setup=lambda context: 'state',
+        items=lambda context: 10
+    )
+    result = bench.run({}, 3)
+
+    assert calls == ['state', 'state', 'state'], calls
+    assert len(result['samples']) == 3, result
+    assert result['min'] >= 0.001, result
+    assert result['min'] <= result['median'], result
+    assert result['items'] == 10, result
+    assert result['items_per_second'] > 0, result
+
+def test_compare():
+    def results(**medians):
+        return {'benchmarks': dict((name, {'median': median}) for name, median in medians.items())}
+
+    rows = runner.compare(
+        results(same=1.05, slower=1.5, faster=0.5, added=1.0),
+        results(same=1.0, slower=1.0, faster=1.0, removed=1.0),
+        threshold=0.1
+    )
+    statuses = dict((row[0], row[4]) for row in rows)
+
+    assert statuses == {
+        'added': 'new', 'faster': 'faster', 'removed': 'missing',
+        'same': 'same', 'slower': 'slower'
+    }, statuses
+
+def test_save_and_load():
+    folder = mkdtemp()
+    path = os.path.join(folder, 'results.json')
+    results = runner.run([runner.Benchmark('noop', lambda context, state: None)], {}, repeat=2)
+    runner.save(results, path)
+    loaded = runner.load(path)
+    shutil.rmtree(folder)
+
+    assert loaded['version'] == runner.RESULTS_VERSION, loaded
+    assert loaded['repeat'] == 2, loaded
+    assert 'python' in loaded['machine'], loaded
+    assert list(loaded['benchmarks']) == ['noop'], loaded
+
+def test_slowfs_counts_calls_under_prefix():
+    slow = mkdtemp()
+    fast = mkdtemp()
+    for folder in (slow, fast):
+        with open(os.path.join(folder, 'a.txt'), 'w') as f:
+            f.write('line one\nline two\n')
+
+    original_open = builtins.open
+    with SlowFilesystem(slow) as filesystem:
+        for folder in (slow, fast):
+            os.stat(os.path.join(folder, 'a.txt'))
+            os.path.isfile(os.path.join(folder, 'a.txt'))
+            entries = list(os.scandir(folder))
+            entries[0].stat()
+            with open(os.path.join(folder, 'a.txt')) as f:
+                lines = list(f)
+            with open(os.path.join(folder, 'a.txt'), 'rb') as f:
+                data = f.read()
+    counts = dict(filesystem.counts)
+    bytes_read = filesystem.bytes_read
+    shutil.rmtree(slow)
+    shutil.rmtree(fast)
+
+    assert lines == ['line one\n', 'line two\n'], lines
+    assert data == b'line one\nline two\n', data
+    assert counts == {'stat': 3, 'scandir': 1, 'open': 2, 'read': counts['read']}, counts
+    assert counts['read'] >= 2, counts
+    assert bytes_read == 2 * len(data), bytes_read
+    assert builtins.open is original_open
+
+def test_slowfs_latency_and_bandwidth():
+    folder = mkdtemp()
+    path = os.path.join(folder, 'blob')
+    with open(path, 'wb') as f:
+        f.write(b'x' * 100000)
+
+    with SlowFilesystem(folder, latency=0.01):
+        start = time.time()
+        for i in range(5):
+            os.stat(path)
+        latency_elapsed = time.time() - start
+
+    with SlowFilesystem(folder, bandwidth=1000000):
+        start = time.time()
+        with open(path, 'rb') as f:
+            f.read()
+        bandwidth_elapsed = time.time() - start
+    shutil.rmtree(folder)
+
+    assert latency_elapsed >= 0.05, latency_elapsed
+    assert bandwidth_elapsed >= 0.1, bandwidth_elapsed
+
+def test_slowfs_copies_go_through_read():
+    folder = mkdtemp()
+    destination = mkdtemp()
+    source = os.path.join(folder, 'blob')
+    with open(source, 'wb') as f:
+        f.write(b'x' * 50000)
+
+    with SlowFilesystem(folder) as filesystem:
+        _copyfile(source, os.path.join(destination, 'blob'))
+    copied = os.path.getsize(os.path.join(destination, 'blob'))
+    shutil.rmtree(folder)
+    shutil.rmtree(destination)
+
+    assert copied == 50000, copied
+    assert filesystem.bytes_read == 50000, filesystem.bytes_read
+
+def test_slowfs_page_cache():
+    folder = mkdtemp()
+    path = os.path.join(folder, 'blob')
+    with open(path, 'wb') as f:
+        f.write(b'x' * 50000)
+
+    with SlowFilesystem(folder, page_cache=True) as filesystem:
+        with open(path, 'rb') as f:
+            f.read(1000)
+        partial = filesystem.bytes_read
+        for i in range(2):
+            with open(path, 'rb') as f:
+                f.read()
+        cached = filesystem.bytes_read
+        filesystem.reset()
+        with open(path, 'rb') as f:
+            f.read()
+    shutil.rmtree(folder)
+
+    assert partial == 1000, partial
+    assert cached == 51000, cached
+    assert filesystem.bytes_read == 50000, filesystem.bytes_read
+
+def test_slowfs_only_one_installed():
+    first = SlowFilesystem(mkdtemp())
+    second = SlowFilesystem(mkdtemp())
+    first.install()
+    try:
+        try:
+            second.install()
+            installed = True
+        except RuntimeError:
+            installed = False
+    finally:
+        first.uninstall()
+    shutil.rmtree(first.prefix)
+    shutil.rmtree(second.prefix)
+
+    assert installed is False
+    assert os.stat.__name__ == 'stat', os.stat
+
+def test_benchmark_run_with_slowfs():
+    folder = mkdtemp()
+    path = os.path.join(folder, 'a')
+    with open(path, 'w') as f:
+        f.write('a')
+
+    filesystem = SlowFilesystem(folder)
+    # stat in setup isn't counted.
+    bench = runner.Benchmark('stat', lambda context, state: os.stat(path), setup=lambda context: os.stat(path))
+    result = bench.run({'slowfs': filesystem}, 2)
+    shutil.rmtree(folder)
+
+    assert result['calls']['stat'] == 1, result
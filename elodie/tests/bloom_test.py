@@ -0,0 +1,142 @@
+from __future__ import absolute_import
+# Project imports
+import hashlib
+import json
+import mock
+import os
+import sys
+import shutil
+from tempfile import gettempdir, mkdtemp
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+
+from . import helper
+from elodie.bloom import BloomFilter, LibraryFilter, get_false_positive_rate, get_library_hash_dbs
+from elodie.config import load_config
+
+os.environ['TZ'] = 'GMT'
+
+def _checksum(i):
+    return hashlib.sha256(str(i).encode('ascii')).hexdigest()
+
+def _digest(i):
+    return hashlib.sha256(str(i).encode('ascii')).digest()
+
+def _hash_db(folder, name, numbers):
+    path = os.path.join(folder, name)
+    with open(path, 'w') as f:
+        json.dump(dict((_checksum(i), '/%s/%d.jpg' % (name, i)) for i in numbers), f)
+    return path
+
+def test_false_positive_rate():
+    bloom = BloomFilter.for_capacity(1000, 0.01)
+    for i in range(1000):
+        bloom.add(_digest(i))
+
+    missing = all(_digest(i) in bloom for i in range(1000))
+    false_positives = sum(1 for i in range(1000, 11000) if _digest(i) in bloom)
+
+    assert missing, 'Filter is missing an added digest'
+    assert false_positives < 200, false_positives
+
+def test_save_and_load():
+    folder = mkdtemp()
+    path = os.path.join(folder, 'filter.bloom')
+    bloom = BloomFilter.for_capacity(100, 0.01)
+    for i in range(100):
+        bloom.add(_digest(i))
+    bloom.save(path, [['/library/hash.json', 10, 20]])
+
+    loaded, sources = BloomFilter.load(path)
+    result = [_digest(i) in loaded for i in range(100)]
+    not_a_filter = BloomFilter.load(os.path.join(folder, 'missing.bloom'))
+    shutil.rmtree(folder)
+
+    assert all(result), result
+    assert (loaded.size, loaded.hashes, loaded.count) == (bloom.size, bloom.hashes, 100)
+    assert sources == [['/library/hash.json', 10, 20]], sources
+    assert not_a_filter is None
+
+def test_update_merges_filters():
+    first = BloomFilter(1024, 4)
+    second = BloomFilter(1024, 4)
+    first.add(_digest(1))
+    second.add(_digest(2))
+    first.update(second)
+
+    try:
+        first.update(BloomFilter(2048, 4))
+        mismatched = False
+    except ValueError:
+        mismatched = True
+
+    assert _digest(1) in first and _digest(2) in first
+    assert first.count == 2, first.count
+    assert mismatched
+
+def test_library_filter_find():
+    folder = mkdtemp()
+    archive = _hash_db(folder, 'archive.json', range(0, 50))
+    partner = _hash_db(folder, 'partner.json', range(50, 100))
+    path = os.path.join(folder, 'libraries.bloom')
+
+    libraries = LibraryFilter([archive, partner], path, 0.01)
+    found = (libraries.find(_checksum(10)), libraries.find(_checksum(60)), libraries.find(_checksum(100)))
+    saved = os.path.isfile(path)
+    shutil.rmtree(folder)
+
+    assert found == ('/archive.json/10.jpg', '/partner.json/60.jpg', None), found
+    assert saved
+
+def test_library_filter_rebuilt_when_a_library_changes():
+    folder = mkdtemp()
+    archive = _hash_db(folder, 'archive.json', range(0, 50))
+    path = os.path.join(folder, 'libraries.bloom')
+
+    LibraryFilter([archive], path, 0.01)
+    with mock.patch.object(LibraryFilter, 'build') as build:
+        LibraryFilter([archive], path, 0.01)
+        reused = not build.called
+
+    _hash_db(folder, 'archive.json', range(0, 51))
+    libraries = LibraryFilter([archive], path, 0.01)
+    found = libraries.find(_checksum(50))
+    shutil.rmtree(folder)
+
+    assert reused
+    assert found == '/archive.json/50.jpg', found
+
+def test_library_filter_rebuilt_when_the_rate_changes():
+    folder = mkdtemp()
+    archive = _hash_db(folder, 'archive.json', range(0, 50))
+    path = os.path.join(folder, 'libraries.bloom')
+
+    loose = LibraryFilter([archive], path, 0.1).filter.size
+    with mock.patch.object(LibraryFilter, 'build', wraps=LibraryFilter.build, autospec=True) as build:
+        strict = LibraryFilter([archive], path, 0.0001).filter.size
+        rebuilt = build.called
+    shutil.rmtree(folder)
+
+    assert rebuilt
+    assert strict > loose, (strict, loose)
+
+@mock.patch('elodie.config.config_file', '%s/config.ini-libraries' % gettempdir())
+def test_library_config():
+    with open('%s/config.ini-libraries' % gettempdir(), 'w') as f:
+        f.write("""
+[Libraries]
+hash_dbs=/mnt/archive/.elodie/hash.json
+    /mnt/partner/.elodie/hash.json
+false_positive_rate=0.0001
+        """)
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    hash_dbs = get_library_hash_dbs()
+    rate = get_false_positive_rate()
+
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    assert hash_dbs == ['/mnt/archive/.elodie/hash.json', '/mnt/partner/.elodie/hash.json'], hash_dbs
+    assert rate == 0.0001, rate
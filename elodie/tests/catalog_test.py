@@ -0,0 +1,192 @@
+# Project imports
+import os
+import sys
+import shutil
+import sqlite3
+import time
+from tempfile import mkdtemp
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+
+from elodie.catalog import Catalog, distance_km
+
+os.environ['TZ'] = 'GMT'
+
+def _catalog():
+    folder = mkdtemp()
+    return folder, Catalog(os.path.join(folder, 'catalog.db'))
+
+def _metadata(date, **kwargs):
+    metadata = {
+        'date_taken': time.strptime(date, '%Y-%m-%d %H:%M:%S'),
+        'camera_make': None,
+        'camera_model': None,
+        'latitude': None,
+        'longitude': None,
+        'album': None,
+        'title': None,
+        'mime_type': 'image/jpeg'
+    }
+    metadata.update(kwargs)
+    return metadata
+
+def _populate(catalog):
+    chicago = {'default': 'Chicago', 'city': 'Chicago', 'state': 'Illinois', 'country': 'US'}
+    paris = {'default': 'Paris', 'city': 'Paris', 'state': 'Ile-de-France', 'country': 'FR'}
+    catalog.add('/library/a.jpg', 'a', _metadata(
+        '2019-03-01 10:00:00', camera_make='Canon', camera_model='Canon EOS 5D',
+        latitude=41.8781, longitude=-87.6298, album='Trip'
+    ), place=chicago, size=100)
+    catalog.add('/library/b.jpg', 'b', _metadata(
+        '2019-12-31 23:59:59', camera_make='Apple', camera_model='iPhone 12 Pro',
+        latitude='41.90', longitude='-87.65', title='Lake 100% view'
+    ), place=chicago, size=200)
+    catalog.add('/library/c.mp4', 'c', _metadata(
+        '2020-01-01 00:00:00', camera_make='Apple', camera_model='iPhone 12 Pro',
+        latitude=48.8566, longitude=2.3522, mime_type='video/mp4'
+    ), place=paris, size=300)
+    catalog.add('/library/d.txt', 'd', _metadata(
+        '2018-06-01 12:00:00', mime_type='text/plain', title='Notes'
+    ), size=10)
+
+def _paths(records):
+    return [record['path'] for record in records]
+
+def test_add_and_get():
+    folder, catalog = _catalog()
+    _populate(catalog)
+    record = catalog.get('/library/b.jpg')
+    missing = catalog.get('/library/missing.jpg')
+    count = catalog.count()
+    catalog.close()
+    shutil.rmtree(folder)
+
+    assert count == 4, count
+    assert missing is None
+    assert record['date_taken'] == '2019-12-31 23:59:59', record
+    assert record['latitude'] == 41.9, record
+    assert record['city'] == 'Chicago' and record['place'] == 'Chicago', record
+    assert record['size'] == 200, record
+
+def test_query_filters():
+    folder, catalog = _catalog()
+    _populate(catalog)
+    everything = catalog.query()
+    by_camera = catalog.query(camera='iphone 12 pro')
+    by_make = catalog.query(camera='canon')
+    by_year = catalog.query(year=2019)
+    by_range = catalog.query(after='2019-06-01', before='2020-01-01 00:00:01')
+    by_place = catalog.query(place='chicago')
+    by_country = catalog.query(place='FR')
+    by_album = catalog.query(album='trip')
+    by_title = catalog.query(title='100%')
+    by_type = catalog.query(mime_type='image/')
+    by_exact_type = catalog.query(mime_type='video/mp4')
+    combined = catalog.query(camera='Apple', year=2019)
+    limited = catalog.query(limit=2)
+    catalog.close()
+    shutil.rmtree(folder)
+
+    assert _paths(everything) == ['/library/d.txt', '/library/a.jpg', '/library/b.jpg', '/library/c.mp4'], _paths(everything)
+    assert _paths(by_camera) == ['/library/b.jpg', '/library/c.mp4'], _paths(by_camera)
+    assert _paths(by_make) == ['/library/a.jpg'], _paths(by_make)
+    assert _paths(by_year) == ['/library/a.jpg', '/library/b.jpg'], _paths(by_year)
+    assert _paths(by_range) == ['/library/b.jpg', '/library/c.mp4'], _paths(by_range)
+    assert _paths(by_place) == ['/library/a.jpg', '/library/b.jpg'], _paths(by_place)
+    assert _paths(by_country) == ['/library/c.mp4'], _paths(by_country)
+    assert _paths(by_album) == ['/library/a.jpg'], _paths(by_album)
+    assert _paths(by_title) == ['/library/b.jpg'], _paths(by_title)
+    assert _paths(by_type) == ['/library/a.jpg', '/library/b.jpg'], _paths(by_type)
+    assert _paths(by_exact_type) == ['/library/c.mp4'], _paths(by_exact_type)
+    assert _paths(combined) == ['/library/b.jpg'], _paths(combined)
+    assert _paths(limited) == ['/library/d.txt', '/library/a.jpg'], _paths(limited)
+
+def test_query_near():
+    folder, catalog = _catalog()
+    _populate(catalog)
+    close = catalog.query(near=(41.8781, -87.6298), radius=1)
+    wider = catalog.query(near=(41.8781, -87.6298), radius=10)
+    catalog.close()
+    shutil.rmtree(folder)
+
+    assert _paths(close) == ['/library/a.jpg'], _paths(close)
+    assert _paths(wider) == ['/library/a.jpg', '/library/b.jpg'], _paths(wider)
+
+def test_add_replaces_moved_path():
+    folder, catalog = _catalog()
+    catalog.add('/library/old.jpg', 'a', _metadata('2019-03-01 10:00:00'))
+    catalog.add('/library/new.jpg', 'a', _metadata('2019-03-01 10:00:00'), replaces='/library/old.jpg')
+    paths = _paths(catalog.query())
+    catalog.close()
+    shutil.rmtree(folder)
+
+    assert paths == ['/library/new.jpg'], paths
+
+def test_add_same_path_updates_record():
+    folder, catalog = _catalog()
+    catalog.add('/library/a.jpg', 'a', _metadata('2019-03-01 10:00:00', album='One'))
+    catalog.add('/library/a.jpg', 'a', _metadata('2019-03-01 10:00:00', album='Two'))
+    records = catalog.query()
+    catalog.close()
+    shutil.rmtree(folder)
+
+    assert len(records) == 1, records
+    assert records[0]['album'] == 'Two', records
+
+def test_rename_and_under():
+    folder, catalog = _catalog()
+    _populate(catalog)
+    catalog.add('/library-other/e.jpg', 'e', _metadata('2019-03-01 10:00:00'))
+    catalog.rename([('/library/a.jpg', '/library/2019/a.jpg')])
+    under = _paths(catalog.under('/library'))
+    catalog.close()
+    shutil.rmtree(folder)
+
+    assert under == ['/library/2019/a.jpg', '/library/b.jpg', '/library/c.mp4', '/library/d.txt'], under
+
+def test_with_size_and_paths():
+    folder, catalog = _catalog()
+    _populate(catalog)
+    catalog.add('/library/e.jpg', 'e', _metadata('2019-03-01 10:00:00'), size=200)
+    with_size = sorted(catalog.with_size(200))
+    paths = catalog.paths()
+    catalog.close()
+    shutil.rmtree(folder)
+
+    assert with_size == ['/library/b.jpg', '/library/e.jpg'], with_size
+    assert paths == set(['/library/a.jpg', '/library/b.jpg', '/library/c.mp4', '/library/d.txt', '/library/e.jpg']), paths
+
+def test_images_and_set_hashes():
+    folder, catalog = _catalog()
+    _populate(catalog)
+    catalog.set_hashes([('/library/a.jpg', ('00ff', 'ff00'))])
+    images = catalog.images('/library')
+    catalog.close()
+    shutil.rmtree(folder)
+
+    assert images == [
+        {'path': '/library/a.jpg', 'dhash': '00ff', 'phash': 'ff00'},
+        {'path': '/library/b.jpg', 'dhash': None, 'phash': None}
+    ], images
+
+def test_upgrades_first_version():
+    folder = mkdtemp()
+    db_file = os.path.join(folder, 'catalog.db')
+    connection = sqlite3.connect(db_file)
+    connection.execute('CREATE TABLE media (path TEXT PRIMARY KEY, checksum TEXT, source TEXT, date_taken TEXT, camera_make TEXT, camera_model TEXT, latitude REAL, longitude REAL, city TEXT, state TEXT, country TEXT, place TEXT, album TEXT, title TEXT, mime_type TEXT, size INTEGER, imported TEXT)')
+    connection.execute("INSERT INTO media (path, checksum) VALUES ('/library/a.jpg', 'a')")
+    connection.commit()
+    connection.close()
+
+    catalog = Catalog(db_file)
+    record = catalog.get('/library/a.jpg')
+    catalog.close()
+    shutil.rmtree(folder)
+
+    assert record['checksum'] == 'a', record
+    assert record['original_name'] is None and record['phash'] is None, record
+
+def test_distance_km():
+    # Chicago to Paris is about 6650km.
+    assert 6600 < distance_km(41.8781, -87.6298, 48.8566, 2.3522) < 6700
+    assert distance_km(10, 10, 10, 10) == 0
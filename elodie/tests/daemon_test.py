@@ -0,0 +1,122 @@
+# Project imports
+import os
+import sys
+import threading
+import time
+
+from nose.tools import assert_raises
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.realpath(__file__))))
+
+import helper
+from elodie.daemon import Daemon, DaemonError, METHOD_NOT_FOUND, JOB_ERROR, call
+
+os.environ['TZ'] = 'GMT'
+
+def start_daemon(daemon):
+    thread = threading.Thread(target=daemon.serve_forever)
+    thread.daemon = True
+    thread.start()
+    for i in range(100):
+        if os.path.exists(daemon.socket_path):
+            break
+        time.sleep(0.01)
+    return thread
+
+def stop_daemon(daemon, thread):
+    call('shutdown', socket_path=daemon.socket_path)
+    thread.join(5)
+
+def socket_path():
+    return '/tmp/elodie-test-%s.sock' % helper.random_string(8)
+
+def test_ping():
+    daemon = Daemon(socket_path())
+    thread = start_daemon(daemon)
+    try:
+        assert call('ping', socket_path=daemon.socket_path) == 'pong'
+    finally:
+        stop_daemon(daemon, thread)
+
+    assert not os.path.exists(daemon.socket_path)
+
+def test_method_not_found():
+    daemon = Daemon(socket_path())
+    thread = start_daemon(daemon)
+    try:
+        with assert_raises(DaemonError) as context:
+            call('does-not-exist', socket_path=daemon.socket_path)
+    finally:
+        stop_daemon(daemon, thread)
+
+    assert context.exception.code == METHOD_NOT_FOUND, context.exception.code
+
+def test_handler_streams_events():
+    def handler(params, emit):
+        for i in range(params['count']):
+            emit('progress', {'file': i})
+        return 'done'
+
+    daemon = Daemon(socket_path())
+    daemon.register('count', handler)
+    thread = start_daemon(daemon)
+    events = []
+    try:
+        result = call('count', {'count': 3}, socket_path=daemon.socket_path,
+                      on_event=lambda method, params: events.append((method, params)))
+    finally:
+        stop_daemon(daemon, thread)
+
+    assert result == 'done', result
+    assert events == [('progress', {'file': 0}), ('progress', {'file': 1}), ('progress', {'file': 2})], events
+
+def test_handler_error():
+    def handler(params, emit):
+        raise ValueError('bad job')
+
+    daemon = Daemon(socket_path())
+    daemon.register('fail', handler)
+    thread = start_daemon(daemon)
+    try:
+        with assert_raises(DaemonError) as context:
+            call('fail', socket_path=daemon.socket_path)
+        # The daemon keeps serving after a failed job.
+        assert call('ping', socket_path=daemon.socket_path) == 'pong'
+    finally:
+        stop_daemon(daemon, thread)
+
+    assert context.exception.code == JOB_ERROR, context.exception.code
+    assert 'bad job' in str(context.exception), str(context.exception)
+
+def test_socket_is_private():
+    daemon = Daemon(socket_path())
+    thread = start_daemon(daemon)
+    try:
+        mode = os.stat(daemon.socket_path).st_mode & 0o777
+    finally:
+        stop_daemon(daemon, thread)
+
+    assert mode == 0o600, oct(mode)
+
+def test_job_finishes_when_client_disconnects():
+    finished = []
+    def handler(params, emit):
+        for i in range(3):
+            emit('progress', {'file': i})
+        finished.append(True)
+        return 'done'
+
+    written = []
+    def write(payload):
+        written.append(payload)
+        raise BrokenPipeError()
+
+    daemon = Daemon(socket_path())
+    daemon.register('count', handler)
+    keep_open = daemon.handle_line(b'{"jsonrpc": "2.0", "id": 1, "method": "count"}', write)
+
+    assert finished == [True], finished
+    # Nothing is written after the first failure.
+    assert len(written) == 1, written
+    assert keep_open is False
@@ -1,5 +1,6 @@
 # Project imports
 from imp import load_source
+import json
 import mock
 import os
 import sys
@@ -649,6 +650,432 @@ def test_update_invalid_file_exit_code():
 
     assert result.exit_code == 1, result.exit_code
 
+def test_import_move():
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_destination, folder_destination = helper.create_working_folder()
+
+    origin = '%s/valid.txt' % folder
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+
+    helper.reset_dbs()
+    runner = CliRunner()
+    result = runner.invoke(elodie._import, ['--destination', folder_destination, '--move', '--allow-duplicates', origin])
+    helper.restore_dbs()
+
+    origin_exists = os.path.exists(origin)
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_destination)
+
+    assert result.exit_code == 0, result.output
+    assert origin_exists is False
+
+def test_import_link_and_trash_are_exclusive():
+    runner = CliRunner()
+    result = runner.invoke(elodie._import, ['--destination', '/does/not/exist', '--link', '--trash', '/does/not/exist'])
+
+    assert result.exit_code == 1, result.exit_code
+
+def test_import_trace():
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_destination, folder_destination = helper.create_working_folder()
+
+    origin = '%s/valid.txt' % folder
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+    trace_file = '%s/trace.json' % folder
+
+    helper.reset_dbs()
+    runner = CliRunner()
+    result = runner.invoke(elodie._import, ['--destination', folder_destination, '--allow-duplicates', '--trace', trace_file, origin])
+    helper.restore_dbs()
+
+    with open(trace_file, 'r') as f:
+        events = json.load(f)['traceEvents']
+    names = set([event['name'] for event in events])
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_destination)
+
+    assert result.exit_code == 0, result.output
+    assert 'TRACE (ms)' in result.output, result.output
+    assert set(['walk', 'import_file', 'detect_type', 'filesystem_lock.wait', 'metadata', 'checksum', 'transfer', 'db.write', 'plugins.after']) <= names, names
+    assert all(event['ph'] == 'X' and event['dur'] >= 0 for event in events), events
+    assert elodie.trace.tracer is None
+
+def test_import_metrics_file():
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_destination, folder_destination = helper.create_working_folder()
+
+    origin = '%s/valid.txt' % folder
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+    metrics_file = '%s/elodie.prom' % folder
+
+    helper.reset_dbs()
+    runner = CliRunner()
+    result = runner.invoke(elodie._import, ['--destination', folder_destination, '--allow-duplicates', '--metrics-file', metrics_file, origin])
+    helper.restore_dbs()
+
+    with open(metrics_file, 'r') as f:
+        metrics = f.read()
+    copied = [os.path.join(root, name) for root, dirs, names in os.walk(folder_destination) for name in names]
+    copied_bytes = sum(os.path.getsize(path) for path in copied)
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_destination)
+
+    assert result.exit_code == 0, result.output
+    assert 'elodie_files_total{command="import",status="success"} 1' in metrics, metrics
+    assert 'elodie_bytes_total{command="import"} %d' % copied_bytes in metrics, metrics
+    assert 'stage="import_file"' in metrics, metrics
+    assert 'elodie_run_completed{command="import"} 1' in metrics, metrics
+    assert elodie.trace.tracer is None
+
+def test_query_after_import():
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_destination, folder_destination = helper.create_working_folder()
+
+    origin = '%s/valid.txt' % folder
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+
+    helper.reset_dbs()
+    runner = CliRunner()
+    runner.invoke(elodie._import, ['--destination', folder_destination, '--allow-duplicates', origin])
+    by_title = runner.invoke(elodie._query, ['--title', 'sample title', '--near', '51.52,0.16', '--year', '2016'])
+    as_json = runner.invoke(elodie._query, ['--title', 'sample title', '--json'])
+    other_year = runner.invoke(elodie._query, ['--title', 'sample title', '--year', '2015', '--count'])
+    invalid = runner.invoke(elodie._query, ['--after', 'yesterday'])
+    helper.restore_dbs()
+
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_destination)
+
+    imported = [line for line in by_title.output.splitlines() if line.startswith(folder_destination)]
+    records = [json.loads(line) for line in as_json.output.splitlines()]
+    assert len(imported) == 1, by_title.output
+    assert imported[0].endswith('valid-sample-title.txt'), imported
+    assert any(record['source'] == origin for record in records), records
+    assert other_year.output.strip() == '0', other_year.output
+    assert invalid.exit_code == 2, invalid.output
+
+def test_relayout_after_import():
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_destination, folder_destination = helper.create_working_folder()
+
+    origin = '%s/valid.txt' % folder
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+
+    helper.reset_dbs()
+    runner = CliRunner()
+    runner.invoke(elodie._import, ['--destination', folder_destination, '--allow-duplicates', origin])
+    dry_run = runner.invoke(elodie._relayout, ['--destination', folder_destination, '--dry-run'])
+    relayout = runner.invoke(elodie._relayout, ['--destination', folder_destination])
+    missing = runner.invoke(elodie._relayout, ['--destination', os.path.join(folder, 'missing')])
+    helper.restore_dbs()
+
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_destination)
+
+    # The layout didn't change so nothing moves.
+    assert ' -> ' not in dry_run.output, dry_run.output
+    assert 'Unchanged' in dry_run.output, dry_run.output
+    assert relayout.exit_code == 0, relayout.output
+    assert 'Moving 0 files' in relayout.output, relayout.output
+    assert missing.exit_code == 1, missing.output
+
+def test_sync_after_import():
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_destination, folder_destination = helper.create_working_folder()
+    temporary_folder_backup, folder_backup = helper.create_working_folder()
+
+    origin = '%s/valid.txt' % folder
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+
+    helper.reset_dbs()
+    runner = CliRunner()
+    runner.invoke(elodie._import, ['--destination', folder_destination, '--allow-duplicates', origin])
+    sync = runner.invoke(elodie._sync, ['--source', folder_destination, '--to', folder_backup, '--verify'])
+    again = runner.invoke(elodie._sync, ['--source', folder_destination, '--to', folder_backup])
+    helper.restore_dbs()
+
+    backed_up = []
+    for dirname, dirnames, filenames in os.walk(folder_backup):
+        if elodie.constants.sync_directory not in dirname:
+            backed_up += filenames
+
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_destination)
+    shutil.rmtree(folder_backup)
+
+    assert sync.exit_code == 0, sync.output
+    assert ['Copied', '1'] in [line.split() for line in sync.output.splitlines()], sync.output
+    assert ['Copied', '0'] in [line.split() for line in again.output.splitlines()], again.output
+    assert len(backed_up) == 1, backed_up
+
+def test_find_similar_after_import():
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_destination, folder_destination = helper.create_working_folder()
+
+    original = helper.make_image(os.path.join(folder, 'original.jpg'), 1)
+    helper.resized_copy(original, os.path.join(folder, 'copy.jpg'), quality=50)
+    helper.make_image(os.path.join(folder, 'other.jpg'), 2)
+
+    runner = CliRunner()
+    runner.invoke(elodie._import, ['--destination', folder_destination, '--workers', '1', folder])
+    found = runner.invoke(elodie._find_similar, ['--destination', folder_destination, '--json'])
+
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_destination)
+
+    groups = [json.loads(line) for line in found.output.splitlines()]
+    assert found.exit_code == 0, found.output
+    assert len(groups) == 1 and len(groups[0]) == 2, found.output
+    assert sorted(path.split('-')[-1] for path in groups[0]) == ['copy.jpg', 'original.jpg'], groups
+
+def test_import_from_archive():
+    import zipfile
+
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_destination, folder_destination = helper.create_working_folder()
+
+    archive = os.path.join(folder, 'takeout.zip')
+    with zipfile.ZipFile(archive, 'w') as f:
+        f.write(helper.get_file('valid.txt'), 'Trip/valid.txt')
+        f.write(helper.get_file('valid.txt'), 'Copy/valid.txt')
+        f.writestr('notes.md', 'not media')
+
+    helper.reset_dbs()
+    runner = CliRunner()
+    result = runner.invoke(elodie._import, ['--destination', folder_destination, '--allow-duplicates', archive])
+    again = runner.invoke(elodie._import, ['--destination', folder_destination, archive])
+    records = elodie.FILESYSTEM.catalog.under(folder_destination)
+    helper.restore_dbs()
+
+    imported = []
+    for dirname, dirnames, filenames in os.walk(folder_destination):
+        imported += [os.path.join(dirname, filename) for filename in filenames]
+
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_destination)
+
+    assert result.exit_code == 0, result.output
+    assert 'Success         2' in result.output, result.output
+    assert 'Success         0' in again.output, again.output
+    # Both members have the same name and were imported to the same path,
+    #  nothing else is left behind in the destination.
+    assert len(imported) == 1, imported
+    assert '.elodie-archive' not in imported[0], imported
+    assert any(record['source'] == os.path.join(archive, 'Copy/valid.txt') for record in records), records
+
+@mock.patch('send2trash.send2trash')
+def test_import_where(send2trash):
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_destination, folder_destination = helper.create_working_folder()
+
+    origin = '%s/valid.txt' % folder
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+
+    helper.reset_dbs()
+    runner = CliRunner()
+    skipped = runner.invoke(elodie._import, ['--destination', folder_destination, '--allow-duplicates', '--trash',
+                                             '--where', 'date_taken>=2017', origin])
+    skipped_files = os.listdir(folder_destination)
+    imported = runner.invoke(elodie._import, ['--destination', folder_destination, '--allow-duplicates',
+                                              '--where', 'date_taken=2016-04', '--where', 'extension=TXT',
+                                              '--where', 'has_gps', origin])
+    invalid = runner.invoke(elodie._import, ['--destination', folder_destination, '--where', 'iso>100', origin])
+    helper.restore_dbs()
+
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_destination)
+
+    assert skipped.exit_code == 0, skipped.output
+    assert ['Success', '0'] in [line.split() for line in skipped.output.splitlines()], skipped.output
+    assert ['Error', '0'] in [line.split() for line in skipped.output.splitlines()], skipped.output
+    assert ['Filtered', '1'] in [line.split() for line in skipped.output.splitlines()], skipped.output
+    assert skipped_files == [], skipped_files
+    assert not send2trash.called
+    assert imported.exit_code == 0, imported.output
+    assert 'Success         1' in imported.output, imported.output
+    assert invalid.exit_code == 2, invalid.output
+    assert 'unknown field iso' in invalid.output, invalid.output
+
+def test_import_skip_similar_builds_index_first():
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_destination, folder_destination = helper.create_working_folder()
+
+    origin = '%s/valid.txt' % folder
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+
+    helper.reset_dbs()
+    runner = CliRunner()
+    with mock.patch.object(elodie.FILESYSTEM, 'get_similar_index') as get_similar_index:
+        result = runner.invoke(elodie._import, ['--destination', folder_destination, '--allow-duplicates',
+                                                '--skip-similar', origin])
+    helper.restore_dbs()
+
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_destination)
+
+    assert result.exit_code == 0, result.output
+    # Text files are never compared, the index is built before any worker starts.
+    get_similar_index.assert_called_once_with(folder_destination)
+
+@mock.patch('send2trash.send2trash')
+def test_import_archive_trash_only_when_everything_imported(send2trash):
+    import zipfile
+
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_destination, folder_destination = helper.create_working_folder()
+
+    mixed = os.path.join(folder, 'mixed.zip')
+    with zipfile.ZipFile(mixed, 'w') as f:
+        f.write(helper.get_file('valid.txt'), 'valid.txt')
+        f.writestr('notes.md', 'not media')
+    media_only = os.path.join(folder, 'media.zip')
+    with zipfile.ZipFile(media_only, 'w') as f:
+        f.write(helper.get_file('valid.txt'), 'valid.txt')
+
+    helper.reset_dbs()
+    runner = CliRunner()
+    runner.invoke(elodie._import, ['--destination', folder_destination, '--allow-duplicates', '--trash', mixed])
+    mixed_trashed = send2trash.called
+    runner.invoke(elodie._import, ['--destination', folder_destination, '--allow-duplicates', '--trash',
+                                   '--where', 'date_taken>=2030', media_only])
+    filtered_trashed = send2trash.called
+    runner.invoke(elodie._import, ['--destination', folder_destination, '--allow-duplicates', '--trash', media_only])
+    helper.restore_dbs()
+
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_destination)
+
+    assert mixed_trashed is False
+    assert filtered_trashed is False
+    send2trash.assert_called_once_with(media_only)
+
+@mock.patch.object(elodie.Readahead, 'finished')
+def test_import_drops_duplicates_from_cache(finished):
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_destination, folder_destination = helper.create_working_folder()
+
+    origin = '%s/valid.txt' % folder
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+
+    helper.reset_dbs()
+    runner = CliRunner()
+    runner.invoke(elodie._import, ['--destination', folder_destination, origin])
+    finished.reset_mock()
+    duplicate = runner.invoke(elodie._import, ['--destination', folder_destination, origin])
+    helper.restore_dbs()
+
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_destination)
+
+    assert duplicate.exit_code == 0, duplicate.output
+    assert ['Success', '0'] in [line.split() for line in duplicate.output.splitlines()], duplicate.output
+    assert finished.call_args_list == [mock.call(origin, None)], finished.call_args_list
+
+@mock.patch('elodie.import_file', side_effect=RuntimeError('interrupted'))
+def test_import_resets_readahead_on_error(import_file):
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_destination, folder_destination = helper.create_working_folder()
+
+    origin = '%s/valid.txt' % folder
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+
+    runner = CliRunner()
+    result = runner.invoke(elodie._import, ['--destination', folder_destination, origin])
+
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_destination)
+
+    assert import_file.called
+    assert isinstance(result.exception, RuntimeError), result.exception
+    assert elodie.readahead is None
+
+def test_params_to_args():
+    args = elodie._params_to_args({
+        'destination': '/dest',
+        'allow_duplicates': True,
+        'trash': False,
+        'exclude_regex': ['a', 'b'],
+        'paths': ['/one', '/two']
+    })
+
+    assert args == ['--allow-duplicates', '--destination', '/dest', '--exclude-regex', 'a', '--exclude-regex', 'b', '/one', '/two'], args
+
+def test_serve_import_streams_progress():
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_destination, folder_destination = helper.create_working_folder()
+
+    origin = '%s/valid.txt' % folder
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+
+    events = []
+    handler = elodie._serve_command(elodie._import)
+    helper.reset_dbs()
+    result = handler(
+        {'destination': folder_destination, 'allow_duplicates': True, 'paths': [origin]},
+        lambda method, params: events.append((method, params))
+    )
+    helper.restore_dbs()
+
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_destination)
+
+    assert result == {'exit_code': 0}, result
+    assert len(events) == 1, events
+    assert events[0][0] == 'progress', events
+    assert events[0][1]['file'] == origin, events
+    assert events[0][1]['status'] == 'success', events
+    assert events[0][1]['destination'].startswith(folder_destination), events
+    assert elodie.progress_listener is None
+
+def test_serve_import_streams_filtered():
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_destination, folder_destination = helper.create_working_folder()
+
+    origin = '%s/valid.txt' % folder
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+
+    events = []
+    handler = elodie._serve_command(elodie._import)
+    helper.reset_dbs()
+    result = handler(
+        {'destination': folder_destination, 'where': ['date_taken>=2017'], 'paths': [origin]},
+        lambda method, params: events.append((method, params))
+    )
+    helper.restore_dbs()
+
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_destination)
+
+    assert result == {'exit_code': 0}, result
+    assert events == [('progress', {'file': origin, 'status': 'filtered'})], events
+
+def test_scan_invalid_source():
+    runner = CliRunner()
+    result = runner.invoke(elodie._scan, ['--source', '/invalid/path'])
+    assert result.exit_code == 1, result.exit_code
+
+def test_scan_does_not_copy():
+    temporary_folder, folder = helper.create_working_folder()
+
+    origin = '%s/valid.txt' % folder
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+
+    helper.reset_dbs()
+    runner = CliRunner()
+    runner.invoke(elodie._generate_db, ['--source', folder])
+    with open('%s/new.txt' % folder, 'w') as f:
+        f.write('a new file %s' % helper.random_string(20))
+    result = runner.invoke(elodie._scan, ['--source', folder])
+    helper.restore_dbs()
+
+    files = os.listdir(folder)
+    shutil.rmtree(folder)
+
+    assert result.exit_code == 0, result.exit_code
+    assert sorted(files) == ['new.txt', 'valid.txt'], files
+    assert 'New                  1' in result.output, result.output
+    assert 'Duplicate            1' in result.output, result.output
+
 def test_regenerate_db_invalid_source():
     runner = CliRunner()
     result = runner.invoke(elodie._generate_db, ['--source', '/invalid/path'])
@@ -727,6 +1154,49 @@ def test_verify_error():
     assert origin in result.output, result.output
     assert 'Error           1' in result.output, result.output
 
+@mock.patch('elodie.config.config_file', '%s/config.ini-verify-xattr' % gettempdir())
+def test_verify_uses_xattr_written_by_import():
+    if not hasattr(os, 'getxattr'):
+        raise SkipTest('No extended attributes on this platform')
+    with open('%s/config.ini-verify-xattr' % gettempdir(), 'w') as f:
+        f.write("""
+[Checksum]
+xattr=library
+        """)
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_destination, folder_destination = helper.create_working_folder()
+
+    # Already has an original name so nothing is written to the copy.
+    origin = '%s/with-original-name.txt' % folder
+    shutil.copyfile(helper.get_file('with-original-name.txt'), origin)
+
+    helper.reset_dbs()
+    runner = CliRunner()
+    runner.invoke(elodie._import, ['--destination', folder_destination, origin])
+    dest_path = Db().get_hash(helper.checksum(origin))
+    cached = dest_path is not None and elodie.constants.checksum_xattr in os.listxattr(dest_path)
+    if cached:
+        # Corruption which keeps the size and mtime is only found by hashing.
+        stat = os.stat(dest_path)
+        with open(dest_path, 'r+b') as f:
+            f.write(b'X')
+        os.utime(dest_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    trusted = runner.invoke(elodie._verify, ['--trust-xattr'])
+    rehashed = runner.invoke(elodie._verify)
+    helper.restore_dbs()
+
+    del load_config.config
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_destination)
+
+    assert dest_path is not None
+    assert cached is True
+    assert dest_path not in trusted.output, trusted.output
+    assert dest_path in rehashed.output, rehashed.output
+
 @mock.patch('elodie.config.config_file', '%s/config.ini-cli-batch-plugin-googlephotos' % gettempdir())
 def test_cli_batch_plugin_googlephotos():
     auth_file = helper.get_file('plugins/googlephotos/auth_file.json')
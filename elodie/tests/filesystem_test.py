@@ -15,6 +15,7 @@ sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirna
 from . import helper
 from elodie.config import load_config
 from elodie.filesystem import FileSystem
+from elodie.localstorage import Db
 from elodie.media.text import Text
 from elodie.media.media import Media
 from elodie.media.photo import Photo
@@ -730,6 +731,207 @@ def test_process_file_plain():
     assert origin_checksum_preprocess == origin_checksum
     assert helper.path_tz_fix(os.path.join('2015-12-Dec','Unknown Location','2015-12-05_00-59-26-photo.jpg')) in destination, destination
 
+def test_process_file_move_renames():
+    filesystem = FileSystem()
+    temporary_folder, folder = helper.create_working_folder()
+
+    origin = os.path.join(folder,'photo.jpg')
+    shutil.copyfile(helper.get_file('plain.jpg'), origin)
+
+    origin_checksum = helper.checksum(origin)
+    origin_inode = os.stat(origin).st_ino
+    media = Photo(origin)
+    destination = filesystem.process_file(origin, temporary_folder, media, allowDuplicate=True, move=True)
+
+    destination_checksum = helper.checksum(destination)
+    destination_inode = os.stat(destination).st_ino
+    origin_exists = os.path.exists(origin)
+
+    shutil.rmtree(folder)
+    shutil.rmtree(os.path.dirname(os.path.dirname(destination)))
+
+    assert origin_exists is False
+    assert origin_checksum == destination_checksum
+    # A rename keeps the inode, a copy would not.
+    assert origin_inode == destination_inode
+
+def test_process_file_move_sets_utime_like_copy():
+    filesystem = FileSystem()
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder_copy, folder_copy = helper.create_working_folder()
+
+    # The date in the name is used for the mtime.
+    origin = os.path.join(folder,'2015-01-19_12-45-11-photo.jpg')
+    shutil.copyfile(helper.get_file('plain.jpg'), origin)
+    os.utime(origin, (1330712900, 1330712900))
+    copied = filesystem.process_file(origin, folder_copy, Photo(origin), allowDuplicate=True)
+    copied_mtime = os.path.getmtime(copied)
+    moved = filesystem.process_file(origin, temporary_folder, Photo(origin), allowDuplicate=True, move=True)
+    moved_mtime = os.path.getmtime(moved)
+
+    shutil.rmtree(folder)
+    shutil.rmtree(folder_copy)
+    shutil.rmtree(os.path.dirname(os.path.dirname(moved)))
+
+    assert moved_mtime == copied_mtime, (moved_mtime, copied_mtime)
+    assert moved_mtime == time.mktime((2015, 1, 19, 12, 45, 11, 0, 0, -1)), moved_mtime
+
+def test_process_file_records_catalog():
+    filesystem = FileSystem()
+    temporary_folder, folder = helper.create_working_folder()
+
+    origin = os.path.join(folder, 'valid.txt')
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+
+    media = Text(origin)
+    destination = filesystem.process_file(origin, temporary_folder, media, allowDuplicate=True)
+    record = filesystem.catalog.get(destination)
+
+    moved = filesystem.process_file(destination, temporary_folder, Text(destination), allowDuplicate=True, move=True)
+    moved_record = filesystem.catalog.get(moved)
+    # The file was renamed on the way so the old path should be gone.
+    old_record = filesystem.catalog.get(destination)
+
+    shutil.rmtree(folder)
+    shutil.rmtree(os.path.dirname(os.path.dirname(moved)))
+
+    assert record['source'] == origin, record
+    assert len(record['checksum']) == 64, record
+    assert record['date_taken'] == '2016-04-07 11:15:26', record
+    assert record['latitude'] == 51.521435, record
+    assert record['title'] == 'sample title', record
+    assert record['mime_type'] == 'text/plain', record
+    assert record['size'] == os.path.getsize(helper.get_file('valid.txt')), record
+    assert moved != destination, moved
+    assert moved_record['source'] == destination, moved_record
+    assert old_record is None, old_record
+
+def test_process_file_skip_similar():
+    from elodie.catalog import Catalog
+
+    filesystem = FileSystem()
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder, library = helper.create_working_folder()
+    filesystem._catalog = Catalog(os.path.join(folder, 'catalog.db'))
+
+    original = helper.make_image(os.path.join(folder, 'original.jpg'), 1)
+    copy = helper.resized_copy(original, os.path.join(folder, 'copy.jpg'), quality=50)
+    other = helper.make_image(os.path.join(folder, 'other.jpg'), 2)
+
+    imported = filesystem.process_file(original, library, Photo(original), allowDuplicate=True, skipSimilar=True)
+    skipped = filesystem.process_file(copy, library, Photo(copy), allowDuplicate=True, skipSimilar=True)
+    different = filesystem.process_file(other, library, Photo(other), allowDuplicate=True, skipSimilar=True)
+    # Without the flag the copy is imported like before.
+    unchecked = filesystem.process_file(copy, library, Photo(copy), allowDuplicate=True)
+    record = filesystem.catalog.get(imported)
+    filesystem.catalog.close()
+
+    shutil.rmtree(folder)
+    shutil.rmtree(library)
+
+    assert imported is not None
+    assert skipped is None
+    assert different is not None
+    assert unchecked is not None
+    assert len(record['phash']) == 16, record
+
+@mock.patch('elodie.config.config_file', '%s/config.ini-other-libraries' % gettempdir())
+def test_process_checksum_in_other_library():
+    import json
+
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder, other_library = helper.create_working_folder()
+
+    origin = os.path.join(folder, 'valid.txt')
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+    other = os.path.join(other_library, 'valid.txt')
+    shutil.copyfile(origin, other)
+    hash_db = os.path.join(other_library, 'hash.json')
+    with open(hash_db, 'w') as f:
+        json.dump({helper.checksum(origin): other}, f)
+
+    with open('%s/config.ini-other-libraries' % gettempdir(), 'w') as f:
+        f.write("""
+[Libraries]
+hash_dbs=%s
+        """ % hash_db)
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    filesystem = FileSystem()
+    with mock.patch('elodie.constants.library_filter', os.path.join(folder, 'libraries.bloom')):
+        skipped = filesystem.process_checksum(origin, False)
+        allowed = filesystem.process_checksum(origin, True)
+
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    shutil.rmtree(folder)
+    shutil.rmtree(other_library)
+
+    assert skipped is None, skipped
+    assert allowed is not None, allowed
+
+def test_process_file_link():
+    filesystem = FileSystem()
+    temporary_folder, folder = helper.create_working_folder()
+
+    origin = os.path.join(folder,'photo.jpg')
+    shutil.copyfile(helper.get_file('plain.jpg'), origin)
+
+    media = Photo(origin)
+    destination = filesystem.process_file(origin, temporary_folder, media, allowDuplicate=True, link=True)
+
+    origin_stat = os.stat(origin)
+    destination_stat = os.stat(destination)
+    db_path = Db().get_hash(helper.checksum(origin))
+
+    shutil.rmtree(folder)
+    shutil.rmtree(os.path.dirname(os.path.dirname(destination)))
+
+    assert origin_stat.st_ino == destination_stat.st_ino
+    assert origin_stat.st_nlink == 2, origin_stat.st_nlink
+    assert db_path == destination, db_path
+
+def test_move_file_across_devices_verifies_copy():
+    filesystem = FileSystem()
+    temporary_folder, folder = helper.create_working_folder()
+
+    origin = os.path.join(folder,'photo.jpg')
+    destination = os.path.join(folder,'moved.jpg')
+    shutil.copyfile(helper.get_file('plain.jpg'), origin)
+    checksum = helper.checksum(origin)
+
+    with mock.patch.object(filesystem, 'is_same_device', return_value=False):
+        status = filesystem.move_file(origin, destination, checksum)
+
+    origin_exists = os.path.exists(origin)
+    destination_checksum = helper.checksum(destination)
+    shutil.rmtree(folder)
+
+    assert status is True
+    assert origin_exists is False
+    assert destination_checksum == checksum
+
+def test_move_file_across_devices_keeps_original_on_mismatch():
+    filesystem = FileSystem()
+    temporary_folder, folder = helper.create_working_folder()
+
+    origin = os.path.join(folder,'photo.jpg')
+    destination = os.path.join(folder,'moved.jpg')
+    shutil.copyfile(helper.get_file('plain.jpg'), origin)
+
+    with mock.patch.object(filesystem, 'is_same_device', return_value=False):
+        status = filesystem.move_file(origin, destination, 'not-the-checksum')
+
+    origin_exists = os.path.exists(origin)
+    destination_exists = os.path.exists(destination)
+    shutil.rmtree(folder)
+
+    assert status is False
+    assert origin_exists is True
+    assert destination_exists is False
+
 def test_process_file_with_title():
     filesystem = FileSystem()
     temporary_folder, folder = helper.create_working_folder()
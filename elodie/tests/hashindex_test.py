@@ -0,0 +1,180 @@
+from __future__ import absolute_import
+# Project imports
+import hashlib
+import json
+import mock
+import os
+import sys
+import shutil
+from tempfile import mkdtemp
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+
+from . import helper
+from elodie.hashindex import HashIndex
+
+os.environ['TZ'] = 'GMT'
+
+def _checksum(i):
+    return hashlib.sha256(str(i).encode('ascii')).hexdigest()
+
+def _hash_db(entries):
+    folder = mkdtemp()
+    path = os.path.join(folder, 'hash.json')
+    with open(path, 'w') as f:
+        json.dump(entries, f)
+    return folder, path
+
+def test_indexes_existing_hash_db():
+    entries = dict((_checksum(i), '/library/%d.jpg' % i) for i in range(100))
+    entries['not a checksum'] = '/library/"quoted".jpg'
+    folder, path = _hash_db(entries)
+
+    index = HashIndex(path)
+    found = [index[checksum] for checksum in entries]
+    missing = _checksum(100) in index
+    items = dict(index.items())
+    indexed = os.path.isfile(index.index_path)
+    shutil.rmtree(folder)
+
+    assert found == list(entries.values()), found
+    assert missing is False
+    assert items == entries, items
+    assert indexed
+
+def test_changes_are_saved_on_write():
+    folder, path = _hash_db({_checksum(0): '/library/0.jpg'})
+
+    index = HashIndex(path)
+    index[_checksum(1)] = '/library/1.jpg'
+    index[_checksum(0)] = '/library/moved.jpg'
+    before_write = HashIndex(path).get(_checksum(1))
+    index.write()
+
+    reopened = HashIndex(path)
+    result = (reopened.get(_checksum(0)), reopened.get(_checksum(1)), len(reopened.tail))
+    # The moved entry is counted twice until the tail is merged.
+    counts = (reopened.record_count, len(reopened))
+    with open(path) as f:
+        saved = json.load(f)
+    shutil.rmtree(folder)
+
+    assert before_write is None, before_write
+    # Appended rather than rewritten.
+    assert result == ('/library/moved.jpg', '/library/1.jpg', 2), result
+    assert counts == (3, 2), counts
+    assert saved == {_checksum(0): '/library/moved.jpg', _checksum(1): '/library/1.jpg'}, saved
+
+def test_tail_is_merged_when_it_grows():
+    folder, path = _hash_db(dict((_checksum(i), '/library/%d.jpg' % i) for i in range(20)))
+
+    with mock.patch('elodie.hashindex.TAIL_SIZE', 5):
+        for i in range(20, 32):
+            index = HashIndex(path)
+            index[_checksum(i)] = '/library/%d.jpg' % i
+            index.write()
+
+    reopened = HashIndex(path)
+    result = [reopened.get(_checksum(i)) for i in range(32)]
+    sorted_count, tail = reopened.digests.count, len(reopened.tail)
+    shutil.rmtree(folder)
+
+    assert result == ['/library/%d.jpg' % i for i in range(32)], result
+    assert sorted_count + tail == 32, (sorted_count, tail)
+    assert tail <= 5, tail
+
+def test_reindexes_when_hash_db_changes():
+    folder, path = _hash_db({_checksum(0): '/library/0.jpg'})
+
+    index = HashIndex(path)
+    with open(path, 'w') as f:
+        json.dump({_checksum(1): '/library/renamed.jpg'}, f)
+    # Edits on top of a hash db written by someone else.
+    index[_checksum(2)] = '/library/2.jpg'
+    index.write()
+
+    with open(path) as f:
+        saved = json.load(f)
+    shutil.rmtree(folder)
+
+    assert saved == {_checksum(1): '/library/renamed.jpg', _checksum(2): '/library/2.jpg'}, saved
+
+def test_clear():
+    folder, path = _hash_db({_checksum(0): '/library/0.jpg'})
+
+    index = HashIndex(path)
+    index.clear()
+    index[_checksum(1)] = '/library/1.jpg'
+    cleared = _checksum(0) in index
+    index.write()
+
+    with open(path) as f:
+        saved = json.load(f)
+    shutil.rmtree(folder)
+
+    assert cleared is False
+    assert saved == {_checksum(1): '/library/1.jpg'}, saved
+
+def test_changes_since_mark():
+    folder, path = _hash_db({_checksum(0): '/library/0.jpg'})
+
+    index = HashIndex(path)
+    everything, mark = index.changes()
+    everything = list(everything)
+
+    index[_checksum(1)] = '/library/1.jpg'
+    index.write()
+    index[_checksum(0)] = '/library/moved.jpg'
+    index.write()
+    appended, next_mark = HashIndex(path).changes(mark)
+    nothing, next_mark = HashIndex(path).changes(next_mark)
+
+    # Rewriting hash.json replaces it, the mark is no good after that.
+    index.clear()
+    index[_checksum(2)] = '/library/2.jpg'
+    index.write()
+    rewritten, next_mark = HashIndex(path).changes(next_mark)
+    rewritten = list(rewritten)
+    shutil.rmtree(folder)
+
+    assert everything == [(_checksum(0), '/library/0.jpg')], everything
+    assert appended == [(_checksum(1), '/library/1.jpg'), (_checksum(0), '/library/moved.jpg')], appended
+    assert nothing == [], nothing
+    assert rewritten == [(_checksum(2), '/library/2.jpg')], rewritten
+
+def test_changes_after_several_rewrites():
+    folder, path = _hash_db({_checksum(0): '/library/0.jpg'})
+
+    everything, mark = HashIndex(path).changes()
+    with mock.patch('elodie.hashindex.TAIL_SIZE', 0):
+        # Rewrites swap hash.json between two inodes, an old mark can
+        #  match the inode and size of a later file.
+        for i in range(1, 5):
+            index = HashIndex(path)
+            index[_checksum(i)] = '/library/%d.jpg' % i
+            index.write()
+    rewritten, next_mark = HashIndex(path).changes(mark)
+    rewritten = sorted(rewritten)
+    nothing, next_mark = HashIndex(path).changes(next_mark)
+    shutil.rmtree(folder)
+
+    assert rewritten == sorted((_checksum(i), '/library/%d.jpg' % i) for i in range(5)), rewritten
+    assert nothing == [], nothing
+
+def test_changes_from_a_stale_offset():
+    folder, path = _hash_db({_checksum(0): '/library/0.jpg'})
+
+    index = HashIndex(path)
+    index.changes()
+    index[_checksum(1)] = '/library/1.jpg'
+    index.write()
+    index = HashIndex(path)
+    generation, size = index.changes()[1]
+    index[_checksum(2)] = '/library/2.jpg'
+    index.write()
+    # In the middle of an entry.
+    everything, mark = HashIndex(path).changes([generation, size - 10])
+    everything = sorted(everything)
+    shutil.rmtree(folder)
+
+    assert everything == sorted((_checksum(i), '/library/%d.jpg' % i) for i in range(3)), everything
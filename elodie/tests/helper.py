@@ -67,6 +67,24 @@ def get_file_path(name):
 def get_test_location():
     return (61.013710, 99.196656, 'Siberia')
 
+def make_image(path, seed, size=(640, 480), **save):
+    """Write a smooth random image. The photos in files/ are plain colors
+       so they all look alike to a perceptual hash.
+    """
+    import numpy
+    from PIL import Image
+
+    pixels = numpy.random.RandomState(seed).randint(0, 256, (6, 8, 3)).astype('uint8')
+    Image.fromarray(pixels).resize(size, Image.BICUBIC).save(path, **save)
+    return path
+
+def resized_copy(path, destination, scale=3, **save):
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.resize((image.size[0] // scale, image.size[1] // scale)).save(destination, **save)
+    return destination
+
 def populate_folder(number_of_files, include_invalid=False):
     folder = '%s/%s' % (tempfile.gettempdir(), random_string(10))
     os.makedirs(folder)
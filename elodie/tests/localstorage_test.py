@@ -1,14 +1,19 @@
 from __future__ import print_function
 from __future__ import absolute_import
 # Project imports
+import mock
 import os
+import shutil
 import sys
+from tempfile import gettempdir
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
 
 from . import helper
+from elodie.config import load_config
 from elodie.localstorage import Db
 from elodie import constants
+from nose.plugins.skip import SkipTest
 
 os.environ['TZ'] = 'GMT'
 
@@ -180,6 +185,94 @@ def test_checksum():
 
     assert checksum == 'd5eb755569ddbc8a664712d2d7d6e0fa1ddfcdb378475e4a6758dc38d5ea9a16', 'Checksum for plain.jpg did not match'
 
+def _checksum_xattr_config(mode):
+    with open('%s/config.ini-checksum-xattr' % gettempdir(), 'w') as f:
+        f.write("""
+[Checksum]
+xattr=%s
+        """ % mode)
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+def _xattr_file():
+    if not hasattr(os, 'getxattr'):
+        raise SkipTest('No extended attributes on this platform')
+    temporary_folder, folder = helper.create_working_folder()
+    path = os.path.join(folder, 'plain.jpg')
+    shutil.copyfile(helper.get_file('plain.jpg'), path)
+    try:
+        os.setxattr(path, 'user.elodie.test', b'1')
+    except OSError:
+        shutil.rmtree(folder)
+        raise SkipTest('No extended attributes on this filesystem')
+    return folder, path
+
+@mock.patch('elodie.config.config_file', '%s/config.ini-checksum-xattr' % gettempdir())
+def test_checksum_xattr_cached():
+    folder, path = _xattr_file()
+    _checksum_xattr_config('all')
+
+    db = Db()
+    checksum = db.checksum(path)
+    cached = os.getxattr(path, constants.checksum_xattr).decode('ascii')
+    # A cached checksum is trusted while the mtime and size match.
+    fake = '0' * 64 + cached[64:]
+    os.setxattr(path, constants.checksum_xattr, fake.encode('ascii'))
+    trusted = db.checksum(path)
+    rehashed = db.checksum(path, cached=False)
+    os.utime(path, (0, 0))
+    changed = db.checksum(path)
+
+    del load_config.config
+    shutil.rmtree(folder)
+
+    assert checksum == 'd5eb755569ddbc8a664712d2d7d6e0fa1ddfcdb378475e4a6758dc38d5ea9a16', checksum
+    assert cached.split(' ')[0] == checksum, cached
+    assert trusted == '0' * 64, trusted
+    assert rehashed == checksum, rehashed
+    assert changed == checksum, changed
+
+@mock.patch('elodie.config.config_file', '%s/config.ini-checksum-xattr' % gettempdir())
+def test_checksum_xattr_library_only():
+    folder, path = _xattr_file()
+    _checksum_xattr_config('library')
+
+    db = Db()
+    db.checksum(path)
+    source = constants.checksum_xattr in os.listxattr(path)
+    db.checksum(path, library=True)
+    library = constants.checksum_xattr in os.listxattr(path)
+
+    del load_config.config
+    shutil.rmtree(folder)
+
+    assert source is False
+    assert library is True
+
+@mock.patch('elodie.config.config_file', '%s/config.ini-checksum-xattr' % gettempdir())
+def test_checksum_xattr_corrupt_value():
+    folder, path = _xattr_file()
+    _checksum_xattr_config('all')
+
+    db = Db()
+    checksum = db.checksum(path)
+    os.setxattr(path, constants.checksum_xattr, b'abc x y')
+    rehashed = db.checksum(path)
+
+    del load_config.config
+    shutil.rmtree(folder)
+
+    assert rehashed == checksum, rehashed
+
+def test_checksum_xattr_off_by_default():
+    folder, path = _xattr_file()
+
+    Db().checksum(path, library=True)
+    written = constants.checksum_xattr in os.listxattr(path)
+    shutil.rmtree(folder)
+
+    assert written is False
+
 def test_add_location():
     db = Db()
 
@@ -12,6 +12,7 @@ sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirna
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
 
 import helper
+import mock
 from elodie.media.media import Media
 from elodie.media.video import Video
 
@@ -79,6 +80,18 @@ def test_get_exiftool_attributes():
     assert exif is not None, exif
     assert exif is not False, exif
 
+def test_get_exiftool_attributes_non_quicktime():
+    temporary_folder, folder = helper.create_working_folder()
+    origin = '%s/video.avi' % folder
+    shutil.copyfile(helper.get_file('video.mov'), origin)
+
+    video = Video(origin)
+    with mock.patch('elodie.media.video.QuickTimeReader') as reader:
+        video.get_exiftool_attributes()
+    shutil.rmtree(folder)
+
+    assert not reader.called
+
 def test_is_valid():
     video = Video(helper.get_file('video.mov'))
 
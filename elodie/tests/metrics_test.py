@@ -0,0 +1,114 @@
+# Project imports
+import os
+import sys
+import time
+from tempfile import mkstemp
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+
+from . import helper
+from elodie import trace
+from elodie.exif_reader import ExifReader, reset_window_stats
+from elodie.metrics import MetricsWriter
+from elodie.result import Result
+from elodie.session_log import SessionLogger
+
+def _metrics_file():
+    fd, path = mkstemp()
+    os.close(fd)
+    return path
+
+def _read(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+def test_render_counters():
+    result = Result()
+    result.append(('a', '/dest/a'), 100)
+    result.append(('b', 'SKIPPED'))
+    result.append(('c', None))
+    result.append(('d', '/dest/d'), 50)
+    metrics = MetricsWriter(_metrics_file(), 'import', result)
+    metrics.start_time = time.time()
+    output = metrics.render()
+
+    assert 'elodie_files_total{command="import",status="success"} 2' in output, output
+    assert 'elodie_files_total{command="import",status="error"} 1' in output, output
+    assert 'elodie_files_total{command="import",status="skipped"} 1' in output, output
+    assert 'elodie_bytes_total{command="import"} 150' in output, output
+    assert 'elodie_duplicate_ratio{command="import"} 0.25' in output, output
+    assert 'elodie_run_completed{command="import"} 0' in output, output
+    assert '# TYPE elodie_files_total counter' in output, output
+
+def test_render_filtered_not_in_duplicate_ratio():
+    result = Result()
+    result.append(('a', '/dest/a'), 100)
+    result.append(('b', 'SKIPPED'))
+    result.append(('c', 'FILTERED'))
+    result.append(('d', 'FILTERED'))
+    metrics = MetricsWriter(_metrics_file(), 'import', result)
+    metrics.start_time = time.time()
+    output = metrics.render()
+
+    assert 'elodie_files_total{command="import",status="filtered"} 2' in output, output
+    assert 'elodie_duplicate_ratio{command="import"} 0.5' in output, output
+
+def test_render_session_errors():
+    session_logger = SessionLogger()
+    session_logger.log_error('failed')
+    metrics = MetricsWriter(_metrics_file(), 'import', Result(), session_logger)
+    metrics.start_time = time.time()
+    output = metrics.render()
+    session_logger.finalize_session()
+    os.remove(session_logger.log_file)
+
+    assert 'elodie_session_errors_total{command="import"} 1' in output, output
+
+def test_render_exif_window_stats():
+    reset_window_stats()
+    ExifReader(header_window=64 * 1024).get_metadata(helper.get_file('with-location.jpg'))
+    ExifReader(header_window=16).get_metadata(helper.get_file('with-location.jpg'))
+    metrics = MetricsWriter(_metrics_file(), 'import', Result())
+    metrics.start_time = time.time()
+    output = metrics.render()
+    reset_window_stats()
+
+    assert 'elodie_exif_window_requests_total{command="import",format="jpg",result="window"} 1' in output, output
+    assert 'elodie_exif_window_requests_total{command="import",format="jpg",result="full"} 1' in output, output
+    assert 'elodie_exif_window_hit_ratio{command="import",format="jpg"} 0.5' in output, output
+
+def test_observe_histogram():
+    metrics = MetricsWriter(_metrics_file(), 'verify', Result())
+    metrics.buckets = (0.01, 0.1)
+    metrics.start_time = time.time()
+    metrics.observe('db.checksum', 0.005)
+    metrics.observe('db.checksum', 0.05)
+    metrics.observe('db.checksum', 5)
+    output = metrics.render()
+
+    assert 'elodie_stage_duration_seconds_bucket{command="verify",stage="db.checksum",le="0.01"} 1' in output, output
+    assert 'elodie_stage_duration_seconds_bucket{command="verify",stage="db.checksum",le="0.1"} 2' in output, output
+    assert 'elodie_stage_duration_seconds_bucket{command="verify",stage="db.checksum",le="+Inf"} 3' in output, output
+    assert 'elodie_stage_duration_seconds_count{command="verify",stage="db.checksum"} 3' in output, output
+
+def test_start_and_finish():
+    path = _metrics_file()
+    result = Result()
+    metrics = MetricsWriter(path, 'generate-db', result, interval=0.01)
+    metrics.start()
+    with trace.span('db.checksum'):
+        pass
+    result.append(('a', True), 10)
+    time.sleep(0.05)
+    during = _read(path)
+    metrics.finish()
+    after = _read(path)
+    tracer = trace.tracer
+    os.remove(path)
+
+    assert 'elodie_files_total{command="generate-db",status="success"} 1' in during, during
+    assert 'elodie_run_completed{command="generate-db"} 0' in during, during
+    assert 'elodie_run_completed{command="generate-db"} 1' in after, after
+    assert 'stage="db.checksum",le="+Inf"} 1' in after, after
+    assert tracer is None, tracer
+    assert not [name for name in os.listdir(os.path.dirname(path)) if name.startswith(os.path.basename(path) + '.')]
@@ -1,8 +1,14 @@
 from __future__ import absolute_import
 # Project imports
+import json
 import mock
 import os
+import shutil
 import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
 from tempfile import gettempdir
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
@@ -10,6 +16,7 @@ sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.realp
 
 import helper
 from elodie.config import load_config
+from elodie.plugins.googlephotos import googlephotos
 from elodie.plugins.googlephotos.googlephotos import GooglePhotos
 from elodie.media.audio import Audio
 from elodie.media.photo import Photo
@@ -33,6 +40,91 @@ config_string_fmt = config_string.format(
 setup_module = helper.setup_module
 teardown_module = helper.teardown_module
 
+class StubPhotosApi(ThreadingMixIn, HTTPServer):
+    """Local stand in for the upload and batchCreate endpoints of the
+       Google Photos API.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubPhotosApiHandler)
+        self.lock = threading.Lock()
+        self.uploads = []
+        self.batch_sizes = []
+        self.running = 0
+        self.max_running = 0
+        self.upload_delay = 0
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def url(self, path):
+        return 'http://127.0.0.1:%d%s' % (self.server_address[1], path)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class StubPhotosApiHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path == '/v1/uploads':
+            self.upload(body)
+        elif self.path == '/v1/mediaItems:batchCreate':
+            self.batch_create(body)
+        else:
+            self.respond(404, b'')
+
+    def upload(self, body):
+        server = self.server
+        with server.lock:
+            server.running += 1
+            server.max_running = max(server.max_running, server.running)
+        time.sleep(server.upload_delay)
+        with server.lock:
+            server.running -= 1
+            server.uploads.append(self.headers['X-Goog-Upload-File-Name'])
+        if not body:
+            self.respond(400, b'')
+            return
+        self.respond(200, ('token-%s' % self.headers['X-Goog-Upload-File-Name']).encode())
+
+    def batch_create(self, body):
+        items = json.loads(body.decode())['newMediaItems']
+        with self.server.lock:
+            self.server.batch_sizes.append(len(items))
+        results = [
+            {'uploadToken': item['simpleMediaItem']['uploadToken'], 'status': {'message': 'Success'}}
+            for item in items
+        ]
+        self.respond(200, json.dumps({'newMediaItemResults': results}).encode())
+
+    def respond(self, code, content):
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+def _googlephotos_with_stub(stub):
+    # Tokens without an expiry are refreshed against Google before use so
+    #  the stub gets credentials which stay valid.
+    with open(auth_file, 'r') as f:
+        credentials = json.loads(f.read())
+    credentials['expiry'] = '2999-01-01T00:00:00Z'
+    stub_auth_file = '%s/googlephotos-stub-auth.json' % gettempdir()
+    with open(stub_auth_file, 'w') as f:
+        f.write(json.dumps(credentials))
+
+    gp = GooglePhotos()
+    gp.auth_file = stub_auth_file
+    gp.upload_url = stub.url('/v1/uploads')
+    gp.media_create_url = stub.url('/v1/mediaItems:batchCreate')
+    return gp
+
 @mock.patch('elodie.config.config_file', '%s/config.ini-googlephotos-set-session' % gettempdir())
 def test_googlephotos_set_session():
     with open('%s/config.ini-googlephotos-set-session' % gettempdir(), 'w') as f:
@@ -89,6 +181,36 @@ def test_googlephotos_after_unsupported():
 
     assert db_row == None, db_row
 
+@mock.patch('elodie.config.config_file', '%s/config.ini-googlephotos-after-batch' % gettempdir())
+def test_googlephotos_after_batch():
+    with open('%s/config.ini-googlephotos-after-batch' % gettempdir(), 'w') as f:
+        f.write(config_string_fmt)
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    photo_metadata = Photo(helper.get_file('plain.jpg')).get_metadata()
+    photo_metadata['original_name'] = 'photo'
+    audio_metadata = Audio(helper.get_file('audio.m4a')).get_metadata()
+    audio_metadata['original_name'] = 'audio'
+    photo_path = '/batch/photo-%s.jpg' % helper.random_string(10)
+    audio_path = '/batch/audio-%s.m4a' % helper.random_string(10)
+    gp = GooglePhotos()
+    with mock.patch.object(gp.db, 'set_many', wraps=gp.db.set_many) as set_many:
+        gp.after_batch([
+            {'file_path': '', 'destination_folder': '', 'final_file_path': photo_path, 'metadata': photo_metadata},
+            {'file_path': '', 'destination_folder': '', 'final_file_path': audio_path, 'metadata': audio_metadata}
+        ])
+    photo_row = gp.db.get(photo_path)
+    audio_row = gp.db.get(audio_path)
+    gp.db.delete(photo_path)
+
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    assert set_many.call_count == 1, set_many.call_count
+    assert photo_row == 'photo', photo_row
+    assert audio_row is None, audio_row
+
 @mock.patch('elodie.config.config_file', '%s/config.ini-googlephotos-upload' % gettempdir())
 def test_googlephotos_upload():
     with open('%s/config.ini-googlephotos-upload' % gettempdir(), 'w') as f:
@@ -96,15 +218,19 @@ def test_googlephotos_upload():
     if hasattr(load_config, 'config'):
         del load_config.config
 
-    gp = GooglePhotos()
+    stub = StubPhotosApi()
+    gp = _googlephotos_with_stub(stub)
 
     if hasattr(load_config, 'config'):
         del load_config.config
 
     gp.set_session()
     status = gp.upload(helper.get_file('plain.jpg'))
+    stub.stop()
     
     assert status is not None, status
+    assert stub.uploads == ['plain.jpg'], stub.uploads
+    assert stub.batch_sizes == [1], stub.batch_sizes
 
 @mock.patch('elodie.config.config_file', '%s/config.ini-googlephotos-upload-session-fail' % gettempdir())
 def test_googlephotos_upload_session_fail():
@@ -130,15 +256,18 @@ def test_googlephotos_upload_invalid_empty():
     if hasattr(load_config, 'config'):
         del load_config.config
 
-    gp = GooglePhotos()
+    stub = StubPhotosApi()
+    gp = _googlephotos_with_stub(stub)
 
     if hasattr(load_config, 'config'):
         del load_config.config
 
     gp.set_session()
     status = gp.upload(helper.get_file('invalid.jpg'))
+    stub.stop()
     
     assert status is None, status
+    assert stub.batch_sizes == [], stub.batch_sizes
 
 @mock.patch('elodie.config.config_file', '%s/config.ini-googlephotos-upload-dne' % gettempdir())
 def test_googlephotos_upload_dne():
@@ -168,7 +297,9 @@ def test_googlephotos_batch():
     sample_metadata = sample_photo.get_metadata()
     sample_metadata['original_name'] = 'foobar'
     final_file_path = helper.get_file('plain.jpg')
-    gp = GooglePhotos()
+    stub = StubPhotosApi()
+    gp = _googlephotos_with_stub(stub)
+    gp.db.delete_many(list(gp.db.get_all()))
     gp.after('', '', final_file_path, sample_metadata)
     db_row = gp.db.get(final_file_path)
     assert db_row == 'foobar', db_row
@@ -186,5 +317,98 @@ def test_googlephotos_batch():
         
     gp.set_session()
     status = gp.upload(helper.get_file('invalid.jpg'))
+    stub.stop()
     
     assert status is None, status
+
+@mock.patch('elodie.config.config_file', '%s/config.ini-googlephotos-batch-concurrent' % gettempdir())
+def test_googlephotos_batch_concurrent_and_grouped():
+    with open('%s/config.ini-googlephotos-batch-concurrent' % gettempdir(), 'w') as f:
+        f.write(config_string_fmt + 'upload_workers=4\n')
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    temporary_folder, folder = helper.create_working_folder()
+    files = []
+    for i in range(120):
+        file_path = '%s/photo-%03d.jpg' % (folder, i)
+        with open(file_path, 'wb') as f:
+            f.write(b'photo %d' % i)
+        files.append(file_path)
+    files.append(helper.get_file('invalid.jpg'))
+
+    stub = StubPhotosApi()
+    stub.upload_delay = 0.01
+    gp = _googlephotos_with_stub(stub)
+    gp.db.delete_many(list(gp.db.get_all()))
+    gp.db.set_many({file_path: 'foobar' for file_path in files})
+
+    with mock.patch('elodie.plugins.googlephotos.googlephotos.AuthorizedSession',
+                    wraps=googlephotos.AuthorizedSession) as authorized_session:
+        status, count = gp.batch()
+    remaining = gp.db.get_all()
+    gp.db.delete_many(list(remaining))
+    stub.stop()
+    shutil.rmtree(folder)
+
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    assert status == False, status
+    assert count == 120, count
+    assert list(remaining) == [helper.get_file('invalid.jpg')], remaining
+    assert sorted(stub.batch_sizes) == [20, 50, 50], stub.batch_sizes
+    assert authorized_session.call_count == 1, authorized_session.call_count
+    assert 1 < stub.max_running <= 4, stub.max_running
+
+@mock.patch('elodie.config.config_file', '%s/config.ini-googlephotos-batch-unreadable' % gettempdir())
+def test_googlephotos_batch_unreadable_file():
+    with open('%s/config.ini-googlephotos-batch-unreadable' % gettempdir(), 'w') as f:
+        f.write(config_string_fmt)
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    temporary_folder, folder = helper.create_working_folder()
+    files = []
+    for i in range(3):
+        file_path = '%s/photo-%d.jpg' % (folder, i)
+        with open(file_path, 'wb') as f:
+            f.write(b'photo %d' % i)
+        files.append(file_path)
+    # Removed between the check that it exists and the upload.
+    missing = '%s/removed.jpg' % folder
+
+    stub = StubPhotosApi()
+    gp = _googlephotos_with_stub(stub)
+    gp.db.delete_many(list(gp.db.get_all()))
+    gp.db.set_many({file_path: 'foobar' for file_path in files + [missing]})
+
+    with mock.patch('elodie.plugins.googlephotos.googlephotos.isfile', return_value=True):
+        status, count = gp.batch()
+    remaining = list(gp.db.get_all())
+    gp.db.delete_many(remaining)
+    stub.stop()
+    shutil.rmtree(folder)
+
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    assert status == False, status
+    assert count == 3, count
+    assert remaining == [missing], remaining
+    assert stub.batch_sizes == [3], stub.batch_sizes
+
+@mock.patch('elodie.config.config_file', '%s/config.ini-googlephotos-upload-workers' % gettempdir())
+def test_googlephotos_invalid_upload_workers():
+    upload_workers = []
+    for value in ('abc', '0', '8'):
+        with open('%s/config.ini-googlephotos-upload-workers' % gettempdir(), 'w') as f:
+            f.write(config_string_fmt.rstrip() + '\nupload_workers=%s\n' % value)
+        if hasattr(load_config, 'config'):
+            del load_config.config
+        upload_workers.append(googlephotos.GooglePhotos().upload_workers)
+
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    assert upload_workers == [4, 4, 8], upload_workers
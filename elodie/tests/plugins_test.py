@@ -3,13 +3,14 @@ from __future__ import absolute_import
 import mock
 import os
 import sys
+import threading
 from tempfile import gettempdir
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
 
 from . import helper
 from elodie.config import load_config
-from elodie.plugins.plugins import Plugins, PluginBase, PluginDb
+from elodie.plugins.plugins import ElodiePluginError, Plugins, PluginBase, PluginDb
 
 @mock.patch('elodie.config.config_file', '%s/config.ini-load-plugins-unset-backwards-compat' % gettempdir())
 def test_load_plugins_unset_backwards_compat():
@@ -253,3 +254,171 @@ def test_db_get_all():
     all_rows = db.get_all()
 
     assert all_rows == {'a': '1', 'b': '2', 'c': '3', 'd': '4'}, all_rows
+
+def test_db_set_many_then_delete_many():
+    db = PluginDb('foobar')
+    try:
+        os.remove(db.db_file)
+    except OSError:
+        pass
+    db = PluginDb('foobar')
+    db.set_many({'a': '1', 'b': {'nested': [1, 2]}, 'c': '3'})
+    db.delete_many(['a', 'c', 'does-not-exist'])
+    all_rows = db.get_all()
+
+    assert all_rows == {'b': {'nested': [1, 2]}}, all_rows
+
+def test_db_migrates_json_file():
+    db = PluginDb('foobar')
+    try:
+        os.remove(db.db_file)
+    except OSError:
+        pass
+    with open(db.legacy_db_file, 'w') as f:
+        f.write('{"a": "1", "b": "2"}')
+
+    db = PluginDb('foobar')
+    all_rows = db.get_all()
+    migrated = os.path.isfile('%s.migrated' % db.legacy_db_file)
+    legacy_exists = os.path.isfile(db.legacy_db_file)
+    os.remove('%s.migrated' % db.legacy_db_file)
+
+    assert all_rows == {'a': '1', 'b': '2'}, all_rows
+    assert migrated == True, migrated
+    assert legacy_exists == False, legacy_exists
+
+class AsyncAfterPlugin(PluginBase):
+    __name__ = 'AsyncAfterPlugin'
+    async_after = True
+    max_concurrency = 2
+
+    def __init__(self, release, fail=False):
+        self.release = release
+        self.fail = fail
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.calls = []
+
+    def after(self, file_path, destination_folder, final_file_path, metadata):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        self.release.wait(5)
+        with self.lock:
+            self.running -= 1
+            self.calls.append(final_file_path)
+        if self.fail:
+            raise Exception('upload failed')
+
+def _plugins_with(plugin):
+    plugins = Plugins()
+    plugins.loaded = True
+    plugins.plugins = [plugin.__name__]
+    plugins.classes = {plugin.__name__: plugin}
+    return plugins
+
+def test_run_all_after_async_does_not_block():
+    release = threading.Event()
+    plugin = AsyncAfterPlugin(release)
+    plugins = _plugins_with(plugin)
+
+    statuses = [plugins.run_all_after('', '', '/dest/%d.jpg' % i, {}) for i in range(5)]
+    calls_before_release = list(plugin.calls)
+    release.set()
+    errors = plugins.drain()
+
+    assert statuses == [True] * 5, statuses
+    assert calls_before_release == [], calls_before_release
+    assert len(plugin.calls) == 5, plugin.calls
+    assert plugin.max_running <= 2, plugin.max_running
+    assert errors == [], errors
+    assert plugins.executors == {}, plugins.executors
+
+def test_run_all_after_async_errors_returned_by_drain():
+    release = threading.Event()
+    release.set()
+    plugins = _plugins_with(AsyncAfterPlugin(release, fail=True))
+
+    status = plugins.run_all_after('', '', '/dest/a.jpg', {})
+    errors = plugins.drain()
+
+    assert status == True, status
+    assert errors == [{'plugin': 'AsyncAfterPlugin', 'file': '/dest/a.jpg', 'message': 'upload failed'}], errors
+    assert plugins.drain() == [], 'errors should be cleared after drain'
+
+class BatchPlugin(PluginBase):
+    __name__ = 'BatchPlugin'
+
+    def __init__(self, reject=False):
+        self.reject = reject
+        self.before_batches = []
+        self.after_batches = []
+
+    def before_batch(self, records):
+        self.before_batches.append([record['file_path'] for record in records])
+        if self.reject:
+            raise ElodiePluginError('rejected')
+
+    def after_batch(self, records):
+        self.after_batches.append([record['final_file_path'] for record in records])
+
+class PerFilePlugin(PluginBase):
+    __name__ = 'PerFilePlugin'
+
+    def __init__(self):
+        self.records = []
+
+    def after(self, file_path, destination_folder, final_file_path, metadata):
+        self.records.append(final_file_path)
+
+def test_after_batch_receives_chunks():
+    plugin = BatchPlugin()
+    plugins = _plugins_with(plugin)
+
+    with mock.patch('elodie.plugins.plugins.plugin_batch_size', 2):
+        for i in range(5):
+            plugins.run_all_after('', '', '/dest/%d.jpg' % i, {})
+        before_drain = list(plugin.after_batches)
+        errors = plugins.drain()
+
+    assert before_drain == [['/dest/0.jpg', '/dest/1.jpg'], ['/dest/2.jpg', '/dest/3.jpg']], before_drain
+    assert plugin.after_batches[-1] == ['/dest/4.jpg'], plugin.after_batches
+    assert errors == [], errors
+
+def test_after_batch_default_calls_after():
+    plugin = PerFilePlugin()
+    plugin.after_batch([
+        {'file_path': '', 'destination_folder': '', 'final_file_path': '/dest/a.jpg', 'metadata': {}},
+        {'file_path': '', 'destination_folder': '', 'final_file_path': '/dest/b.jpg', 'metadata': {}}
+    ])
+
+    assert plugin.records == ['/dest/a.jpg', '/dest/b.jpg'], plugin.records
+
+def test_run_all_after_per_file_plugin_not_buffered():
+    plugin = PerFilePlugin()
+    plugins = _plugins_with(plugin)
+    plugins.run_all_after('', '', '/dest/a.jpg', {})
+
+    assert plugin.records == ['/dest/a.jpg'], plugin.records
+    assert plugins.after_records == {}, plugins.after_records
+
+def test_run_all_before_batch_skips_per_file_call():
+    plugin = BatchPlugin()
+    plugins = _plugins_with(plugin)
+
+    with mock.patch('elodie.plugins.plugins.plugin_batch_size', 2):
+        plugins.run_all_before_batch(['/a.jpg', '/b.jpg', '/c.jpg'], '/dest')
+    status = plugins.run_all_before('/b.jpg', '/dest')
+    status_unbatched = plugins.run_all_before('/d.jpg', '/dest')
+
+    assert plugin.before_batches == [['/a.jpg', '/b.jpg'], ['/c.jpg'], ['/d.jpg']], plugin.before_batches
+    assert status == True, status
+    assert status_unbatched == True, status_unbatched
+
+def test_run_all_before_batch_rejects_chunk():
+    plugins = _plugins_with(BatchPlugin(reject=True))
+    plugins.run_all_before_batch(['/a.jpg', '/b.jpg'], '/dest')
+
+    assert plugins.run_all_before('/a.jpg', '/dest') == False
+    assert plugins.run_all_before('/b.jpg', '/dest') == False
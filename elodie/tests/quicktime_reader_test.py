@@ -0,0 +1,103 @@
+# Project imports
+import mock
+import os
+import struct
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.realpath(__file__))))
+
+import helper
+from elodie.quicktime_reader import QuickTimeReader
+
+os.environ['TZ'] = 'GMT'
+
+
+class CountingFile(object):
+    """File wrapper which counts the bytes read through it."""
+
+    def __init__(self, f):
+        self.f = f
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.f.close()
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+
+def _box(box_type, payload):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def test_get_metadata_video():
+    metadata = QuickTimeReader().get_metadata(helper.get_file('video.mov'))
+
+    assert metadata['QuickTime:CreationDate'] == '2015:01:19 12:45:11-08:00', metadata
+    assert metadata['QuickTime:Make'] == 'Apple', metadata
+    assert metadata['QuickTime:Model'] == 'iPhone 5', metadata
+    assert helper.isclose(metadata['Composite:GPSLatitude'], 38.1893), metadata
+    assert helper.isclose(metadata['Composite:GPSLongitude'], -119.9558), metadata
+
+def test_get_metadata_audio():
+    metadata = QuickTimeReader().get_metadata(helper.get_file('audio.m4a'))
+
+    assert metadata['QuickTime:CreateDate'] == '2016:01:04 05:28:15', metadata
+    assert metadata['QuickTime:DisplayName'] == 'Test Audio', metadata
+    assert helper.isclose(metadata['Composite:GPSLatitude'], 29.758938), metadata
+    assert helper.isclose(metadata['Composite:GPSLongitude'], -95.3677), metadata
+
+def test_get_metadata_non_quicktime_file():
+    metadata = QuickTimeReader().get_metadata(helper.get_file('plain.jpg'))
+
+    assert metadata == {}, metadata
+
+def test_get_metadata_missing_file():
+    metadata = QuickTimeReader().get_metadata('/does/not/exist.mov')
+
+    assert metadata == {}, metadata
+
+def test_get_metadata_skips_mdat():
+    # A 64 bit mdat of 4GB placed before moov, stored as a sparse file.
+    mdat_size = 4 * 1024 * 1024 * 1024
+    udta = _box(b'udta', _box(b'\xa9xyz', struct.pack('>HH', 17, 0) + b'+12.3456-045.6789'))
+    _, path = tempfile.mkstemp(suffix='.mp4')
+    try:
+        with open(path, 'wb') as f:
+            f.write(_box(b'ftyp', b'isom\x00\x00\x00\x00'))
+            f.write(struct.pack('>I4sQ', 1, b'mdat', mdat_size))
+            f.seek(mdat_size - 16, 1)
+            f.write(_box(b'moov', udta))
+
+        real_open = open
+        counters = []
+        def counting_open(*args, **kwargs):
+            counter = CountingFile(real_open(*args, **kwargs))
+            counters.append(counter)
+            return counter
+
+        with mock.patch('elodie.quicktime_reader.open', counting_open, create=True):
+            metadata = QuickTimeReader().get_metadata(path)
+    finally:
+        os.remove(path)
+
+    assert helper.isclose(metadata['Composite:GPSLatitude'], 12.3456), metadata
+    assert helper.isclose(metadata['Composite:GPSLongitude'], -45.6789), metadata
+    assert counters[0].bytes_read < 4096, counters[0].bytes_read
+
+def test_parse_iso6709_degrees_minutes():
+    coordinates = QuickTimeReader()._parse_iso6709('+4030.0-07400.0/')
+
+    assert helper.isclose(coordinates[0], 40.5), coordinates
+    assert helper.isclose(coordinates[1], -74.0), coordinates
+    assert coordinates[2] is None, coordinates
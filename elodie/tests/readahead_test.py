@@ -0,0 +1,126 @@
+from __future__ import absolute_import
+# Project imports
+import mock
+import os
+import sys
+import shutil
+from tempfile import gettempdir, mkdtemp
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+
+from nose.plugins.skip import SkipTest
+from elodie import constants
+from elodie.config import load_config
+from elodie.readahead import Readahead, drop, get_drop_cache, get_readahead_files, get_readahead_method
+
+os.environ['TZ'] = 'GMT'
+
+def _files(count):
+    folder = mkdtemp()
+    files = []
+    for i in range(count):
+        path = os.path.join(folder, '%d.jpg' % i)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 1000)
+        files.append(path)
+    return folder, files
+
+def test_started_reads_ahead_once():
+    folder, files = _files(6)
+    readahead = Readahead(files, depth=2, method='fadvise', drop_cache=False)
+    with mock.patch.object(Readahead, '_prefetch') as prefetch:
+        readahead.started(files[0])
+        readahead.started(files[1])
+        # Parallel workers start files out of order.
+        readahead.started(files[0])
+        readahead.started(files[4])
+        readahead.started('/not/queued.jpg')
+        prefetched = [call[0][0] for call in prefetch.call_args_list]
+    shutil.rmtree(folder)
+
+    assert prefetched == [1, 2, 3, 5], prefetched
+
+def test_started_with_depth_zero():
+    folder, files = _files(3)
+    readahead = Readahead(files, depth=0, method='fadvise', drop_cache=False)
+    with mock.patch.object(Readahead, '_prefetch') as prefetch:
+        readahead.started(files[0])
+    shutil.rmtree(folder)
+
+    assert not prefetch.called
+
+def test_fadvise_willneed():
+    if not hasattr(os, 'posix_fadvise'):
+        raise SkipTest('posix_fadvise is not available')
+
+    folder, files = _files(3)
+    readahead = Readahead(files, depth=1, method='fadvise', drop_cache=False)
+    with mock.patch('os.posix_fadvise') as posix_fadvise:
+        readahead.started(files[0])
+    shutil.rmtree(folder)
+
+    assert posix_fadvise.call_count == 1, posix_fadvise.call_args_list
+    assert posix_fadvise.call_args[0][3] == os.POSIX_FADV_WILLNEED
+
+def test_read_in_background_skips_started_files():
+    folder, files = _files(4)
+    readahead = Readahead(files, depth=3, method='read', drop_cache=False)
+    read = []
+    with mock.patch.object(Readahead, '_read', side_effect=lambda path, buffer: read.append(path)):
+        readahead.started_index = 1
+        for index in (1, 2, 3):
+            readahead._prefetch(index)
+        readahead.wait()
+    shutil.rmtree(folder)
+
+    assert read == [files[2], files[3]], read
+    assert readahead.thread is None
+
+def test_finished_drops_source_and_copy():
+    if not hasattr(os, 'posix_fadvise'):
+        raise SkipTest('posix_fadvise is not available')
+
+    folder, files = _files(2)
+    with mock.patch('os.posix_fadvise') as posix_fadvise:
+        Readahead(files, drop_cache=False).finished(files[0], files[1])
+        kept = posix_fadvise.call_count
+        Readahead(files, drop_cache=True).finished(files[0], files[1])
+    missing = drop(os.path.join(folder, 'missing.jpg'))
+    shutil.rmtree(folder)
+
+    assert kept == 0, kept
+    assert posix_fadvise.call_count == 2, posix_fadvise.call_args_list
+    assert all(call[0][3] == os.POSIX_FADV_DONTNEED for call in posix_fadvise.call_args_list)
+    assert missing is False
+
+@mock.patch('elodie.config.config_file', '%s/config.ini-readahead' % gettempdir())
+def test_readahead_config():
+    with open('%s/config.ini-readahead' % gettempdir(), 'w') as f:
+        f.write("""
+[Readahead]
+files=16
+method=read
+drop_cache=true
+        """)
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    files = get_readahead_files()
+    method = get_readahead_method()
+    drop_cache = get_drop_cache()
+
+    with open('%s/config.ini-readahead' % gettempdir(), 'w') as f:
+        f.write("""
+[Readahead]
+files=many
+drop_cache=maybe
+        """)
+    del load_config.config
+
+    invalid = (get_readahead_files(), get_drop_cache())
+
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    assert (files, method, drop_cache) == (16, 'read', True), (files, method, drop_cache)
+    assert invalid == (constants.readahead_files, False), invalid
@@ -0,0 +1,206 @@
+from __future__ import absolute_import
+# Project imports
+import json
+import mock
+import os
+import sys
+import shutil
+from tempfile import gettempdir
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+
+from . import helper
+from elodie.catalog import Catalog
+from elodie.config import load_config
+from elodie.filesystem import FileSystem
+from elodie.localstorage import Db
+from elodie.media.text import Text
+from elodie.relayout import Relayout, record_metadata, record_place
+
+os.environ['TZ'] = 'GMT'
+
+def _import(name='valid.txt'):
+    """Import a text file into a new library with its own catalog."""
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder, library = helper.create_working_folder()
+    catalog = Catalog(os.path.join(folder, 'catalog.db'))
+
+    origin = os.path.join(folder, name)
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+
+    # Imports use the default layout, relayout the one in the test's config.
+    if hasattr(load_config, 'config'):
+        del load_config.config
+    with mock.patch('elodie.config.config_file', '%s/config.ini-missing' % gettempdir()):
+        filesystem = FileSystem()
+        filesystem._catalog = catalog
+        destination = filesystem.process_file(origin, library, Text(origin), allowDuplicate=True)
+    return folder, library, catalog, destination
+
+def _relayout(library, catalog, journal_file=None):
+    if hasattr(load_config, 'config'):
+        del load_config.config
+    filesystem = FileSystem()
+    filesystem._catalog = catalog
+    return Relayout(filesystem, library, journal_file)
+
+def _write_config(name):
+    with open('%s/%s' % (gettempdir(), name), 'w') as f:
+        f.write("""
+[Directory]
+year=%Y
+full_path=%year/%city
+
+[File]
+date=%Y%m%d
+name=%date-%title.%extension
+        """)
+
+def test_record_metadata():
+    folder, library, catalog, destination = _import()
+    record = catalog.get(destination)
+    metadata = Text(destination).get_metadata()
+    rebuilt = record_metadata(record)
+    place = record_place(record)
+    catalog.close()
+
+    shutil.rmtree(folder)
+    shutil.rmtree(library)
+
+    assert rebuilt['date_taken'][0:6] == metadata['date_taken'][0:6], rebuilt['date_taken']
+    assert rebuilt['base_name'] == 'valid', rebuilt['base_name']
+    assert rebuilt['extension'] == 'txt', rebuilt['extension']
+    assert rebuilt['title'] == metadata['title'], rebuilt['title']
+    assert rebuilt['latitude'] == float(metadata['latitude']), rebuilt['latitude']
+    assert place['default'] == record['place'], place
+
+@mock.patch('elodie.config.config_file', '%s/config.ini-relayout' % gettempdir())
+def test_relayout_moves_files():
+    _write_config('config.ini-relayout')
+    folder, library, catalog, destination = _import()
+    checksum = catalog.get(destination)['checksum']
+    journal_file = os.path.join(folder, 'relayout.journal')
+
+    relayout = _relayout(library, catalog, journal_file)
+    # Places come from the catalog, nothing should be geocoded.
+    with mock.patch('elodie.filesystem.geolocation.place_name') as place_name:
+        moves = relayout.plan()
+        relayout.execute(moves)
+    city = catalog.get(moves[0][1])['city']
+    new_path = os.path.join(library, '2016', city, '20160407-sample-title.txt')
+    exists = os.path.isfile(new_path)
+    old_directory_exists = os.path.isdir(os.path.dirname(destination))
+    journal_exists = os.path.isfile(journal_file)
+    hash_path = Db().get_hash(checksum)
+    old_record = catalog.get(destination)
+    replanned = _relayout(library, catalog, journal_file)
+    remaining = replanned.plan()
+    catalog.close()
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    shutil.rmtree(folder)
+    shutil.rmtree(library)
+
+    assert place_name.called is False
+    assert moves == [(destination, new_path, checksum)], moves
+    assert exists, new_path
+    assert old_directory_exists is False, destination
+    assert journal_exists is False
+    assert hash_path == new_path, hash_path
+    assert old_record is None, old_record
+    assert relayout.moved == 1, relayout.moved
+    assert remaining == [] and replanned.unchanged == 1, remaining
+
+@mock.patch('elodie.config.config_file', '%s/config.ini-relayout-backfill' % gettempdir())
+def test_relayout_catalogs_files_only_in_hash_db():
+    _write_config('config.ini-relayout-backfill')
+    temporary_folder, folder = helper.create_working_folder()
+    temporary_folder, library = helper.create_working_folder()
+    catalog = Catalog(os.path.join(folder, 'catalog.db'))
+
+    # As left behind by generate-db, which doesn't fill the catalog.
+    path = os.path.join(library, 'valid.txt')
+    shutil.copyfile(helper.get_file('valid.txt'), path)
+    unsupported = os.path.join(library, 'notes.invalid')
+    with open(unsupported, 'w') as f:
+        f.write('not media')
+    db = Db()
+    db.add_hash(helper.checksum(path), path)
+    db.add_hash(helper.checksum(unsupported), unsupported, True)
+
+    relayout = _relayout(library, catalog)
+    moves = relayout.plan()
+    catalogued = catalog.get(path)
+    catalog.close()
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    shutil.rmtree(folder)
+    shutil.rmtree(library)
+
+    assert relayout.catalogued == 1, relayout.catalogued
+    assert catalogued is not None and catalogued['title'] == 'sample title', catalogued
+    assert [move[0] for move in moves] == [path], moves
+    assert moves[0][1].endswith('20160407-sample-title.txt'), moves
+    assert relayout.errors == [(unsupported, 'Not in catalog and not a supported file')], relayout.errors
+
+@mock.patch('elodie.config.config_file', '%s/config.ini-relayout-conflict' % gettempdir())
+def test_relayout_skips_taken_destination():
+    _write_config('config.ini-relayout-conflict')
+    folder, library, catalog, destination = _import()
+
+    relayout = _relayout(library, catalog, os.path.join(folder, 'relayout.journal'))
+    new_path = _relayout(library, catalog).plan()[0][1]
+    os.makedirs(os.path.dirname(new_path))
+    with open(new_path, 'w') as f:
+        f.write('taken')
+    moves = relayout.plan()
+    errors = relayout.errors
+    catalog.close()
+    if hasattr(load_config, 'config'):
+        del load_config.config
+
+    shutil.rmtree(folder)
+    shutil.rmtree(library)
+
+    assert moves == [], moves
+    assert errors == [(destination, 'Destination exists: %s' % new_path)], errors
+
+def test_relayout_recovers_journal():
+    folder, library, catalog, destination = _import()
+    checksum = catalog.get(destination)['checksum']
+    journal_file = os.path.join(folder, 'relayout.journal')
+
+    # An interrupted run which renamed `done` but not `destination`.
+    done = os.path.join(os.path.dirname(destination), 'done.txt')
+    shutil.copyfile(destination, done)
+    moves = [
+        [done, os.path.join(library, 'new', 'done.txt'), None],
+        [destination, os.path.join(library, 'new', 'renamed.txt'), checksum]
+    ]
+    os.makedirs(os.path.join(library, 'new'))
+    os.rename(done, moves[0][1])
+    with open(journal_file, 'w') as f:
+        f.write(json.dumps({'library': library}) + '\n')
+        for move in moves:
+            f.write(json.dumps(move) + '\n')
+
+    relayout = _relayout(library, catalog, journal_file)
+    recovered = relayout.recover()
+    renamed = os.path.isfile(moves[1][1])
+    journal_exists = os.path.isfile(journal_file)
+    hash_path = Db().get_hash(checksum)
+    record = catalog.get(moves[1][1])
+    catalog.close()
+
+    shutil.rmtree(folder)
+    shutil.rmtree(library)
+
+    assert recovered == library, recovered
+    assert relayout.recovered == 1, relayout.recovered
+    assert relayout.moved == 1, relayout.moved
+    assert renamed
+    assert journal_exists is False
+    assert hash_path == moves[1][1], hash_path
+    assert record['checksum'] == checksum, record
@@ -73,3 +73,24 @@ Error           1"""
     result.append(('id1', False))
     result.append(('id2', '/some/path'))
     call_result_and_assert(result, expected)
+
+def test_skipped_and_bytes_counters():
+    result = Result()
+    result.append(('id1', '/some/path/1'), 10)
+    result.append(('id2', 'SKIPPED'))
+    result.append(('id3', None), 5)
+
+    assert result.success == 1, result.success
+    assert result.skipped == 1, result.skipped
+    assert result.error == 1, result.error
+    assert result.bytes == 15, result.bytes
+
+def test_filtered_counter():
+    result = Result()
+    result.append(('id1', '/some/path/1'))
+    result.append(('id2', 'FILTERED'))
+
+    assert result.success == 1, result.success
+    assert result.filtered == 1, result.filtered
+    assert result.skipped == 0, result.skipped
+    assert result.error == 0, result.error
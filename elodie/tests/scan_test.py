@@ -0,0 +1,122 @@
+# Project imports
+import mock
+import os
+import shutil
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.realpath(__file__))))
+
+import helper
+from elodie.filesystem import FileSystem
+from elodie.localstorage import Db
+from elodie.media.base import get_all_subclasses
+from elodie.scan import Scan
+
+os.environ['TZ'] = 'GMT'
+
+def _library_with_valid_txt():
+    temporary_folder, library = helper.create_working_folder()
+    library_file = '%s/valid.txt' % library
+    shutil.copyfile(helper.get_file('valid.txt'), library_file)
+    db = Db()
+    db.add_hash(db.checksum(library_file), library_file, True)
+    return library
+
+def test_scan_file_duplicate_in_library():
+    library = _library_with_valid_txt()
+    temporary_folder, folder = helper.create_working_folder()
+    origin = '%s/copy.txt' % folder
+    shutil.copyfile(helper.get_file('valid.txt'), origin)
+
+    scan = Scan(FileSystem())
+    status = scan.scan_file(origin, get_all_subclasses())
+
+    shutil.rmtree(folder)
+    shutil.rmtree(library)
+
+    assert status == 'duplicate', status
+    assert scan.duplicate == 1, scan.duplicate
+    assert scan.bytes_to_copy == 0, scan.bytes_to_copy
+
+def test_scan_file_new_without_hashing():
+    temporary_folder, folder = helper.create_working_folder()
+    origin = '%s/new.txt' % folder
+    with open(origin, 'w') as f:
+        f.write('This file has a size nothing else has %s' % helper.random_string(40))
+
+    scan = Scan(FileSystem())
+    # Every file in the library is catalogued.
+    scan.uncatalogued = False
+    status = scan.scan_file(origin, get_all_subclasses())
+    size = os.path.getsize(origin)
+
+    shutil.rmtree(folder)
+
+    assert status == 'new', status
+    assert scan.hashed == 0, scan.hashed
+    assert scan.bytes_to_copy == size, scan.bytes_to_copy
+    assert scan.by_type['Text']['new'] == 1, scan.by_type
+
+def test_scan_file_duplicate_in_catalog():
+    temporary_folder, library = helper.create_working_folder()
+    library_file = '%s/catalogued.txt' % library
+    with open(library_file, 'w') as f:
+        f.write('Catalogued with its size %s' % helper.random_string(40))
+    filesystem = FileSystem()
+    checksum = Db().checksum(library_file)
+    filesystem.catalog.add(library_file, checksum, {}, size=os.path.getsize(library_file))
+    temporary_folder, folder = helper.create_working_folder()
+    origin = '%s/copy.txt' % folder
+    shutil.copyfile(library_file, origin)
+
+    scan = Scan(filesystem)
+    scan.uncatalogued = False
+    with mock.patch.object(filesystem, 'process_checksum', return_value=None):
+        status = scan.scan_file(origin, get_all_subclasses())
+    filesystem.catalog.remove(library_file)
+
+    shutil.rmtree(folder)
+    shutil.rmtree(library)
+
+    assert status == 'duplicate', status
+    assert scan.hashed == 1, scan.hashed
+
+def test_scan_hashes_when_library_is_uncatalogued():
+    temporary_folder, folder = helper.create_working_folder()
+    origin = '%s/new.txt' % folder
+    with open(origin, 'w') as f:
+        f.write('This file has a size nothing else has %s' % helper.random_string(40))
+
+    scan = Scan(FileSystem())
+    scan.uncatalogued = True
+    status = scan.scan_file(origin, get_all_subclasses())
+
+    shutil.rmtree(folder)
+
+    assert status == 'new', status
+    assert scan.hashed == 1, scan.hashed
+
+def test_scan_file_duplicate_within_source():
+    temporary_folder, folder = helper.create_working_folder()
+    contents = 'Duplicated within the source %s' % helper.random_string(40)
+    for name in ('one.txt', 'two.txt'):
+        with open('%s/%s' % (folder, name), 'w') as f:
+            f.write(contents)
+
+    scan = Scan(FileSystem())
+    first = scan.scan_file('%s/one.txt' % folder, get_all_subclasses())
+    second = scan.scan_file('%s/two.txt' % folder, get_all_subclasses())
+
+    shutil.rmtree(folder)
+
+    assert first == 'new', first
+    assert second == 'duplicate', second
+    assert scan.new == 1, scan.new
+
+def test_scan_file_unsupported():
+    scan = Scan(FileSystem())
+    status = scan.scan_file(helper.get_file('invalid.invalid'), get_all_subclasses())
+
+    assert status == 'unsupported', status
+    assert scan.unsupported == 1, scan.unsupported
@@ -12,9 +12,11 @@ import threading
 import time
 from datetime import datetime
 
+from mock import patch
+
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
 
-from elodie.session_log import SessionLogger
+from elodie.session_log import SessionLogger, load_session_log
 
 os.environ['TZ'] = 'GMT'
 
@@ -29,8 +31,9 @@ def test_session_logger_initialization():
     assert logger.session_data['summary']['successful'] == 0
     assert logger.session_data['summary']['failed'] == 0
     assert logger.session_data['summary']['skipped'] == 0
-    assert logger.session_data['files_processed'] == []
-    assert logger.session_data['errors'] == []
+    assert 'files_processed' not in logger.session_data
+    assert len(logger.session_data['errors']) == 0
+    assert not os.path.exists(logger.log_file)
 
 
 def test_session_logger_set_command():
@@ -57,9 +60,11 @@ def test_session_logger_file_processing_success():
     
     assert logger.session_data['summary']['successful'] == 1
     assert logger.session_data['summary']['total_files'] == 1
-    assert len(logger.session_data['files_processed']) == 1
+    log_data = load_session_log(logger.finalize_session())
+    os.remove(logger.log_file)
+    assert len(log_data['files_processed']) == 1
     
-    file_record = logger.session_data['files_processed'][0]
+    file_record = log_data['files_processed'][0]
     assert file_record['source'] == source_file
     assert file_record['destination'] == dest_file
     assert file_record['status'] == 'success'
@@ -78,9 +83,11 @@ def test_session_logger_file_processing_failure():
     
     assert logger.session_data['summary']['failed'] == 1
     assert logger.session_data['summary']['total_files'] == 1
-    assert len(logger.session_data['files_processed']) == 1
+    log_data = load_session_log(logger.finalize_session())
+    os.remove(logger.log_file)
+    assert len(log_data['files_processed']) == 1
     
-    file_record = logger.session_data['files_processed'][0]
+    file_record = log_data['files_processed'][0]
     assert file_record['source'] == source_file
     assert file_record['destination'] is None
     assert file_record['status'] == 'failed'
@@ -98,9 +105,11 @@ def test_session_logger_file_processing_skipped():
     
     assert logger.session_data['summary']['skipped'] == 1
     assert logger.session_data['summary']['total_files'] == 1
-    assert len(logger.session_data['files_processed']) == 1
+    log_data = load_session_log(logger.finalize_session())
+    os.remove(logger.log_file)
+    assert len(log_data['files_processed']) == 1
     
-    file_record = logger.session_data['files_processed'][0]
+    file_record = log_data['files_processed'][0]
     assert file_record['source'] == source_file
     assert file_record['destination'] is None
     assert file_record['status'] == 'skipped'
@@ -122,7 +131,9 @@ def test_session_logger_multiple_files():
     assert logger.session_data['summary']['successful'] == 2
     assert logger.session_data['summary']['failed'] == 1
     assert logger.session_data['summary']['skipped'] == 1
-    assert len(logger.session_data['files_processed']) == 4
+    log_data = load_session_log(logger.finalize_session())
+    os.remove(logger.log_file)
+    assert [record['status'] for record in log_data['files_processed']] == ['success', 'failed', 'skipped', 'success']
 
 
 def test_session_logger_error_logging():
@@ -165,11 +176,10 @@ def test_session_logger_finalization():
     log_file = logger.finalize_session()
     
     assert os.path.exists(log_file)
-    assert log_file.endswith('.json')
+    assert log_file.endswith('.jsonl')
     
     # Verify log file contents
-    with open(log_file, 'r') as f:
-        log_data = json.load(f)
+    log_data = load_session_log(log_file)
     
     assert log_data['session_id'] == logger.session_id
     assert log_data['command'] == 'import'
@@ -217,7 +227,9 @@ def test_session_logger_thread_safety():
     # Should have processed 15 files total (3 threads * 5 files each)
     assert logger.session_data['summary']['total_files'] == 15
     assert logger.session_data['summary']['successful'] == 15
-    assert len(logger.session_data['files_processed']) == 15
+    log_data = load_session_log(logger.finalize_session())
+    os.remove(logger.log_file)
+    assert len(log_data['files_processed']) == 15
 
 
 def test_session_logger_log_directory_creation():
@@ -258,12 +270,43 @@ def test_session_logger_duration_calculation():
     log_file = logger.finalize_session()
     
     # Verify duration was calculated
-    with open(log_file, 'r') as f:
-        log_data = json.load(f)
+    log_data = load_session_log(log_file)
     
     assert 'duration_seconds' in log_data
     assert log_data['duration_seconds'] > 0
     assert log_data['duration_seconds'] < 1  # Should be less than 1 second
     
     # Clean up
-    os.remove(log_file)
\ No newline at end of file
+    os.remove(log_file)
+
+def test_session_logger_writes_incrementally():
+    """Test records reach the log file before the session is finalized."""
+    logger = SessionLogger()
+    logger.set_command('import', {'destination': '/test'})
+
+    with patch('elodie.constants.session_log_flush_every', 2):
+        logger.log_file_processed('/path/1.jpg', '/dest/1.jpg', 'success')
+        logger.log_file_processed('/path/2.jpg', None, 'failed', 'Invalid format')
+
+    # Not finalized, so there's no summary footer yet.
+    log_data = load_session_log(logger.log_file)
+    assert log_data['command'] == 'import'
+    assert len(log_data['files_processed']) == 2
+    assert 'summary' not in log_data
+
+    logger.finalize_session()
+    os.remove(logger.log_file)
+
+
+def test_session_logger_keeps_bounded_errors():
+    """Test only recent errors are kept in memory but all are logged."""
+    with patch('elodie.constants.session_log_recent_errors', 2):
+        logger = SessionLogger()
+    for i in range(5):
+        logger.log_error('Error %d' % i)
+
+    assert [error['message'] for error in logger.session_data['errors']] == ['Error 3', 'Error 4']
+    log_data = load_session_log(logger.finalize_session())
+    os.remove(logger.log_file)
+    assert len(log_data['errors']) == 5
+    assert log_data['error_count'] == 5
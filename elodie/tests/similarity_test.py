@@ -0,0 +1,105 @@
+from __future__ import absolute_import
+# Project imports
+import os
+import random
+import sys
+import shutil
+import time
+from tempfile import mkdtemp
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+
+from . import helper
+from elodie.catalog import Catalog
+from elodie.similarity import (
+    BKTree, SimilarIndex, group_similar, hamming, hash_catalog, perceptual_hash
+)
+
+os.environ['TZ'] = 'GMT'
+
+def _distances(a, b):
+    return [hamming(int(x, 16), int(y, 16)) for x, y in zip(a, b)]
+
+def test_hamming():
+    assert hamming(0, 0) == 0
+    assert hamming(0b1011, 0b0001) == 2
+    assert hamming(2 ** 64 - 1, 0) == 64
+
+def test_perceptual_hash_of_copies():
+    folder = mkdtemp()
+    original = helper.make_image(os.path.join(folder, 'original.jpg'), 1, quality=90)
+    hashes = perceptual_hash(original)
+    resized = perceptual_hash(helper.resized_copy(original, os.path.join(folder, 'resized.jpg'), quality=50))
+    png = perceptual_hash(helper.resized_copy(original, os.path.join(folder, 'copy.png'), scale=1))
+    other = perceptual_hash(helper.make_image(os.path.join(folder, 'other.jpg'), 2))
+    invalid = perceptual_hash(os.path.join(folder, 'missing.jpg'))
+    shutil.rmtree(folder)
+
+    assert len(hashes[0]) == 16 and len(hashes[1]) == 16, hashes
+    assert max(_distances(hashes, resized)) <= 6, _distances(hashes, resized)
+    assert max(_distances(hashes, png)) <= 6, _distances(hashes, png)
+    assert min(_distances(hashes, other)) > 16, _distances(hashes, other)
+    assert invalid is None
+
+def test_bktree_matches_brute_force():
+    keys = [random.Random(seed).getrandbits(64) for seed in range(500)]
+    # Near copies of a few keys.
+    keys += [key ^ (1 << bit) for bit, key in enumerate(keys[:20])]
+    tree = BKTree()
+    for i, key in enumerate(keys):
+        tree.add(key, i)
+
+    for key in keys[:50]:
+        found = sorted(item for distance, item in tree.search(key, 8))
+        expected = [i for i, other in enumerate(keys) if hamming(key, other) <= 8]
+        assert found == expected, (found, expected)
+    assert tree.size == 520
+
+def test_similar_index_requires_both_hashes():
+    index = SimilarIndex(distance=2)
+    index.add(('00000000000000ff', '000000000000000f'), 'a')
+    index.add(('ffffffffffffffff', '0000000000000007'), 'b')
+
+    matches = index.search(('00000000000000fe', '0000000000000003'))
+
+    # b's pHash is close but its dHash isn't.
+    assert matches == [(2, 'a')], matches
+
+def test_group_similar():
+    images = [
+        ('a.jpg', '00000000000000ff', '000000000000000f'),
+        ('b.jpg', '00000000000000ff', '000000000000001f'),
+        ('c.jpg', '00000000000000ff', '000000000000003f'),
+        ('d.jpg', 'ffffffffffffff00', 'fffffffffffffff0'),
+        ('e.jpg', 'ffffffffffffff00', 'fffffffffffffff1')
+    ]
+
+    groups = group_similar(images, distance=1)
+
+    # a and c are 2 bits apart but joined through b.
+    assert groups == [['a.jpg', 'b.jpg', 'c.jpg'], ['d.jpg', 'e.jpg']], groups
+
+def test_hash_catalog():
+    folder = mkdtemp()
+    catalog = Catalog(os.path.join(folder, 'catalog.db'))
+    metadata = {'date_taken': time.gmtime(0), 'mime_type': 'image/jpeg'}
+    original = helper.make_image(os.path.join(folder, 'original.jpg'), 1)
+    copy = helper.resized_copy(original, os.path.join(folder, 'copy.jpg'))
+    broken = os.path.join(folder, 'broken.jpg')
+    with open(broken, 'w') as f:
+        f.write('not an image')
+    for path in (original, copy, broken):
+        catalog.add(path, path, metadata)
+    catalog.add(os.path.join(folder, 'notes.txt'), 'text', dict(metadata, mime_type='text/plain'))
+
+    hashed = hash_catalog(catalog, folder, workers=2)
+    stored = catalog.get(original)
+    broken_record = catalog.get(broken)
+    again = hash_catalog(catalog)
+    catalog.close()
+    shutil.rmtree(folder)
+
+    assert [path for path, dhash, phash in hashed] == [copy, original], hashed
+    assert (stored['dhash'], stored['phash']) == hashed[1][1:], stored
+    assert broken_record['phash'] == '', broken_record
+    assert again == hashed, again
@@ -0,0 +1,67 @@
+# Project imports
+import os
+import subprocess
+import sys
+from tempfile import mkdtemp
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+
+elodie_path = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))),
+    'elodie.py'
+)
+
+#: Modules which are only needed to import, geotag or print tables. None of
+#:  them should be loaded to show help or verify a library.
+HEAVY_MODULES = ('reverse_geocoder', 'scipy', 'numpy', 'PIL', 'tabulate', 'exifread', 'send2trash')
+
+#: Budget in microseconds for the import time of everything the CLI loads.
+#:  Loading the geocoder alone used to take ~350ms.
+STARTUP_BUDGET_US = 250000
+
+def _importtime(*args):
+    """Run elodie.py under `python -X importtime` and return
+       {module: cumulative microseconds} for every module it imported.
+    """
+    env = dict(os.environ)
+    env['ELODIE_APPLICATION_DIRECTORY'] = mkdtemp()
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', elodie_path] + list(args),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+        universal_newlines=True
+    )
+    assert process.returncode == 0, process.stderr
+
+    modules = {}
+    top_level = 0
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative_us)
+        # Top level imports aren't indented. `site` and `encodings` are
+        #  loaded by the interpreter before elodie.py runs.
+        if not name.startswith('  ') and name.strip() not in ('site', 'encodings'):
+            top_level += int(cumulative_us)
+    return modules, top_level
+
+def test_help_does_not_import_heavy_modules():
+    modules, total = _importtime('--help')
+    loaded = [name for name in HEAVY_MODULES if name in modules]
+
+    assert loaded == [], loaded
+
+def test_verify_does_not_import_heavy_modules():
+    modules, total = _importtime('verify')
+    # verify prints its summary with tabulate.
+    loaded = [name for name in HEAVY_MODULES if name in modules and name != 'tabulate']
+
+    assert loaded == [], loaded
+
+def test_startup_within_budget():
+    # Take the best of a few runs so a busy machine doesn't fail the test.
+    best = min(_importtime('--help')[1] for i in range(3))
+
+    assert best < STARTUP_BUDGET_US, 'Startup imports took %dus' % best
@@ -0,0 +1,103 @@
+from __future__ import absolute_import
+# Project imports
+import mock
+import os
+import sys
+import shutil
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+
+from . import helper
+from elodie import constants
+from elodie.localstorage import Db
+from elodie.sync import Sync
+
+os.environ['TZ'] = 'GMT'
+
+def _library(names):
+    temporary_folder, library = helper.create_working_folder()
+    db = Db()
+    for name in names:
+        path = os.path.join(library, '2015', name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(name)
+        db.add_hash(helper.checksum(path), path)
+    db.update_hash_db()
+    return library
+
+def _sync(library, backup, verify=False):
+    sync = Sync(library, backup, verify)
+    sync.run()
+    return sync
+
+def test_sync_copies_only_new_files():
+    library = _library(['a.jpg', 'b.jpg'])
+    temporary_folder, backup = helper.create_working_folder()
+
+    first = _sync(library, backup)
+    copied = sorted(os.listdir(os.path.join(backup, '2015')))
+    again = _sync(library, backup)
+
+    path = os.path.join(library, '2015', 'c.jpg')
+    with open(path, 'w') as f:
+        f.write('c.jpg')
+    db = Db()
+    db.add_hash(helper.checksum(path), path, True)
+    third = _sync(library, backup)
+    with open(os.path.join(backup, '2015', 'c.jpg')) as f:
+        content = f.read()
+
+    shutil.rmtree(library)
+    shutil.rmtree(backup)
+
+    assert (first.copied, first.errors) == (2, []), (first.copied, first.errors)
+    assert copied == ['a.jpg', 'b.jpg'], copied
+    # Nothing was saved to the hash db so there is nothing to look at.
+    assert (again.copied, again.unchanged) == (0, 0), (again.copied, again.unchanged)
+    assert (third.copied, third.unchanged) == (1, 0), (third.copied, third.unchanged)
+    assert content == 'c.jpg', content
+
+def test_sync_renames_moved_files():
+    library = _library(['a.jpg'])
+    temporary_folder, backup = helper.create_working_folder()
+    _sync(library, backup)
+
+    old = os.path.join(library, '2015', 'a.jpg')
+    new = os.path.join(library, '2016', 'a.jpg')
+    os.makedirs(os.path.dirname(new))
+    os.rename(old, new)
+    db = Db()
+    db.add_hash(helper.checksum(new), new, True)
+
+    with mock.patch('elodie.compatability._copyfile') as copyfile:
+        sync = _sync(library, backup)
+    moved = (
+        os.path.isfile(os.path.join(backup, '2015', 'a.jpg')),
+        os.path.isfile(os.path.join(backup, '2016', 'a.jpg'))
+    )
+
+    shutil.rmtree(library)
+    shutil.rmtree(backup)
+
+    assert (sync.moved, sync.copied) == (1, 0), (sync.moved, sync.copied)
+    assert copyfile.called is False
+    assert moved == (False, True), moved
+
+def test_sync_retries_copies_which_fail_verification():
+    library = _library(['a.jpg'])
+    temporary_folder, backup = helper.create_working_folder()
+
+    with mock.patch.object(Db, 'checksum', side_effect=['0' * 64, '1' * 64]):
+        failed = _sync(library, backup, verify=True)
+    retried = _sync(library, backup, verify=True)
+    leftovers = [name for name in os.listdir(os.path.join(backup, '2015')) if name.endswith('.elodie-sync')]
+
+    shutil.rmtree(library)
+    shutil.rmtree(backup)
+
+    assert failed.copied == 0, failed.copied
+    assert failed.errors[0][1] == 'Copy does not match the library', failed.errors
+    assert retried.copied == 1, retried.copied
+    assert leftovers == [], leftovers
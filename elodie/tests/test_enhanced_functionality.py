@@ -18,10 +18,10 @@ sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirna
 from . import helper
 elodie = load_source('elodie', os.path.abspath('{}/../../elodie.py'.format(os.path.dirname(os.path.realpath(__file__)))))
 
-from elodie.session_log import SessionLogger
+from elodie.session_log import SessionLogger, load_session_log
 from elodie.filesystem import FileSystem
 from elodie.geolocation_offline import place_name, coordinates_by_name
-from elodie.exif_reader import ExifReader
+from elodie.exif_reader import ExifReader, get_window_stats, reset_window_stats
 
 os.environ['TZ'] = 'GMT'
 
@@ -71,8 +71,7 @@ def test_session_logger_finalization():
     assert os.path.exists(log_file)
     
     # Verify log file contents
-    with open(log_file, 'r') as f:
-        log_data = json.load(f)
+    log_data = load_session_log(log_file)
     
     assert log_data['session_id'] == logger.session_id
     assert log_data['summary']['successful'] == 1
@@ -154,6 +153,35 @@ def test_exif_reader_metadata_extraction():
     # The metadata might be empty if ExifRead can't read the test file
     # but it should return a dict
 
+def test_exif_reader_header_window_hit():
+    """Test ExifReader serves tags from the header window."""
+    reset_window_stats()
+    reader = ExifReader(header_window=64 * 1024)
+    metadata = reader.get_metadata(helper.get_file('with-location.jpg'))
+
+    assert metadata['DateTimeOriginal'] == '2015:12:05 00:59:26'
+    assert get_window_stats()['jpg']['window'] == 1
+    assert get_window_stats()['jpg']['full'] == 0
+
+def test_exif_reader_header_window_fallback():
+    """Test ExifReader falls back to a full read when the window is too small."""
+    reset_window_stats()
+    reader = ExifReader(header_window=16)
+    metadata = reader.get_metadata(helper.get_file('with-location.jpg'))
+
+    assert metadata['DateTimeOriginal'] == '2015:12:05 00:59:26'
+    assert get_window_stats()['jpg']['full'] == 1
+    assert get_window_stats()['jpg']['hit_rate'] == 0.0
+
+def test_exif_reader_header_window_disabled():
+    """Test ExifReader with a header window of 0 always reads the full file."""
+    reset_window_stats()
+    reader = ExifReader(header_window=0)
+    metadata = reader.get_metadata(helper.get_file('plain.jpg'))
+
+    assert metadata['DateTimeOriginal'] == '2015:12:05 00:59:26'
+    assert get_window_stats() == {}
+
 # Test Parallel Processing
 def test_parallel_import_with_workers():
     """Test parallel import functionality with workers."""
@@ -0,0 +1,108 @@
+# Project imports
+import json
+import os
+import sys
+import threading
+from tempfile import mkstemp
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+
+from elodie import trace
+
+def teardown_function(function):
+    trace.disable()
+
+def test_span_disabled_records_nothing():
+    trace.disable()
+    with trace.span('stage'):
+        pass
+
+    assert trace.tracer is None
+
+def test_span_enabled_records_event():
+    tracer = trace.enable()
+    with trace.span('stage', file='a.jpg'):
+        pass
+
+    assert len(tracer.events) == 1, tracer.events
+    event = tracer.events[0]
+    assert event['name'] == 'stage', event
+    assert event['ph'] == 'X', event
+    assert event['args'] == {'file': 'a.jpg'}, event
+    assert event['tid'] == threading.get_ident(), event
+
+def test_span_records_on_exception():
+    tracer = trace.enable()
+    try:
+        with trace.span('stage'):
+            raise ValueError()
+    except ValueError:
+        pass
+
+    assert [event['name'] for event in tracer.events] == ['stage'], tracer.events
+
+def test_traced_decorator():
+    @trace.traced('decorated')
+    def add(a, b):
+        return a + b
+
+    assert add(1, 2) == 3
+    tracer = trace.enable()
+    assert add(2, 3) == 5
+    assert [event['name'] for event in tracer.events] == ['decorated'], tracer.events
+
+def test_locked_records_wait():
+    lock = threading.Lock()
+    tracer = trace.enable()
+    with trace.locked(lock, 'some_lock'):
+        assert lock.locked()
+
+    assert not lock.locked()
+    assert [event['name'] for event in tracer.events] == ['some_lock.wait'], tracer.events
+
+def test_stats_percentiles():
+    tracer = trace.enable()
+    for i in range(1, 101):
+        tracer.record('stage', 0, i / 1000.0)
+    stats = tracer.stats()['stage']
+
+    assert stats['count'] == 100, stats
+    assert round(stats['p50']) == 50, stats
+    assert round(stats['p95']) == 95, stats
+    assert round(stats['p99']) == 99, stats
+
+def test_write_chrome_trace():
+    tracer = trace.enable()
+    with trace.span('stage'):
+        pass
+    fd, path = mkstemp()
+    os.close(fd)
+    tracer.write_chrome_trace(path)
+    with open(path, 'r') as f:
+        data = json.load(f)
+    os.remove(path)
+
+    assert [event['name'] for event in data['traceEvents']] == ['stage'], data
+    assert data['displayTimeUnit'] == 'ms', data
+
+def test_observe_without_tracer_keeps_no_events():
+    trace.disable()
+    observed = []
+    callback = lambda name, seconds: observed.append(name)
+    trace.observe(callback)
+    with trace.span('stage'):
+        pass
+    events = trace.tracer.events
+    trace.unobserve(callback)
+
+    assert observed == ['stage'], observed
+    assert events == [], events
+    assert trace.tracer is None
+
+def test_unobserve_keeps_enabled_tracer():
+    tracer = trace.enable()
+    callback = lambda name, seconds: None
+    trace.observe(callback)
+    trace.unobserve(callback)
+
+    assert trace.tracer is tracer
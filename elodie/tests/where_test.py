@@ -0,0 +1,71 @@
+from __future__ import absolute_import
+# Project imports
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))
+
+from . import helper
+from elodie.where import Filter, matches, parse
+
+os.environ['TZ'] = 'GMT'
+
+def _metadata(**kwargs):
+    metadata = {
+        'date_taken': time.strptime('2021-06-30 18:15:00', '%Y-%m-%d %H:%M:%S'),
+        'camera_make': 'Apple',
+        'camera_model': 'iPhone 12 Pro',
+        'album': None,
+        'extension': 'HEIC',
+        'latitude': 37.77,
+        'longitude': -122.42,
+    }
+    metadata.update(kwargs)
+    return metadata
+
+def _check(expression, size=0, **kwargs):
+    return Filter(expression).matches(_metadata(**kwargs), size)
+
+def test_date_taken_compares_at_given_precision():
+    assert _check('date_taken<=2021-06')
+    assert _check('date_taken>=2021-06-30')
+    assert _check('date_taken=2021')
+    assert not _check('date_taken<2021-06-30 18:15')
+    assert not _check('date_taken>2021-06')
+    assert not _check('date_taken>=2000', date_taken=None)
+
+def test_text_fields():
+    assert _check('camera_make=apple')
+    assert _check('camera_model~iphone')
+    assert _check('extension=.heic')
+    assert _check('album!=Screenshots')
+    assert not _check('album=Screenshots')
+    assert not _check('camera_model~pixel')
+
+def test_size_units():
+    assert _check('size>5MB', size=5 * 1000 ** 2 + 1)
+    assert not _check('size>5MiB', size=5 * 1000 ** 2 + 1)
+    assert _check('size<=1.5kb', size=1500)
+
+def test_has_gps():
+    assert _check('has_gps')
+    assert _check('has_gps=false', latitude=None)
+    assert not _check('has_gps', longitude=None)
+
+def test_parse_errors():
+    for expression in ('iso>100', 'date_taken>June', 'date_taken~2021', 'camera_make>a', 'size>5 parsecs', 'has_gps=maybe'):
+        try:
+            parse([expression])
+            raised = None
+        except ValueError as e:
+            raised = str(e)
+        assert raised is not None and raised.startswith(expression), (expression, raised)
+
+def test_matches_stats_only_for_size():
+    metadata = _metadata()
+    filters = parse(['camera_make=apple', 'size>1'])
+
+    assert matches(parse(['camera_make=apple']), metadata, '/does/not/exist')
+    assert matches(filters, metadata, helper.get_file('valid.txt'))
+    assert not matches(filters + parse(['has_gps=false']), metadata, helper.get_file('valid.txt'))
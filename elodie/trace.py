@@ -0,0 +1,206 @@
+"""
+Lightweight tracing of import stages.
+
+Code wraps a stage in :func:`span` (or decorates it with :func:`traced`).
+Spans are only recorded while tracing is enabled, otherwise they cost a
+function call and a global lookup. Recorded spans can be written in Chrome's
+trace event format, which loads in chrome://tracing and Perfetto, and
+summarized as per-stage percentiles.
+"""
+from __future__ import print_function
+
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+
+class _NoopSpan(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_noop_span = _NoopSpan()
+
+#: The active :class:`Tracer`, or None when tracing is disabled.
+tracer = None
+
+
+class Tracer(object):
+    """Collects completed spans from every thread.
+
+    :param bool keep_events: Store every span. Observers are called either way.
+    """
+
+    def __init__(self, keep_events=True):
+        self.lock = threading.Lock()
+        self.keep_events = keep_events
+        self.events = []
+        self.observers = []
+        self.pid = os.getpid()
+
+    def record(self, name, start, end, args=None):
+        """Record a span. start and end are time.perf_counter() values."""
+        for observer in self.observers:
+            observer(name, end - start)
+        if not self.keep_events:
+            return
+
+        event = {
+            'name': name,
+            'ph': 'X',
+            'ts': start * 1000000,
+            'dur': (end - start) * 1000000,
+            'pid': self.pid,
+            'tid': threading.get_ident()
+        }
+        if args:
+            event['args'] = args
+        with self.lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name, args=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter(), args)
+
+    def write_chrome_trace(self, path):
+        """Write recorded spans in Chrome's trace event format."""
+        with self.lock:
+            events = list(self.events)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def stats(self):
+        """Per-stage duration statistics in milliseconds.
+
+        :returns: dict of name -> dict with count, total, p50, p95 and p99.
+        """
+        durations = {}
+        with self.lock:
+            for event in self.events:
+                durations.setdefault(event['name'], []).append(event['dur'] / 1000.0)
+
+        stats = {}
+        for name, values in durations.items():
+            values.sort()
+            stats[name] = {
+                'count': len(values),
+                'total': sum(values),
+                'p50': _percentile(values, 50),
+                'p95': _percentile(values, 95),
+                'p99': _percentile(values, 99)
+            }
+        return stats
+
+    def write_summary(self):
+        from tabulate import tabulate
+
+        stats = self.stats()
+        rows = []
+        for name in sorted(stats, key=lambda name: -stats[name]['total']):
+            row = stats[name]
+            rows.append([
+                name, row['count'], row['total'], row['p50'], row['p95'], row['p99']
+            ])
+
+        print("****** TRACE (ms) ******")
+        print(tabulate(
+            rows,
+            headers=["Stage", "Count", "Total", "p50", "p95", "p99"],
+            floatfmt=".2f"
+        ))
+        print("\n")
+
+
+def _percentile(sorted_values, percent):
+    # Nearest-rank percentile.
+    index = int(math.ceil(percent / 100.0 * len(sorted_values))) - 1
+    return sorted_values[max(0, min(index, len(sorted_values) - 1))]
+
+
+def enable():
+    """Start recording spans and return the new :class:`Tracer`."""
+    global tracer
+    tracer = Tracer()
+    return tracer
+
+
+def disable():
+    global tracer
+    tracer = None
+
+
+def observe(callback):
+    """Call `callback(name, seconds)` for every completed span.
+
+    Starts a tracer which doesn't store spans if none is running.
+    """
+    global tracer
+    if tracer is None:
+        tracer = Tracer(keep_events=False)
+    tracer.observers.append(callback)
+
+
+def unobserve(callback):
+    """Remove an observer added with :func:`observe`."""
+    global tracer
+    current = tracer
+    if current is None or callback not in current.observers:
+        return
+    current.observers.remove(callback)
+    if not current.observers and not current.keep_events:
+        tracer = None
+
+
+def span(name, **args):
+    """Context manager which records how long its block takes.
+
+    :param str name: Stage name. Stages with the same name are aggregated.
+    """
+    current = tracer
+    if current is None:
+        return _noop_span
+    return current.span(name, args)
+
+
+@contextmanager
+def locked(lock, name):
+    """Acquire `lock` for the block, recording the wait as `<name>.wait`."""
+    current = tracer
+    if current is None:
+        with lock:
+            yield
+        return
+
+    start = time.perf_counter()
+    lock.acquire()
+    current.record('%s.wait' % name, start, time.perf_counter())
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def traced(name):
+    """Decorator which wraps every call of a function in a span."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            current = tracer
+            if current is None:
+                return function(*args, **kwargs)
+            with current.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,168 @@
+"""
+Filters for `elodie import --where`.
+
+Filters are checked against the metadata read from a file's headers, before
+the file is hashed, geocoded, handed to plugins or copied, so files which
+don't match cost no more than reading their headers.
+
+A filter is a field, an operator and a value::
+
+    date_taken>=2021-06      camera_model~iphone      size>5MB
+    extension=dng            album!=Screenshots       has_gps
+
+Dates compare at the precision they're given in, so `date_taken<=2021-06`
+includes all of June. Text compares case insensitively and `~` matches part
+of it.
+"""
+from __future__ import absolute_import
+from builtins import object
+
+import os
+import re
+import time
+
+#: Operators, longest first so `>=` isn't read as `>`.
+OPERATORS = ('>=', '<=', '!=', '=', '>', '<', '~')
+
+TEXT_FIELDS = ('camera_make', 'camera_model', 'album', 'extension')
+
+#: strftime format for each length of date a filter can compare against.
+DATE_FORMATS = {
+    4: '%Y',
+    7: '%Y-%m',
+    10: '%Y-%m-%d',
+    16: '%Y-%m-%d %H:%M',
+    19: '%Y-%m-%d %H:%M:%S',
+}
+
+SIZE_UNITS = {
+    '': 1, 'b': 1,
+    'kb': 1000, 'mb': 1000 ** 2, 'gb': 1000 ** 3, 'tb': 1000 ** 4,
+    'kib': 1024, 'mib': 1024 ** 2, 'gib': 1024 ** 3, 'tib': 1024 ** 4,
+}
+
+_COMPARE = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '~': lambda a, b: b in a,
+}
+
+_EXPRESSION = re.compile(
+    r'^\s*(\w+)\s*(%s)\s*(.*?)\s*$' % '|'.join(re.escape(op) for op in OPERATORS)
+)
+
+
+class Filter(object):
+    """A single `--where` expression.
+
+    :param str expression: Like `camera_make=Canon`.
+    :raises ValueError: If the expression can't be used.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        match = _EXPRESSION.match(expression)
+        if match is None:
+            # A bare has_gps is the same as has_gps=true.
+            self.field, self.operator, value = (expression.strip(), '=', 'true')
+        else:
+            self.field, self.operator, value = match.groups()
+
+        if self.field == 'date_taken':
+            self.format = DATE_FORMATS.get(len(value))
+            if self.format is None or self.operator == '~':
+                raise ValueError('use date_taken with a date like 2021, 2021-06 or 2021-06-30')
+            try:
+                time.strptime(value, self.format)
+            except ValueError:
+                raise ValueError('%s is not a date like 2021-06-30' % value)
+            self.value = value
+        elif self.field in TEXT_FIELDS:
+            if self.operator not in ('=', '!=', '~'):
+                raise ValueError('%s can only be compared with =, != or ~' % self.field)
+            self.value = _text(self.field, value)
+        elif self.field == 'size':
+            if self.operator == '~':
+                raise ValueError('size can\'t be compared with ~')
+            match = re.match(r'^(\d+(?:\.\d+)?)\s*([a-zA-Z]*)$', value)
+            if match is None or match.group(2).lower() not in SIZE_UNITS:
+                raise ValueError('%s is not a size like 500KB or 2GiB' % value)
+            self.value = float(match.group(1)) * SIZE_UNITS[match.group(2).lower()]
+        elif self.field == 'has_gps':
+            if self.operator not in ('=', '!=') or value.lower() not in ('true', 'false'):
+                raise ValueError('use has_gps, has_gps=true or has_gps=false')
+            self.value = value.lower() == 'true'
+        else:
+            raise ValueError(
+                'unknown field %s, use one of date_taken, %s, size or has_gps' % (
+                    self.field, ', '.join(TEXT_FIELDS)
+                )
+            )
+
+    def __repr__(self):
+        return 'Filter(%r)' % self.expression
+
+    def matches(self, metadata, size):
+        """Check the filter against a file.
+
+        :param dict metadata: From :func:`~elodie.media.base.Base.get_metadata`.
+        :param int size: Size of the file in bytes.
+        :returns: bool
+        """
+        if self.field == 'date_taken':
+            if metadata['date_taken'] is None:
+                return False
+            actual = time.strftime(self.format, metadata['date_taken'])
+        elif self.field in TEXT_FIELDS:
+            actual = _text(self.field, metadata[self.field])
+            if actual is None:
+                return self.operator == '!='
+        elif self.field == 'size':
+            actual = size
+        else:
+            actual = metadata['latitude'] is not None and metadata['longitude'] is not None
+        return _COMPARE[self.operator](actual, self.value)
+
+
+def _text(field, value):
+    if value is None:
+        return None
+    value = value.strip().lower()
+    if field == 'extension':
+        value = value.lstrip('.')
+    return value
+
+
+def parse(expressions):
+    """Parse `--where` expressions.
+
+    :param expressions: iterable of str.
+    :returns: list of :class:`Filter`
+    :raises ValueError: With the expression at fault in the message.
+    """
+    filters = []
+    for expression in expressions:
+        try:
+            filters.append(Filter(expression))
+        except ValueError as e:
+            raise ValueError('%s: %s' % (expression, e))
+    return filters
+
+
+def matches(filters, metadata, _file):
+    """Check if a file passes every filter.
+
+    :param list filters: From :func:`parse`.
+    :param dict metadata: Metadata of the file.
+    :param str _file: Path of the file, only stat'd when a filter needs its
+        size.
+    :returns: bool
+    """
+    size = None
+    if any(f.field == 'size' for f in filters):
+        size = os.path.getsize(_file)
+    return all(f.matches(metadata, size) for f in filters)